@@ -0,0 +1,96 @@
+import asyncio, weakref
+from nimipi.rffe import RegisterData, __Command, __check_and_encode, __start_burst, __wait_for_burst, __fetch_read_data
+
+
+# One lock per session and event loop, so coroutines sharing a session take turns on the bus. An asyncio lock is bound to
+# the loop it is first used on, so every loop, e.g. of each asyncio.run call, gets its own. Entries go away with their session or loop.
+__session_locks = weakref.WeakKeyDictionary()
+
+
+def __session_lock(session):
+    """ Returns the asyncio lock that serializes bursts on a session within the running event loop. """
+    loop_locks = __session_locks.get(session)
+    if loop_locks is None:
+        loop_locks = weakref.WeakKeyDictionary()
+        __session_locks[session] = loop_locks
+    loop = asyncio.get_running_loop()
+    lock = loop_locks.get(loop)
+    if lock is None:
+        lock = asyncio.Lock()
+        loop_locks[loop] = lock
+    return lock
+
+
+async def __finish_burst(session, pin_name, command, register_data, source_waveform_name):
+    """ Waits for a started burst off the event loop, then fetches its read data if it is a read. """
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, __wait_for_burst, session, pin_name, command, register_data)
+    return await loop.run_in_executor(None, __fetch_read_data, session, pin_name, command, source_waveform_name, register_data)
+
+
+async def __burst_commands(session, pin_name, commands):
+    """ Bursts a list of (command, register_data) pairs in order. Command N+1 is validated and encoded while command N
+        is on the bus. Returns the result of every command, in order. """
+    loop = asyncio.get_running_loop()
+    results = []
+    async with __session_lock(session):
+        pending = None # (pin name, command, register data, source waveform name) of the burst on the bus
+        try:
+            for command, register_data in commands:
+                assert isinstance(register_data, RegisterData)
+                byte_count, source_waveform_data = __check_and_encode(session, pin_name, command, register_data)
+                if pending is not None:
+                    results.append(await __finish_burst(session, *pending))
+                    pending = None
+                source_waveform_name = await loop.run_in_executor(None, __start_burst, session, pin_name, command, register_data, byte_count, source_waveform_data, False)
+                pending = (pin_name, command, register_data, source_waveform_name)
+            if pending is not None:
+                results.append(await __finish_burst(session, *pending))
+                pending = None
+        finally:
+            if pending is not None: # the next command failed its check or encode, or the caller was cancelled; do not leave the burst running
+                await loop.run_in_executor(None, session.wait_until_done, 10)
+    return results
+
+
+async def reg0_write(session, pin_name, register_data):
+    """ Bursts a Reg0Write command. This function returns None. """
+    await __burst_commands(session, pin_name, [(__Command.REG_0_WRITE, register_data)])
+
+
+async def reg_write(session, pin_name, register_data):
+    """ Bursts a standard register write command. This function returns None. """
+    await __burst_commands(session, pin_name, [(__Command.REG_WRITE, register_data)])
+
+
+async def reg_read(session, pin_name, register_data):
+    """ Bursts a standard register read command. This function returns one channel of read data. """
+    return (await __burst_commands(session, pin_name, [(__Command.REG_READ, register_data)]))[0]
+
+
+async def extended_reg_write(session, pin_name, register_data):
+    """ Bursts an extended register write command. """
+    await __burst_commands(session, pin_name, [(__Command.REG_WRITE_EXT, register_data)])
+
+
+async def extended_reg_read(session, pin_name, register_data):
+    """ Bursts an extended register read command. """
+    return (await __burst_commands(session, pin_name, [(__Command.REG_READ_EXT, register_data)]))[0]
+
+
+async def extended_reg_write_long(session, pin_name, register_data):
+    """ Bursts an extended register write long command. """
+    await __burst_commands(session, pin_name, [(__Command.REG_WRITE_EXT_LONG, register_data)])
+
+
+async def extended_reg_read_long(session, pin_name, register_data):
+    """ Bursts an extended register read long command. """
+    return (await __burst_commands(session, pin_name, [(__Command.REG_READ_EXT_LONG, register_data)]))[0]
+
+
+async def multi_command(session, pin_name, multi_command_write, multi_command_read):
+    """ Executes multiple register writes and register reads, encoding each command while the previous one runs.
+        Returns the read data in the order of multi_command_read. """
+    commands = [(__Command.REG_WRITE_EXT, register_data) for register_data in multi_command_write]
+    commands += [(__Command.REG_READ_EXT, register_data) for register_data in multi_command_read]
+    return (await __burst_commands(session, pin_name, commands))[len(commands) - len(multi_command_read):]
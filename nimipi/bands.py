@@ -0,0 +1,98 @@
+import collections, time
+import nidigital
+from nimipi import rffe
+
+
+class SequenceBank:
+    """ Named register sequences for one session and pin, compiled once up front. Up to len(rffe.SEQUENCE_SLOT_PATTERNS)
+        of them stay resident on the instrument, each in its own RegSequenceSlot pattern with its own source waveform and
+        sequencer registers, so switching band or mode between resident sequences is a single burst of the slot's start
+        label with nothing written and no host encoding. Selecting a sequence that is not resident loads it into the least
+        recently selected slot first. A sequence is either a burst_sequence list of (command function, RegisterData) pairs,
+        or a list of RegisterData written with extended register writes like multi_command does.
+        If the RegSequenceSlot patterns are not loaded, select runs the entries one by one with their command functions.
+        The time of every select call is kept in switch_latencies, in seconds, for the most recent max_latencies calls. """
+    def __init__(self, session, pin_name, sequences=None, clock_pin_name="RFFECLK", cache=None, max_latencies=10000):
+        assert isinstance(session, nidigital.Session)
+        self.session = session
+        self.pin_name = pin_name
+        self.clock_pin_name = clock_pin_name
+        self.cache = cache
+        self.names = []
+        self.sequences = []
+        self.compiled_sequences = []
+        self.resident_slots = collections.OrderedDict() # sequence index to slot, least recently selected first
+        self.switch_latencies = collections.deque(maxlen=max_latencies)
+        for name, sequence in (sequences or {}).items():
+            self.add(name, sequence)
+
+    def add(self, name, sequence):
+        """ Compiles a sequence, through the SequenceCache if the bank has one, and stores it under name. The sequence is
+            loaded into a free slot right away if there is one. Returns its index. Adding an existing name replaces that sequence. """
+        sequence = list(sequence)
+        if sequence and isinstance(sequence[0], rffe.RegisterData):
+            sequence = [(rffe.extended_reg_write, register_data) for register_data in sequence]
+        compiled_sequence = self.cache.compile(sequence) if self.cache is not None else rffe.compile_sequence(sequence)
+        if name in self.names:
+            index = self.names.index(name)
+            self.sequences[index] = sequence
+            self.compiled_sequences[index] = compiled_sequence
+        else:
+            self.names.append(name)
+            self.sequences.append(sequence)
+            self.compiled_sequences.append(compiled_sequence)
+            index = len(self.names) - 1
+        if self._slots_loaded() and (index in self.resident_slots or len(self.resident_slots) < len(rffe.SEQUENCE_SLOT_PATTERNS)):
+            rffe.load_sequence_slot(self.session, self.pin_name, self._slot(index), compiled_sequence, self.clock_pin_name)
+        return index
+
+    def _index(self, name_or_index):
+        if isinstance(name_or_index, int):
+            return name_or_index
+        try:
+            return self.names.index(name_or_index)
+        except ValueError:
+            raise rffe.RffeException(5000, "The sequence bank has no sequence named " + repr(name_or_index) + '.')
+
+    def _slots_loaded(self):
+        return all(rffe.is_pattern_loaded(self.session, pattern_name) for pattern_name in rffe.SEQUENCE_SLOT_PATTERNS)
+
+    def _slot(self, index):
+        """ Returns the slot of a sequence, taking a free slot or the least recently selected one if it is not resident. """
+        slot = self.resident_slots.get(index)
+        if slot is None:
+            if len(self.resident_slots) < len(rffe.SEQUENCE_SLOT_PATTERNS):
+                slot = len(self.resident_slots)
+            else:
+                _, slot = self.resident_slots.popitem(last=False)
+        self.resident_slots[index] = slot
+        self.resident_slots.move_to_end(index)
+        return slot
+
+    def select(self, name_or_index, trigger_source=None, validate=False):
+        """ Plays the sequence with the given name or index and returns its read data like burst_sequence.
+            With trigger_source set the burst starts on a digital edge there, see rffe.burst_compiled_sequence. """
+        start = time.perf_counter()
+        index = self._index(name_or_index)
+        if self._slots_loaded():
+            slot = self._slot(index)
+            rffe.load_sequence_slot(self.session, self.pin_name, slot, self.compiled_sequences[index], self.clock_pin_name) # writes nothing while resident
+            read_data = rffe.burst_sequence_slot(self.session, slot, self.compiled_sequences[index], validate, trigger_source)
+        elif trigger_source is not None:
+            raise rffe.RffeException(5000, "A triggered select needs the RegSequenceSlot patterns to be loaded.")
+        else:
+            read_data = [entry_read_data for entry_read_data in (command_function(self.session, self.pin_name, register_data)
+                                                                for command_function, register_data in self.sequences[index])
+                         if entry_read_data is not None]
+        self.switch_latencies.append(time.perf_counter() - start)
+        return read_data
+
+    def latency_summary(self):
+        """ Returns the count, mean, median, 99th percentile and maximum switching latency in microseconds. """
+        latencies = sorted(self.switch_latencies)
+        if not latencies:
+            return {"count": 0, "mean_us": 0.0, "p50_us": 0.0, "p99_us": 0.0, "max_us": 0.0}
+        return {"count": len(latencies), "mean_us": sum(latencies) / len(latencies) * 1e6,
+                "p50_us": latencies[len(latencies) // 2] * 1e6,
+                "p99_us": latencies[min(int(0.99 * len(latencies)), len(latencies) - 1)] * 1e6,
+                "max_us": latencies[-1] * 1e6}
@@ -0,0 +1,99 @@
+import hashlib, os, tempfile, zipfile
+import numpy
+import nimipi
+from nimipi import rffe
+
+
+class SequenceCache:
+    """ On-disk cache of compiled sequences, so a tester restart does not have to validate and encode the same
+        sequences again. Entries are keyed by a SHA-256 of the sequence content and the nimipi version and stored as
+        .npz files with a checksum of their arrays. Entries that are stale, truncated or fail the checksum are rebuilt. """
+    def __init__(self, directory_path):
+        self.directory_path = directory_path
+        os.makedirs(directory_path, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+
+    def key(self, sequence):
+        """ Returns the hex SHA-256 of the nimipi version and every (command, slave, address, byte count, write data) entry. """
+        digest = hashlib.sha256(nimipi.__version__.encode())
+        for command_function, register_data in sequence:
+            digest.update("{:s},{:d},{:d},{:d}:".format(command_function.__name__, register_data.slave_address,
+                                                        register_data.register_address, register_data.byte_count).encode())
+            digest.update(bytes(register_data.write_data))
+            digest.update(b";")
+        return digest.hexdigest()
+
+    def compile(self, sequence):
+        """ Returns the CompiledSequence for a burst_sequence list from the cache, compiling and storing it on a miss. """
+        sequence = list(sequence)
+        key = self.key(sequence)
+        file_path = os.path.join(self.directory_path, key + ".npz")
+        if os.path.exists(file_path):
+            compiled_sequence = self._load(file_path, key)
+            if compiled_sequence is not None:
+                self.hits += 1
+                return compiled_sequence
+            self.rebuilds += 1
+        else:
+            self.misses += 1
+        compiled_sequence = rffe.compile_sequence(sequence)
+        self._store(file_path, key, compiled_sequence)
+        return compiled_sequence
+
+    def clear(self):
+        """ Deletes every cached entry. Entries still being written by _store keep their .npz.tmp name until they are
+            complete, so they are left alone, as is any other file in the directory. """
+        for file_name in os.listdir(self.directory_path):
+            if self._is_entry(file_name):
+                try:
+                    os.remove(os.path.join(self.directory_path, file_name))
+                except FileNotFoundError: # removed by a concurrent clear
+                    pass
+
+    def _is_entry(self, file_name):
+        """ Returns True for the name of a finished entry, the hex SHA-256 key followed by .npz. """
+        key, extension = os.path.splitext(file_name)
+        return extension == ".npz" and len(key) == 64 and all(char in "0123456789abcdef" for char in key)
+
+    def _checksum(self, registers, read_slots, read_byte_counts, source_waveform_data):
+        digest = hashlib.sha256()
+        for array in (registers, read_slots, read_byte_counts, source_waveform_data):
+            digest.update(numpy.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def _load(self, file_path, key):
+        """ Returns the cached CompiledSequence, or None if the entry does not belong to the key or is corrupt. """
+        try:
+            with numpy.load(file_path) as entry:
+                if str(entry["key"]) != key:
+                    return None
+                registers = entry["registers"]
+                read_slots = entry["read_slots"]
+                read_byte_counts = entry["read_byte_counts"]
+                source_waveform_data = entry["source_waveform_data"]
+                if str(entry["checksum"]) != self._checksum(registers, read_slots, read_byte_counts, source_waveform_data):
+                    return None
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            return None
+        slot_count, slot_length, read_window_bytes = (int(value) for value in registers)
+        return rffe.CompiledSequence(slot_count, slot_length, read_window_bytes, read_slots.tolist(), read_byte_counts.tolist(),
+                                     source_waveform_data.astype(numpy.uint32))
+
+    def _store(self, file_path, key, compiled_sequence):
+        """ Writes the entry to a temporary file first, so a crash never leaves a partial entry under the final name. """
+        registers = numpy.array([compiled_sequence.slot_count, compiled_sequence.slot_length, compiled_sequence.read_window_bytes], dtype=numpy.uint32)
+        read_slots = numpy.array(compiled_sequence.read_slots, dtype=numpy.uint32)
+        read_byte_counts = numpy.array(compiled_sequence.read_byte_counts, dtype=numpy.uint32)
+        source_waveform_data = numpy.asarray(compiled_sequence.source_waveform_data, dtype=numpy.uint8) # samples are RFFECLK << 1 | RFFEDATA
+        checksum = self._checksum(registers, read_slots, read_byte_counts, source_waveform_data)
+        file_descriptor, temporary_file_path = tempfile.mkstemp(prefix=key + '.', suffix=".npz.tmp", dir=self.directory_path)
+        try:
+            with os.fdopen(file_descriptor, 'wb') as entry_file:
+                numpy.savez(entry_file, key=numpy.array(key), checksum=numpy.array(checksum), registers=registers, read_slots=read_slots,
+                            read_byte_counts=read_byte_counts, source_waveform_data=source_waveform_data)
+            os.replace(temporary_file_path, file_path)
+        except Exception:
+            os.remove(temporary_file_path)
+            raise
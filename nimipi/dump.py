@@ -0,0 +1,68 @@
+import nidigital
+import numpy
+from nimipi.rffe import RegisterData, __Command, __check_and_encode, __start_burst, __wait_for_burst, __fetch_read_data
+
+
+def __chunks(start_address, stop_address, skip_ranges):
+    """ Yields (register address, byte count) chunks of up to 8 bytes covering start_address to stop_address inclusive,
+        leaving out the inclusive (first, last) address ranges in skip_ranges. """
+    skip_ranges = sorted((first, last) for first, last in skip_ranges if last >= start_address and first <= stop_address)
+    address = start_address
+    for first, last in skip_ranges + [(stop_address + 1, stop_address + 1)]:
+        while address < first:
+            byte_count = min(8, first - address)
+            yield (address, byte_count)
+            address += byte_count
+        address = max(address, last + 1)
+
+
+def __finish_chunk(session, pin_name, register_data, source_waveform_name):
+    """ Waits for a started chunk burst and returns (register address, read data). """
+    __wait_for_burst(session, pin_name, __Command.REG_READ_EXT_LONG, register_data)
+    return (register_data.register_address, __fetch_read_data(session, pin_name, __Command.REG_READ_EXT_LONG, source_waveform_name, register_data))
+
+
+def iter_register_map(session, pin_name, slave_address, start_address=0x0000, stop_address=0xFFFF, skip_ranges=()):
+    """ Reads start_address to stop_address of one slave with extended register read long commands of up to 8 bytes and
+        yields (register address, read data) per chunk as soon as it is fetched. skip_ranges holds inclusive (first, last)
+        address ranges that are never read, e.g. unimplemented blocks.
+        The next chunk is encoded while the current one is on the bus and is started right after the fetch, so the
+        caller's handling of a chunk overlaps the next burst. Only two chunks are in memory at any time. """
+    assert isinstance(session, nidigital.Session)
+    pending = None # (register data, source waveform name) of the chunk on the bus
+    try:
+        for register_address, byte_count in __chunks(start_address, stop_address, skip_ranges):
+            register_data = RegisterData(slave_address, register_address, [], byte_count)
+            byte_count, source_waveform_data = __check_and_encode(session, pin_name, __Command.REG_READ_EXT_LONG, register_data)
+            finished = None
+            if pending is not None:
+                finished = __finish_chunk(session, pin_name, *pending)
+                pending = None
+            pending = (register_data, __start_burst(session, pin_name, __Command.REG_READ_EXT_LONG, register_data, byte_count, source_waveform_data, False))
+            if finished is not None:
+                yield finished
+        if pending is not None:
+            finished = __finish_chunk(session, pin_name, *pending)
+            pending = None
+            yield finished
+    finally:
+        if pending is not None: # the caller stopped early, do not leave the burst running
+            session.wait_until_done(10)
+
+
+def dump_register_map(session, pin_name, slave_address, output, start_address=0x0000, stop_address=0xFFFF, skip_ranges=()):
+    """ Streams iter_register_map into output and returns the number of bytes read.
+        output is either a numpy array indexed by register address, which receives every byte read, or a file path that
+        receives one RegisterTable CSV row per chunk, so a dump can be loaded back with RegisterTable.from_csv. """
+    byte_total = 0
+    if isinstance(output, numpy.ndarray):
+        for register_address, read_data in iter_register_map(session, pin_name, slave_address, start_address, stop_address, skip_ranges):
+            output[register_address:register_address + len(read_data)] = read_data
+            byte_total += len(read_data)
+        return byte_total
+    with open(output, 'w') as csv_file:
+        csv_file.write("slave_address,register_address,byte_count,write_data\n")
+        for register_address, read_data in iter_register_map(session, pin_name, slave_address, start_address, stop_address, skip_ranges):
+            csv_file.write("0x{:X},0x{:04X},{:d},{:s}\n".format(slave_address, register_address, len(read_data), " ".join("0x{:02X}".format(data) for data in read_data)))
+            byte_total += len(read_data)
+    return byte_total
@@ -0,0 +1,96 @@
+import collections, csv, json, time
+
+
+class StageRecorder:
+    """ Collects the duration of every stage of every RFFE command, tagged with the instrument session, pin, site list,
+        command, slave address and register address. The most recent window_size records are kept, along with a rolling
+        histogram per (session, pin, sites, command, stage) over the same records. Histogram buckets are powers of two in
+        nanoseconds, so percentiles from summary() are approximate. """
+    STAGES = ("data_check", "encode", "write_source_waveform", "write_sequencer_register", "burst_pattern", "wait_until_done",
+              "fetch_capture_waveform")
+    FIELDS = ("timestamp", "session", "pin", "sites", "command", "slave_address", "register_address", "stage", "duration_ns")
+    GROUP_FIELDS = ("session", "pin", "sites", "command", "stage")
+
+    def __init__(self, window_size=10000):
+        self.window = collections.deque(maxlen=window_size)
+        self.histograms = {}
+
+    def record(self, stage, command_name, slave_address, register_address, duration_ns, session_name="", pin_name="", site_list=""):
+        """ Adds one stage duration. Called from the nimipi burst paths while instrumentation is enabled.
+            site_list is empty for bursts on every site of the session. """
+        if len(self.window) == self.window.maxlen:
+            _, evicted_session, evicted_pin, evicted_sites, evicted_command, _, _, evicted_stage, evicted_duration_ns = self.window[0]
+            self.histograms[(evicted_session, evicted_pin, evicted_sites, evicted_command, evicted_stage)][int(evicted_duration_ns).bit_length()] -= 1
+        self.window.append((time.time(), session_name, pin_name, site_list, command_name, slave_address, register_address, stage, duration_ns))
+        key = (session_name, pin_name, site_list, command_name, stage)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = [0] * 65
+            self.histograms[key] = histogram
+        histogram[int(duration_ns).bit_length()] += 1
+
+    def reset(self):
+        """ Drops all records. """
+        self.window.clear()
+        self.histograms = {}
+
+    def _percentile_us(self, histogram, count, fraction):
+        """ Returns the middle of the bucket holding the percentile, in microseconds. """
+        target = fraction * count
+        cumulative = 0
+        for bucket, bucket_count in enumerate(histogram):
+            cumulative += bucket_count
+            if bucket_count and cumulative >= target:
+                return (0.75 * 2 ** bucket if bucket else 0) / 1e3 # bucket n holds [2^(n-1), 2^n) ns
+        return 0.0
+
+    def summary(self, group_by=("command", "stage")):
+        """ Returns one dict per group over the current window, with the group fields, the count, mean, approximate
+            p50/p90/p99 and maximum in microseconds, and the total in milliseconds. group_by takes any of GROUP_FIELDS,
+            e.g. ("session", "sites", "command", "stage") to compare instruments and sites. """
+        for field in group_by:
+            if field not in self.GROUP_FIELDS:
+                raise ValueError("Cannot group by " + repr(field) + ", expected one of " + ", ".join(self.GROUP_FIELDS) + '.')
+        indices = [self.GROUP_FIELDS.index(field) for field in group_by]
+        durations = collections.defaultdict(list)
+        for _, session_name, pin_name, site_list, command_name, _, _, stage, duration_ns in self.window:
+            key = (session_name, pin_name, site_list, command_name, stage)
+            durations[tuple(key[index] for index in indices)].append(duration_ns)
+        histograms = {}
+        for key, histogram in self.histograms.items():
+            group = tuple(key[index] for index in indices)
+            if group in histograms:
+                histograms[group] = [total + bucket_count for total, bucket_count in zip(histograms[group], histogram)]
+            else:
+                histograms[group] = histogram
+        summary = []
+        for group in sorted(durations, key=lambda group: tuple((self._stage_order(value), value) if field == "stage" else (0, value)
+                                                               for field, value in zip(group_by, group))):
+            stage_durations = durations[group]
+            count = len(stage_durations)
+            group_summary = dict(zip(group_by, group))
+            group_summary.update({"count": count,
+                                  "mean_us": sum(stage_durations) / count / 1e3,
+                                  "p50_us": self._percentile_us(histograms[group], count, 0.50),
+                                  "p90_us": self._percentile_us(histograms[group], count, 0.90),
+                                  "p99_us": self._percentile_us(histograms[group], count, 0.99),
+                                  "max_us": max(stage_durations) / 1e3,
+                                  "total_ms": sum(stage_durations) / 1e6})
+            summary.append(group_summary)
+        return summary
+
+    def _stage_order(self, stage):
+        return self.STAGES.index(stage) if stage in self.STAGES else len(self.STAGES)
+
+    def export_csv(self, file_path):
+        """ Writes every record in the window to a CSV file, one column per FIELDS entry. """
+        with open(file_path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(self.FIELDS)
+            writer.writerows(self.window)
+
+    def export_json(self, file_path, group_by=("command", "stage")):
+        """ Writes the summary, grouped by group_by, and every record in the window to a JSON file. """
+        records = [dict(zip(self.FIELDS, record)) for record in self.window]
+        with open(file_path, 'w') as json_file:
+            json.dump({"summary": self.summary(group_by), "records": records}, json_file, indent=2)
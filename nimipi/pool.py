@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+import nidigital
+from nimipi import rffe
+
+
+class SessionPool:
+    """ Opens and configures one nidigital session per digital pattern instrument, then runs RFFE command lists on
+        them in parallel. Each instrument has its own single worker thread, so command lists for the same instrument
+        run one after the other in submission order while different instruments burst at the same time, and a busy
+        instrument never holds up the queue of another.
+        A command list uses the burst_sequence format, a list of (command function, RegisterData) pairs. """
+    def __init__(self, resource_names, pin_map_file_path, specifications_file_path, levels_file_path, timing_file_path,
+                 pattern_directory_path, pin_name="RFFEDATA", configure_session=None):
+        self.resource_names = list(resource_names)
+        self.pin_name = pin_name
+        self.sessions = []
+        self.executors = [ThreadPoolExecutor(max_workers=1) for _ in self.resource_names]
+        opened = [executor.submit(nidigital.Session, resource_name, True, False) for executor, resource_name in zip(self.executors, self.resource_names)]
+        self.sessions = [future.result() for future in opened if future.exception() is None] # keep what opened so close() can clean up
+        try:
+            for future in opened:
+                if future.exception() is not None:
+                    raise future.exception()
+            configured = [executor.submit(self._configure, session, pin_map_file_path, specifications_file_path, levels_file_path,
+                                          timing_file_path, pattern_directory_path, configure_session)
+                          for executor, session in zip(self.executors, self.sessions)]
+            for future in configured:
+                future.result()
+        except Exception:
+            self.close()
+            raise
+
+    def _configure(self, session, pin_map_file_path, specifications_file_path, levels_file_path, timing_file_path, pattern_directory_path, configure_session):
+        rffe.load_pin_map(session, pin_map_file_path)
+        rffe.load_sheets(session, specifications_file_path, levels_file_path, timing_file_path)
+        rffe.load_patterns(session, pattern_directory_path)
+        if configure_session is not None:
+            configure_session(session) # e.g. PPMU setup of RFFEVIO
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run(self, instrument_index, command_list, single_burst):
+        session = self.sessions[instrument_index]
+        if single_burst:
+            return rffe.burst_sequence(session, self.pin_name, command_list)
+        return [command_function(session, self.pin_name, register_data) for command_function, register_data in command_list]
+
+    def submit(self, instrument_index, command_list, single_burst=False):
+        """ Queues a command list for the instrument at instrument_index and returns a concurrent.futures.Future.
+            The result is one entry per command (None for writes), or the burst_sequence read data with single_burst set. """
+        return self.executors[instrument_index].submit(self._run, instrument_index, list(command_list), single_burst)
+
+    def run(self, jobs, single_burst=False):
+        """ Runs a list of (instrument index, command list) jobs, in parallel across instruments, and returns their results
+            in submission order. """
+        futures = [self.submit(instrument_index, command_list, single_burst) for instrument_index, command_list in jobs]
+        return [future.result() for future in futures]
+
+    def close(self):
+        """ Waits for queued command lists, then closes every session. """
+        for executor in self.executors:
+            executor.shutdown(wait=True)
+        for session in self.sessions:
+            session.close()
+        self.sessions = []
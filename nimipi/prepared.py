@@ -0,0 +1,85 @@
+import time
+import nidigital
+import numpy
+from nimipi.rffe import RegisterData, RffeException
+# aliased, since names starting with two underscores cannot be used inside a class body
+from nimipi.rffe import __Command as _Command, __ODD_PARITY_TABLE as _ODD_PARITY_TABLE, __calc_loop_count as _calc_loop_count, \
+    __create_source_waveform_data as _create_source_waveform_data, __data_check as _data_check, __fetch_read_data as _fetch_read_data, \
+    __is_read_command as _is_read_command, __record_stage as _record_stage, __sequence_command as _sequence_command, \
+    __start_burst as _start_burst, __to_bits as _to_bits
+
+# MSB first bits of every byte value, one row per value
+_BYTE_BITS_TABLE = _to_bits(numpy.arange(0x100, dtype=numpy.uint32), 8)
+
+
+class PreparedCommand:
+    """ Handle for repeating one command on a fixed pin, slave and register address, made by prepare_command.
+        The frame is encoded once; write only patches the data bits and their parity into the reused source waveform
+        buffer before bursting, and read bursts the prepared frame as is. Bursts go through the same path as the
+        nimipi.rffe command functions, so waveforms are created again after a pattern or pin map reload and the stages
+        show up in the instrumentation like theirs, with the data patch as the encode stage. """
+    def __init__(self, session, pin_name, command, register_data, byte_count, source_waveform_data, data_starts, data_width, parity_flip):
+        self.session = session
+        self.pin_name = pin_name
+        self.command = command
+        self.register_data = register_data
+        self.byte_count = byte_count
+        self.source_waveform_data = source_waveform_data
+        self.data_starts = data_starts
+        self.data_width = data_width
+        self.parity_flip = parity_flip
+        self.max_data = (1 << data_width) - 1
+
+    def _burst(self):
+        return _start_burst(self.session, self.pin_name, self.command, self.register_data, self.byte_count, self.source_waveform_data, True)
+
+    def write(self, write_data):
+        """ Bursts the prepared write with new data, either one int or a list of byte_count ints. """
+        if _is_read_command(self.command):
+            raise RffeException(5000, "The prepared command is a read, use read instead.")
+        if isinstance(write_data, (int, numpy.integer)):
+            write_data = [write_data]
+        if len(write_data) != self.byte_count:
+            raise RffeException(5000, "The prepared command writes " + str(self.byte_count) + " bytes, found " + str(len(write_data)) + '.')
+        for data in write_data:
+            if not 0 <= data <= self.max_data:
+                raise RffeException(5000, "Write data out of range. Expected [0x00, " + "0x{:02X}], found ".format(self.max_data) + repr(data) + '.')
+        start = time.perf_counter_ns()
+        for data_start, data in zip(self.data_starts, write_data):
+            self.source_waveform_data[data_start:data_start + self.data_width] = _BYTE_BITS_TABLE[data, 8 - self.data_width:]
+            self.source_waveform_data[data_start + self.data_width] = _ODD_PARITY_TABLE[data] ^ self.parity_flip
+        _record_stage("encode", (self.session, self.pin_name, "", self.command, self.register_data), start)
+        self._burst()
+
+    def read(self, as_array=False):
+        """ Bursts the prepared read and returns the read data, as a numpy array with as_array set. """
+        if not _is_read_command(self.command):
+            raise RffeException(5000, "The prepared command is a write, use write instead.")
+        source_waveform_name = self._burst()
+        return _fetch_read_data(self.session, self.pin_name, self.command, source_waveform_name, self.register_data, as_array)
+
+
+def prepare_command(session, pin_name, command_function, slave_address, register_address, byte_count=1):
+    """ Validates and encodes one of the nimipi.rffe command functions, e.g. rffe.reg_write, for a fixed slave and register
+        address and returns a PreparedCommand. Use it in update loops that repeat the same command with only the data changing. """
+    assert isinstance(session, nidigital.Session)
+    command = _sequence_command(command_function)
+    is_read = _is_read_command(command)
+    register_data = RegisterData(slave_address, register_address, [] if is_read else [0] * byte_count, byte_count)
+    _data_check(command, register_data)
+    encoded_byte_count, source_waveform_data = _create_source_waveform_data(command, register_data)
+    source_waveform_data = numpy.array(source_waveform_data, dtype=numpy.uint32)
+    parity_flip = 0
+    data_width = 8
+    if command == _Command.REG_0_WRITE: # SA[3:0] D[6:0] P, the parity also covers SA and the command bit
+        data_starts = [4]
+        data_width = 7
+        parity_flip = (bin(slave_address).count('1') + 1) % 2
+    elif command == _Command.REG_WRITE: # SA[3:0] A[4:0] P D[7:0] P
+        data_starts = [10]
+    elif command == _Command.REG_WRITE_EXT or command == _Command.REG_WRITE_EXT_LONG: # command frame, address frame, then D[7:0] P per byte
+        data_start = (9 if command == _Command.REG_WRITE_EXT else 8) + 9 * _calc_loop_count(command)
+        data_starts = [data_start + 9 * i for i in range(encoded_byte_count)]
+    else:
+        data_starts = []
+    return PreparedCommand(session, pin_name, command, register_data, encoded_byte_count, source_waveform_data, data_starts, data_width, parity_flip)
@@ -1,4 +1,6 @@
-import nidigital, enum
+import nidigital, enum, time, weakref
+import numpy
+from nimipi.instrumentation import StageRecorder
 
 class __BitOrder(enum.Enum): # created because beta version of nidigital does not define this enum
     MSB_FIRST = 2500
@@ -10,6 +12,11 @@ class __DataMapping(enum.Enum): # created because beta version of nidigital does
     SITE_UNIQUE = 2601
 
 
+class __TriggerType(enum.Enum): # created because beta version of nidigital does not define this enum
+    NONE = 1700
+    DIGITAL_EDGE = 1701
+
+
 class RffeException(Exception):
     def __init__(self, code, message):
         self.code = code
@@ -69,7 +76,7 @@ def __data_check(command, register_data):
     raise RffeException(5000, "The specified command " + command.name + " is not supported.")
 
 
-def __create_waveforms(session, pin_name, command):
+def __create_waveforms(session, pin_name, command, data_mapping=__DataMapping.BROADCAST):
     """ Creates 1 bit sample width source and 8 bit sample width capture waveforms, using appropriate name for the command. """
     assert isinstance(session, nidigital.Session)
     if command == __Command.REG_0_WRITE:
@@ -88,11 +95,61 @@ def __create_waveforms(session, pin_name, command):
         source_waveform_name = "RegReadExtLong"
     else:
         raise RffeException(5000, "The specified command " + command.name + " is not supported.")
-    session.create_source_waveform_serial(pin_name, source_waveform_name, __DataMapping.BROADCAST.value, 1, __BitOrder.MSB_FIRST.value)
+    __load_pending_pattern(session, source_waveform_name) # the pattern and its source waveform share the name
+    if __waveforms_registered(session, pin_name, source_waveform_name, data_mapping):
+        return source_waveform_name
+    session.create_source_waveform_serial(pin_name, source_waveform_name, data_mapping.value, 1, __BitOrder.MSB_FIRST.value)
     session.create_capture_waveform_serial(pin_name, source_waveform_name, 8, __BitOrder.MSB_FIRST.value)
+    __register_waveforms(session, pin_name, source_waveform_name, data_mapping)
     return source_waveform_name
 
 
+# Waveforms already created on each session, so bursts can skip the create calls. Entries go away with their session.
+__waveform_registry = weakref.WeakKeyDictionary()
+
+
+def __waveform_registry_entry(session):
+    """ Returns the registry entry for a session, creating an empty one on first use. """
+    entry = __waveform_registry.get(session)
+    if entry is None:
+        entry = {"waveforms": {}, "loaded_sequences": {}, "created_calls": 0, "saved_calls": 0}
+        __waveform_registry[session] = entry
+    return entry
+
+
+def __waveforms_registered(session, pin_name, waveform_name, data_mapping):
+    """ Returns True if the source and capture waveforms already exist on the session with the same data mapping.
+        Each hit saves the two create calls. """
+    entry = __waveform_registry_entry(session)
+    if entry["waveforms"].get((pin_name, waveform_name)) != data_mapping:
+        return False
+    entry["saved_calls"] += 2
+    return True
+
+
+def __register_waveforms(session, pin_name, waveform_name, data_mapping):
+    """ Records that the source and capture waveforms for waveform_name were created on the session. """
+    entry = __waveform_registry_entry(session)
+    entry["waveforms"][(pin_name, waveform_name)] = data_mapping
+    entry["created_calls"] += 2
+
+
+def reset_waveform_registry(session=None):
+    """ Forgets the waveforms created on the session, or on every session if none is given, so the next burst creates them again.
+        The call counters are kept. load_pin_map and load_patterns call this automatically; call it directly after reloading patterns or the pin map any other way. """
+    sessions = list(__waveform_registry.keys()) if session is None else [session]
+    for registered_session in sessions:
+        __waveform_registry_entry(registered_session)["waveforms"].clear()
+        __waveform_registry_entry(registered_session)["loaded_sequences"].clear()
+
+
+def waveform_registry_stats(session):
+    """ Returns a dict with the number of waveforms registered for the session, the driver create calls made
+        and the driver create calls saved by reusing registered waveforms. """
+    entry = __waveform_registry_entry(session)
+    return {"waveforms": len(entry["waveforms"]), "created_calls": entry["created_calls"], "saved_calls": entry["saved_calls"]}
+
+
 def __parity_calc(input_string):
     """ Calculates and returns an odd parity bit.
         For an even number of 1s, this function returns a 1.
@@ -146,21 +203,38 @@ def __calc_loop_count(command):
     return 1
     
 
-def __value_to_format(value):
-    value_hex = "{:02X}".format(value)
-    value_hex_len = len(value_hex)
-    value_bin_len = 4 * value_hex_len
-    return "0{:d}b".format(value_bin_len)
-
-
 def __data_to_string(write_data):
     """ Converts data array to string."""
     return "".join(["{:08b}".format(data) for data in write_data])
 
 
+def __max_write_byte_count(command):
+    """ Returns the most write data bytes a command can send, 0 for read commands. """
+    if command == __Command.REG_WRITE_EXT:
+        return 16
+    if command == __Command.REG_WRITE_EXT_LONG:
+        return 8
+    if command == __Command.REG_0_WRITE or command == __Command.REG_WRITE:
+        return 1
+    return 0
+
+
+def __write_data_check(command, write_data_lengths):
+    """ Checks that every write has between 1 and __max_write_byte_count bytes of write data, since the frames take their
+        byte count from the write data. Raises RffeException for the first length out of range. """
+    max_byte_count = __max_write_byte_count(command)
+    if max_byte_count == 0:
+        return
+    write_data_lengths = numpy.asarray(write_data_lengths)
+    out_of_range = numpy.flatnonzero((write_data_lengths < 1) | (write_data_lengths > max_byte_count))
+    if len(out_of_range):
+        raise RffeException(5000, "Write data length out of range. Expected [1, " + str(max_byte_count) + "], found " + str(int(write_data_lengths[out_of_range[0]])) + '.')
+
+
 def __create_source_waveform_data(command, register_data):
     """ Creates data to write into source waveform. """
     assert isinstance(register_data, RegisterData)
+    __write_data_check(command, [len(register_data.write_data)])
     if command == __Command.REG_0_WRITE:
         # For Reg0Write, build 4 bit SA and 7 bit Data with parity.
         # COMMAND/ADDRESS/DATA FRAME
@@ -200,8 +274,7 @@ def __create_source_waveform_data(command, register_data):
         slave_address_bit_string = "{:04b}".format(register_data.slave_address)
         parity_bit = __parity_calc(slave_address_bit_string + result_string)
         command_frame = slave_address_bit_string + byte_count_string + parity_bit
-        format_string = __value_to_format(register_data.register_address)
-        register_address_bit_string = "{:{:s}}".format(register_data.register_address, format_string)
+        register_address_bit_string = "{:0{:d}b}".format(register_data.register_address, 8 * __calc_loop_count(command))
         address_frame = ""
         for i in range(__calc_loop_count(command)):
             register_address_byte_string = register_address_bit_string[i*8:i*8 + 8]
@@ -222,8 +295,7 @@ def __create_source_waveform_data(command, register_data):
         slave_address_bit_string = "{:04b}".format(register_data.slave_address)
         parity_bit = __parity_calc(slave_address_bit_string + result_string)
         command_frame = slave_address_bit_string + byte_count_string + parity_bit
-        format_string = __value_to_format(register_data.register_address)
-        register_address_bit_string = "{:{:s}}".format(register_data.register_address, format_string)
+        register_address_bit_string = "{:0{:d}b}".format(register_data.register_address, 8 * __calc_loop_count(command))
         address_frame = ""
         for i in range(__calc_loop_count(command)):
             register_address_byte_string = register_address_bit_string[i*8:i*8 + 8]
@@ -234,51 +306,442 @@ def __create_source_waveform_data(command, register_data):
     raise RffeException(5000, "The specified command " + command.name + " is not supported.")
 
 
-def __burst_command(session, pin_name, command, register_data):
+__ODD_PARITY_TABLE = numpy.array([1 - bin(value).count('1') % 2 for value in range(0x100)], dtype=numpy.uint32)
+
+
+def __parity_lookup(values):
+    """ Vectorized version of __parity_calc. Folds each value down to one byte with XOR, which preserves parity,
+        then looks up the odd parity bit in a 256 entry table. """
+    values = numpy.asarray(values, dtype=numpy.uint32)
+    values = values ^ (values >> 16)
+    values = values ^ (values >> 8)
+    return __ODD_PARITY_TABLE[values & 0xFF]
+
+
+def __to_bits(values, width):
+    """ Expands an array of integers into an MSB first array of bits with shape (len(values), width). """
+    shifts = numpy.arange(width - 1, -1, -1, dtype=numpy.uint32)
+    return (numpy.asarray(values, dtype=numpy.uint32)[:, None] >> shifts) & 1
+
+
+def __to_bits_with_parity(values, width):
+    """ Expands an array of integers into bits, each value followed by its odd parity bit. """
+    return numpy.concatenate((__to_bits(values, width), __parity_lookup(values)[:, None]), axis=1)
+
+
+def __create_address_frame_batch(command, register_addresses):
+    """ Creates the 8 or 16 bit extended address frames, with a parity bit after every address byte. """
+    loop_count = __calc_loop_count(command)
+    address_bytes = numpy.stack([(register_addresses >> (8 * (loop_count - 1 - i))) & 0xFF for i in range(loop_count)], axis=1)
+    return __to_bits_with_parity(address_bytes.ravel(), 8).reshape(len(register_addresses), -1)
+
+
+def __register_data_columns(register_data_list, max_byte_count):
+    """ Returns the slave addresses, register addresses, byte counts, write data lengths and write data of
+        register_data_list as arrays. Write data is zero padded to max_byte_count columns.
+        A RegisterTable provides these straight from its arrays through its columns method. """
+    columns = getattr(register_data_list, "columns", None)
+    if columns is not None:
+        return columns(max_byte_count)
+    count = len(register_data_list)
+    slave_addresses = numpy.fromiter((register_data.slave_address for register_data in register_data_list), numpy.uint32, count)
+    register_addresses = numpy.fromiter((register_data.register_address for register_data in register_data_list), numpy.uint32, count)
+    byte_counts = numpy.fromiter((register_data.byte_count for register_data in register_data_list), numpy.uint32, count)
+    write_data_lengths = numpy.fromiter((len(register_data.write_data) for register_data in register_data_list), numpy.uint32, count)
+    write_data = numpy.zeros((count, max_byte_count), dtype=numpy.uint32)
+    if max_byte_count:
+        for row, register_data in zip(write_data, register_data_list):
+            data = register_data.write_data[:max_byte_count]
+            row[:len(data)] = data
+    return (slave_addresses, register_addresses, byte_counts, write_data_lengths, write_data)
+
+
+def __create_source_waveform_data_batch(command, register_data_list):
+    """ Creates source waveform data for every entry in register_data_list at once.
+        Returns a tuple of (byte counts, bits) where bits has one row per entry. Each row matches the data
+        returned by __create_source_waveform_data for the same entry bit for bit, and write data lengths out of range
+        raise the same RffeException. """
+    max_byte_count = __max_write_byte_count(command)
+    slave_addresses, register_addresses, read_byte_counts, write_data_lengths, write_data = __register_data_columns(register_data_list, max_byte_count)
+    __write_data_check(command, write_data_lengths)
+    count = len(slave_addresses)
+    if command == __Command.REG_0_WRITE:
+        # SA[3:0] + D[6:0] + parity, the parity also covers the command bit
+        write_data = write_data[:, 0]
+        parity_bits = __parity_lookup((slave_addresses << 8) | (1 << 7) | write_data)
+        bits = numpy.concatenate((__to_bits(slave_addresses, 4), __to_bits(write_data, 7), parity_bits[:, None]), axis=1)
+        return (numpy.ones(count, dtype=numpy.uint32), bits)
+    if command == __Command.REG_WRITE:
+        # SA[3:0] + A[4:0] + parity, the parity also covers command bits 010, then D[7:0] + parity
+        write_data = write_data[:, 0]
+        parity_bits = __parity_lookup((slave_addresses << 8) | (0b010 << 5) | register_addresses)
+        bits = numpy.concatenate((__to_bits(slave_addresses, 4), __to_bits(register_addresses, 5), parity_bits[:, None], __to_bits_with_parity(write_data, 8)), axis=1)
+        return (numpy.ones(count, dtype=numpy.uint32), bits)
+    if command == __Command.REG_READ or command == __Command.REG_READ_HR:
+        # SA[3:0] + A[4:0] + parity, the parity also covers command bits 011
+        parity_bits = __parity_lookup((slave_addresses << 8) | (0b011 << 5) | register_addresses)
+        bits = numpy.concatenate((__to_bits(slave_addresses, 4), __to_bits(register_addresses, 5), parity_bits[:, None]), axis=1)
+        return (numpy.ones(count, dtype=numpy.uint32), bits)
+    if command == __Command.REG_WRITE_EXT or command == __Command.REG_WRITE_EXT_LONG:
+        # SA[3:0] + BC[3:0]/BC[2:0] + parity, A[7:0]/A[15:0] with parity per byte, up to 16/8 bytes of data with parity, zero padded
+        byte_count_width = 4 if command == __Command.REG_WRITE_EXT else 3
+        byte_counts = write_data_lengths
+        parity_bits = __parity_lookup((slave_addresses << byte_count_width) | (byte_counts - 1))
+        command_frame = numpy.concatenate((__to_bits(slave_addresses, 4), __to_bits(byte_counts - 1, byte_count_width), parity_bits[:, None]), axis=1)
+        address_frame = __create_address_frame_batch(command, register_addresses)
+        data_frame = __to_bits_with_parity(write_data.ravel(), 8).reshape(count, max_byte_count, 9)
+        data_frame[numpy.arange(max_byte_count)[None, :] >= byte_counts[:, None]] = 0 # bytes past the byte count become padding
+        frame = numpy.concatenate((command_frame, address_frame, data_frame.reshape(count, -1)), axis=1)
+        padding = numpy.zeros((count, 163 - frame.shape[1]), dtype=numpy.uint32)
+        return (byte_counts, numpy.concatenate((frame, padding), axis=1))
+    if command == __Command.REG_READ_EXT or command == __Command.REG_READ_EXT_HR or command == __Command.REG_READ_EXT_LONG or command == __Command.REG_READ_EXT_LONG_HR:
+        # SA[3:0] + BC[3:0]/BC[2:0] + parity, the parity also covers the odd command bit, then A[7:0]/A[15:0] with parity per byte
+        byte_count_width = 4 if command == __Command.REG_READ_EXT or command == __Command.REG_READ_EXT_HR else 3
+        byte_counts = read_byte_counts
+        parity_bits = __parity_lookup((slave_addresses << (byte_count_width + 1)) | (1 << byte_count_width) | (byte_counts - 1))
+        command_frame = numpy.concatenate((__to_bits(slave_addresses, 4), __to_bits(byte_counts - 1, byte_count_width), parity_bits[:, None]), axis=1)
+        address_frame = __create_address_frame_batch(command, register_addresses)
+        return (byte_counts, numpy.concatenate((command_frame, address_frame), axis=1))
+    raise RffeException(5000, "The specified command " + command.name + " is not supported.")
+
+
+def __burst_command(session, pin_name, command, register_data, as_array=False):
     """ Bursts RFFE """
     assert isinstance(session, nidigital.Session)
     assert isinstance(register_data, RegisterData)
+    byte_count, source_waveform_data = __check_and_encode(session, pin_name, command, register_data)
+    return __burst_source_waveform_data(session, pin_name, command, register_data, byte_count, source_waveform_data, as_array)
+
+
+def __check_and_encode(session, pin_name, command, register_data):
+    """ Validates and encodes one command. Returns (byte count, source waveform data) like __create_source_waveform_data. """
+    context = (session, pin_name, "", command, register_data)
+    start = time.perf_counter_ns()
     __data_check(command, register_data)
+    start = __record_stage("data_check", context, start)
+    encoded = __create_source_waveform_data(command, register_data)
+    __record_stage("encode", context, start)
+    return encoded
+
+
+def __burst_source_waveform_data(session, pin_name, command, register_data, byte_count, source_waveform_data, as_array=False):
+    """ Bursts already encoded source waveform data. Returns read data for read commands, otherwise None. """
+    source_waveform_name = __start_burst(session, pin_name, command, register_data, byte_count, source_waveform_data, True)
+    return __fetch_read_data(session, pin_name, command, source_waveform_name, register_data, as_array)
+
+
+# Set by enable_instrumentation. The burst paths only check it for None, so timing costs nothing while disabled.
+__stage_recorder = None
+
+# Names of the sessions seen by the instrumentation, so the driver is asked once per session. Entries go away with their session.
+__session_names = weakref.WeakKeyDictionary()
+
+
+def __session_name(session):
+    """ Returns the resource name of a session for the instrumentation tags, or its id if the driver does not tell. """
+    if session is None:
+        return ""
+    name = __session_names.get(session)
+    if name is None:
+        name = getattr(session, "resource_name", None)
+        if name is None:
+            try:
+                name = session.io_resource_descriptor
+            except Exception: # no driver attribute to ask, e.g. a closed session
+                name = "session 0x{:X}".format(id(session))
+        __session_names[session] = name
+    return name
+
+
+def __record_stage(stage, context, start):
+    """ Records the time since start for a stage and returns the current time to start the next stage. context is
+        (session, pin name, site list, command, register data). The command may be a name, and register data is None for
+        stages that cover several commands. Returns start right away while instrumentation is disabled. """
+    recorder = __stage_recorder
+    if recorder is None:
+        return start
+    now = time.perf_counter_ns()
+    session, pin_name, site_list, command, register_data = context
+    slave_address, register_address = (None, None) if register_data is None else (register_data.slave_address, register_data.register_address)
+    recorder.record(stage, getattr(command, "name", command), slave_address, register_address, now - start, __session_name(session), pin_name, site_list)
+    return now
+
+
+def enable_instrumentation(window_size=10000):
+    """ Starts timing every stage of every command burst through this module. Returns the StageRecorder that collects
+        the durations; use its summary, export_csv and export_json methods to report them. """
+    global __stage_recorder
+    __stage_recorder = StageRecorder(window_size)
+    return __stage_recorder
+
+
+def disable_instrumentation():
+    """ Stops timing commands. Returns the StageRecorder that was collecting, or None. """
+    global __stage_recorder
+    recorder, __stage_recorder = __stage_recorder, None
+    return recorder
+
+
+def instrumentation_summary(group_by=("command", "stage")):
+    """ Returns the summary of the enabled StageRecorder grouped by group_by, see StageRecorder.summary, or an empty list
+        while instrumentation is disabled. """
+    recorder = __stage_recorder
+    return recorder.summary(group_by) if recorder is not None else []
+
+
+def __start_burst(session, pin_name, command, register_data, byte_count, source_waveform_data, wait_until_done):
+    """ Writes the source waveform data and byte count, then starts the burst. Returns the source waveform name.
+        With wait_until_done False the burst keeps running on the instrument; call __wait_for_burst before fetching.
+        Waveform creation counts towards the write_source_waveform stage. """
+    context = (session, pin_name, "", command, register_data)
+    start = time.perf_counter_ns()
     source_waveform_name = __create_waveforms(session, pin_name, command)
-    byte_count, source_waveform_data = __create_source_waveform_data(command, register_data)
     session.write_source_waveform_broadcast(source_waveform_name, source_waveform_data)
+    start = __record_stage("write_source_waveform", context, start)
     session.write_sequencer_register("reg0", byte_count)
-    session.burst_pattern("", source_waveform_name, True, True, 10)
+    start = __record_stage("write_sequencer_register", context, start)
+    session.burst_pattern("", source_waveform_name, True, wait_until_done, 10)
+    __record_stage("burst_pattern", context, start)
+    return source_waveform_name
+
+
+def __wait_for_burst(session, pin_name, command, register_data):
+    """ Waits for a burst started by __start_burst without waiting to finish. """
+    start = time.perf_counter_ns()
+    session.wait_until_done(10)
+    __record_stage("wait_until_done", (session, pin_name, "", command, register_data), start)
+
+
+def __fetch_read_data(session, pin_name, command, source_waveform_name, register_data, as_array=False):
+    """ Fetches the read data of a finished burst. Returns None for write commands.
+        With as_array set the read data is a numpy array over the fetched samples instead of a list, which avoids the copy. """
     if command == __Command.REG_0_WRITE or command == __Command.REG_WRITE \
         or command == __Command.REG_WRITE_EXT or command == __Command.REG_WRITE_EXT_LONG:
         return
     if command == __Command.REG_READ or command == __Command.REG_READ_HR \
         or command == __Command.REG_READ_EXT or command == __Command.REG_READ_EXT_HR \
         or command == __Command.REG_READ_EXT_LONG or command == __Command.REG_READ_EXT_LONG_HR:
+        start = time.perf_counter_ns()
         capture_waveform = session.fetch_capture_waveform("", source_waveform_name, register_data.byte_count, 1)
+        __record_stage("fetch_capture_waveform", (session, pin_name, "", command, register_data), start)
+        if as_array:
+            return numpy.asarray(capture_waveform[0])
         return list(capture_waveform[0])
     raise RffeException(5000, "The specified command " + command.name + " is not supported.")
 
 
-def load_patterns(session, pattern_directory_path):
-    """ Loads all *.digipat files in the specified directory onto the instrument. """
+# Files loaded on each session with the signature they had, so unchanged files are not loaded again. Entries go away with their session.
+__load_registry = weakref.WeakKeyDictionary()
+
+
+def __load_registry_entry(session):
+    """ Returns the load registry entry for a session, creating an empty one on first use. """
+    entry = __load_registry.get(session)
+    if entry is None:
+        entry = {"files": {}, "pending_patterns": {}, "applied_sheets": None, "frequency_sheets": {}, "sheet_directory": None,
+                 "loaded": 0, "skipped": 0, "load_seconds": 0.0, "saved_seconds": 0.0}
+        __load_registry[session] = entry
+    return entry
+
+
+def __file_signature(file_path):
+    """ Returns the absolute path, modification time and size of a file. The last two change whenever the file is rewritten. """
+    from os import path, stat
+    file_stat = stat(file_path)
+    return (path.abspath(file_path), file_stat.st_mtime_ns, file_stat.st_size)
+
+
+def __load_file(session, key, file_path, load_function, force):
+    """ Calls load_function unless the file was already loaded under key with the same signature.
+        Skipped loads count the time the last real load took as saved. The path is recorded as given, for unloading.
+        Returns True if the file was loaded. """
+    entry = __load_registry_entry(session)
+    signature = __file_signature(file_path)
+    loaded_file = entry["files"].get(key)
+    if not force and loaded_file is not None and loaded_file[0] == signature:
+        entry["skipped"] += 1
+        entry["saved_seconds"] += loaded_file[1]
+        return False
+    start = time.perf_counter()
+    load_function(file_path)
+    duration = time.perf_counter() - start
+    entry["files"][key] = (signature, duration, file_path)
+    entry["loaded"] += 1
+    entry["load_seconds"] += duration
+    return True
+
+
+def __load_pending_pattern(session, pattern_name):
+    """ Loads a pattern deferred by load_patterns with lazy set, the first time it is bursted. """
+    entry = __load_registry.get(session)
+    if entry is None or not entry["pending_patterns"]:
+        return
+    file_path = entry["pending_patterns"].pop(pattern_name, None)
+    if file_path is not None:
+        __load_file(session, ("pattern", pattern_name), file_path, session.load_pattern, False)
+
+
+def __pattern_name(pattern_file_path):
+    """ Returns the pattern name of an RFFE_<name>.digipat file, which is also its start label. """
+    from os import path
+    pattern_name = path.splitext(path.basename(pattern_file_path))[0]
+    if pattern_name.startswith("RFFE_"):
+        pattern_name = pattern_name[len("RFFE_"):]
+    return pattern_name
+
+
+def is_pattern_loaded(session, pattern_name):
+    """ Returns True if the pattern, e.g. "RegSequence", was loaded through load_patterns or load_pattern since the last
+        pin map load, or is waiting to be loaded lazily. """
+    entry = __load_registry.get(session)
+    return entry is not None and (("pattern", pattern_name) in entry["files"] or pattern_name in entry["pending_patterns"])
+
+
+def load_pattern(session, pattern_file_path, force=False):
+    """ Loads one pattern file onto the instrument, e.g. a compiled RFFE_RegSequence.digipat kept outside the pattern directory.
+        The pattern name is the file name without the RFFE_ prefix. An unchanged file that is already loaded is skipped unless force is set. """
+    assert isinstance(session, nidigital.Session)
+    pattern_name = __pattern_name(pattern_file_path)
+    __load_registry_entry(session)["pending_patterns"].pop(pattern_name, None)
+    if __load_file(session, ("pattern", pattern_name), pattern_file_path, session.load_pattern, force):
+        reset_waveform_registry(session)
+
+
+def load_patterns(session, pattern_directory_path, lazy=False, force=False):
+    """ Loads all *.digipat files in the specified directory onto the instrument.
+        Patterns already loaded from an unchanged file are skipped unless force is set. With lazy set, each RFFE_<name>.digipat
+        is only loaded right before the first burst of the <name> pattern; leave it cleared for deterministic burst timing. """
     assert isinstance(session, nidigital.Session)
     from glob import glob
     from os import path
     digipat_file_paths = glob(path.join(pattern_directory_path, "*.digipat"))
+    entry = __load_registry_entry(session)
+    any_loaded = False
     for digipat_path in digipat_file_paths:
-        session.load_pattern(digipat_path)
+        pattern_name = __pattern_name(digipat_path)
+        if lazy:
+            entry["pending_patterns"][pattern_name] = digipat_path
+            continue
+        entry["pending_patterns"].pop(pattern_name, None)
+        any_loaded = __load_file(session, ("pattern", pattern_name), digipat_path, session.load_pattern, force) or any_loaded
+    if any_loaded:
+        reset_waveform_registry(session)
 
 
-def load_pin_map(session, pin_map_file_path):
+def load_pin_map(session, pin_map_file_path, force=False):
     """ Calls nidigital.load_pin_map using the specified file path.
-        This function is included to keep parity between the LabVIEW reference architecture and Python port."""
+        This function is included to keep parity between the LabVIEW reference architecture and Python port.
+        An unchanged pin map that is already loaded is skipped unless force is set. Loading a pin map unloads patterns and
+        sheets, so they are loaded again by the next load_patterns and load_sheets. """
     assert isinstance(session, nidigital.Session)
-    session.load_pin_map(pin_map_file_path)
+    if __load_file(session, ("pin_map",), pin_map_file_path, session.load_pin_map, force):
+        entry = __load_registry_entry(session)
+        entry["files"] = {key: loaded_file for key, loaded_file in entry["files"].items() if key == ("pin_map",)}
+        entry["pending_patterns"].clear()
+        entry["applied_sheets"] = None
+        reset_waveform_registry(session)
     
 
-def load_sheets(session, specifications_file_path, levels_file_path, timing_file_path):
-    """ Loads specifications, levels, and timing sheets onto the instrument then applies them. """
+def load_sheets(session, specifications_file_path, levels_file_path, timing_file_path, force=False):
+    """ Loads specifications, levels, and timing sheets onto the instrument then applies them.
+        Sheets already loaded from an unchanged file are skipped unless force is set, however their paths are spelled;
+        levels and timing are only applied again if one of the sheets was loaded. """
     assert isinstance(session, nidigital.Session)
-    session.load_specifications(specifications_file_path)
-    session.load_levels(levels_file_path)
-    session.load_timing(timing_file_path)
-    session.apply_levels_and_timing("", levels_file_path, timing_file_path, "", "", "")
+    from os import path
+    any_loaded = __load_file(session, ("specifications", path.abspath(specifications_file_path)), specifications_file_path, session.load_specifications, force)
+    any_loaded = __load_file(session, ("levels", path.abspath(levels_file_path)), levels_file_path, session.load_levels, force) or any_loaded
+    any_loaded = __load_file(session, ("timing", path.abspath(timing_file_path)), timing_file_path, session.load_timing, force) or any_loaded
+    entry = __load_registry_entry(session)
+    applied_sheets = (path.abspath(levels_file_path), path.abspath(timing_file_path))
+    if any_loaded or entry["applied_sheets"] != applied_sheets:
+        session.apply_levels_and_timing("", levels_file_path, timing_file_path, "", "", "")
+        entry["applied_sheets"] = applied_sheets
+
+
+def __sheet_directory(session):
+    """ Returns the temporary directory the sheets generated for a session are written to, creating it on first use.
+        The directory and everything in it is removed when the session is garbage collected or the interpreter exits. """
+    import shutil, tempfile
+    entry = __load_registry_entry(session)
+    if entry["sheet_directory"] is None:
+        entry["sheet_directory"] = tempfile.mkdtemp(prefix="nimipi_sheets_")
+        weakref.finalize(session, shutil.rmtree, entry["sheet_directory"], True)
+    return entry["sheet_directory"]
+
+
+def __write_specifications(specifications_file_path, frequency, directory_path):
+    """ Writes a copy of the specifications sheet with AC.Frequency set to frequency to directory_path and returns its path.
+        The file name holds a hash of the source sheet path and contents and the frequency, so sheets from different sources
+        never share a file, and setting the same frequency again rewrites the same file with the same contents. """
+    import hashlib, io, os, tempfile
+    from os import path
+    from xml.etree import ElementTree
+    with open(specifications_file_path, 'rb') as specifications_file:
+        source_digest = hashlib.sha256(path.abspath(specifications_file_path).encode() + b"\0" + specifications_file.read()).hexdigest()[:16]
+    for _, (prefix, uri) in ElementTree.iterparse(specifications_file_path, events=("start-ns",)):
+        ElementTree.register_namespace(prefix, uri) # keep the f: prefix and default namespace the sheet was written with
+    tree = ElementTree.parse(specifications_file_path)
+    frequency_formulas = [formula for section in tree.getroot() if section.get("name") == "AC"
+                          for formula in section if formula.get("symbol") == "Frequency"]
+    if not frequency_formulas:
+        raise RffeException(5000, specifications_file_path + " does not define AC.Frequency.")
+    for formula in frequency_formulas:
+        formula[0].text = "{:.9g}".format(frequency)
+    file_name = path.splitext(path.basename(specifications_file_path))[0] + "_" + source_digest + "_{:.0f}Hz.specs".format(frequency)
+    frequency_file_path = path.join(directory_path, file_name)
+    contents = io.BytesIO()
+    tree.write(contents, encoding="utf-8", xml_declaration=True)
+    if path.exists(frequency_file_path):
+        with open(frequency_file_path, 'rb') as frequency_file:
+            if frequency_file.read() == contents.getvalue():
+                return frequency_file_path # unchanged, so load_sheets can skip it if it is still loaded
+    # written under a temporary name first, so another process never loads a partial sheet
+    file_descriptor, temporary_file_path = tempfile.mkstemp(suffix=".specs.tmp", dir=directory_path)
+    try:
+        with os.fdopen(file_descriptor, 'wb') as frequency_file:
+            frequency_file.write(contents.getvalue())
+        os.replace(temporary_file_path, frequency_file_path)
+    except Exception:
+        os.remove(temporary_file_path)
+        raise
+    return frequency_file_path
+
+
+def set_bus_frequency(session, frequency, specifications_file_path, levels_file_path, timing_file_path):
+    """ Changes the RFFE clock to frequency in Hz at runtime. The specifications sheet is regenerated with the new AC.Frequency,
+        the sheet it replaces is unloaded, and the new sheet is loaded and applied with load_sheets. The replaced sheet is the
+        one generated from specifications_file_path by the previous call, or specifications_file_path itself; other loaded
+        specifications sheets stay loaded. The timing sheet derives every edge from AC.Period, so the whole bus scales.
+        Generated sheets are written to a temporary directory of the session; the one replaced is deleted.
+        Returns the path of the generated specifications sheet. """
+    assert isinstance(session, nidigital.Session)
+    import os
+    from os import path
+    frequency_file_path = __write_specifications(specifications_file_path, frequency, __sheet_directory(session))
+    entry = __load_registry_entry(session)
+    source_key = path.abspath(specifications_file_path)
+    generated_file_path = entry["frequency_sheets"].get(source_key)
+    for replaced_file_path in (generated_file_path, source_key):
+        loaded_file = entry["files"].pop(("specifications", replaced_file_path), None) if replaced_file_path != frequency_file_path else None
+        if loaded_file is not None:
+            session.unload_specifications(loaded_file[2])
+    if generated_file_path is not None and generated_file_path != frequency_file_path:
+        try:
+            os.remove(generated_file_path)
+        except FileNotFoundError:
+            pass
+    entry["frequency_sheets"][source_key] = frequency_file_path
+    load_sheets(session, frequency_file_path, levels_file_path, timing_file_path)
+    return frequency_file_path
+
+
+def load_report(session):
+    """ Returns a dict with the files loaded and skipped on the session, the seconds spent loading, the seconds saved by
+        skipping unchanged files (based on how long each file took the last time it was loaded) and the patterns still
+        waiting for their first burst. """
+    entry = __load_registry_entry(session)
+    return {"loaded": entry["loaded"], "skipped": entry["skipped"], "load_seconds": entry["load_seconds"],
+            "saved_seconds": entry["saved_seconds"], "pending_patterns": sorted(entry["pending_patterns"])}
 
 
 def reg0_write(session, pin_name, register_data):
@@ -291,28 +754,630 @@ def reg_write(session, pin_name, register_data):
     return __burst_command(session, pin_name, __Command.REG_WRITE, register_data)
 
 
-def reg_read(session, pin_name, register_data):
-    """ Bursts a standard register read command. This function returns one channel of read data. """
-    return __burst_command(session, pin_name, __Command.REG_READ, register_data)
+def reg_read(session, pin_name, register_data, as_array=False):
+    """ Bursts a standard register read command. This function returns one channel of read data.
+        With as_array set the read data is returned as a numpy array instead of a list. """
+    return __burst_command(session, pin_name, __Command.REG_READ, register_data, as_array)
 
 def extended_reg_write(session, pin_name, register_data):
     """ Bursts an extended register write command. """
     return __burst_command(session, pin_name, __Command.REG_WRITE_EXT, register_data)
 
-def extended_reg_read(session, pin_name, register_data):
-    """ Bursts an extended register read command. """
-    return __burst_command(session, pin_name, __Command.REG_READ_EXT, register_data)
+def extended_reg_read(session, pin_name, register_data, as_array=False):
+    """ Bursts an extended register read command. With as_array set the read data is returned as a numpy array instead of a list. """
+    return __burst_command(session, pin_name, __Command.REG_READ_EXT, register_data, as_array)
 
 def extended_reg_write_long(session, pin_name, register_data):
     """ Bursts an extended register write long command. """
     return __burst_command(session, pin_name, __Command.REG_WRITE_EXT_LONG, register_data)
 
-def extended_reg_read_long(session, pin_name, register_data):
-    """ Bursts an extended register read long command. """
-    return __burst_command(session, pin_name, __Command.REG_READ_EXT_LONG, register_data)
+def extended_reg_read_long(session, pin_name, register_data, as_array=False):
+    """ Bursts an extended register read long command. With as_array set the read data is returned as a numpy array instead of a list. """
+    return __burst_command(session, pin_name, __Command.REG_READ_EXT_LONG, register_data, as_array)
+
+def multi_command(session, pin_name, multi_command_write, multi_command_read, single_burst=False):
+    """ Uses looping to execute multiple register writes and register reads.
+        All frames are encoded up front with the batch encoder, so only the bursts happen inside the loops.
+        With single_burst set, the writes and reads are packed into one RegSequence burst instead (see burst_sequence). """
+    if single_burst:
+        sequence = [(extended_reg_write, write_command) for write_command in multi_command_write]
+        sequence += [(extended_reg_read, read_command) for read_command in multi_command_read]
+        return burst_sequence(session, pin_name, sequence)
+    __burst_batch(session, pin_name, __Command.REG_WRITE_EXT, multi_command_write)
+    return __burst_batch(session, pin_name, __Command.REG_READ_EXT, multi_command_read)
+
+
+def __burst_batch(session, pin_name, command, register_data_list):
+    """ Validates and encodes all of register_data_list at once, then bursts one command per entry. """
+    assert isinstance(session, nidigital.Session)
+    if not hasattr(register_data_list, "columns"): # a RegisterTable is encoded straight from its arrays
+        register_data_list = list(register_data_list)
+    context = (session, pin_name, "", command, None) # batch stages cover every entry
+    start = time.perf_counter_ns()
+    for register_data in register_data_list:
+        assert isinstance(register_data, RegisterData)
+        __data_check(command, register_data)
+    if len(register_data_list) == 0:
+        return []
+    start = __record_stage("data_check", context, start)
+    byte_counts, source_waveform_data = __create_source_waveform_data_batch(command, register_data_list)
+    __record_stage("encode", context, start)
+    return [__burst_source_waveform_data(session, pin_name, command, register_data, int(byte_count), bits)
+            for register_data, byte_count, bits in zip(register_data_list, byte_counts, source_waveform_data)]
+
+
+
+def __site_list(sites):
+    """ Builds a site list string such as "site0,site1" from site numbers. """
+    return ",".join("site" + str(site) for site in sites)
+
+
+def __burst_command_multi_site(session, pin_name, command, site_register_data):
+    """ Bursts one command on several sites at once, with different register data per site.
+        site_register_data maps site numbers to RegisterData. Returns read data keyed by site for read commands, otherwise None. """
+    assert isinstance(session, nidigital.Session)
+    sites = sorted(site_register_data)
+    register_data_list = [site_register_data[site] for site in sites]
+    site_list = __site_list(sites)
+    start = time.perf_counter_ns()
+    for register_data in register_data_list:
+        assert isinstance(register_data, RegisterData)
+        __data_check(command, register_data)
+    addresses = set((register_data.slave_address, register_data.register_address) for register_data in register_data_list)
+    context = (session, pin_name, site_list, command, register_data_list[0] if len(addresses) == 1 else None) # addresses are tagged when every site shares them
+    start = __record_stage("data_check", context, start)
+    byte_counts, source_waveform_data = __create_source_waveform_data_batch(command, register_data_list)
+    start = __record_stage("encode", context, start)
+    if len(set(byte_counts.tolist())) > 1:
+        # reg0 holds the byte count for the pattern loop and is shared by all sites on the instrument
+        raise RffeException(5000, "Byte count must be the same on every site, found " + ", ".join(str(byte_count) for byte_count in byte_counts) + '.')
+    source_waveform_name = __create_waveforms(session, pin_name, command, __DataMapping.SITE_UNIQUE)
+    session.write_source_waveform_site_unique(source_waveform_name, dict(zip(sites, source_waveform_data)))
+    start = __record_stage("write_source_waveform", context, start)
+    session.write_sequencer_register("reg0", int(byte_counts[0]))
+    start = __record_stage("write_sequencer_register", context, start)
+    session.burst_pattern(site_list, source_waveform_name, True, True, 10)
+    start = __record_stage("burst_pattern", context, start)
+    if not __is_read_command(command):
+        return
+    capture_waveform = session.fetch_capture_waveform(site_list, source_waveform_name, register_data_list[0].byte_count, 1)
+    __record_stage("fetch_capture_waveform", context, start)
+    if isinstance(capture_waveform, dict):
+        return {site: list(capture_waveform[site]) for site in sites}
+    return {site: list(site_capture_waveform) for site, site_capture_waveform in zip(sites, capture_waveform)}
+
+
+def reg0_write_multi_site(session, pin_name, site_register_data):
+    """ Bursts a Reg0Write command on every site in site_register_data, a dict of site number to RegisterData. This function returns None. """
+    return __burst_command_multi_site(session, pin_name, __Command.REG_0_WRITE, site_register_data)
+
+
+def reg_write_multi_site(session, pin_name, site_register_data):
+    """ Bursts a standard register write command on every site in site_register_data. This function returns None. """
+    return __burst_command_multi_site(session, pin_name, __Command.REG_WRITE, site_register_data)
+
+
+def reg_read_multi_site(session, pin_name, site_register_data):
+    """ Bursts a standard register read command on every site in site_register_data. Returns read data keyed by site number. """
+    return __burst_command_multi_site(session, pin_name, __Command.REG_READ, site_register_data)
+
+
+def extended_reg_write_multi_site(session, pin_name, site_register_data):
+    """ Bursts an extended register write command on every site in site_register_data. """
+    return __burst_command_multi_site(session, pin_name, __Command.REG_WRITE_EXT, site_register_data)
+
+
+def extended_reg_read_multi_site(session, pin_name, site_register_data):
+    """ Bursts an extended register read command on every site in site_register_data. Returns read data keyed by site number. """
+    return __burst_command_multi_site(session, pin_name, __Command.REG_READ_EXT, site_register_data)
+
+
+def extended_reg_write_long_multi_site(session, pin_name, site_register_data):
+    """ Bursts an extended register write long command on every site in site_register_data. """
+    return __burst_command_multi_site(session, pin_name, __Command.REG_WRITE_EXT_LONG, site_register_data)
+
+
+def extended_reg_read_long_multi_site(session, pin_name, site_register_data):
+    """ Bursts an extended register read long command on every site in site_register_data. Returns read data keyed by site number. """
+    return __burst_command_multi_site(session, pin_name, __Command.REG_READ_EXT_LONG, site_register_data)
+
+
+def multi_command_multi_site(session, pin_name, site_multi_command_write, site_multi_command_read):
+    """ Same as multi_command with one write list and one read list per site, given as dicts keyed by site number.
+        Entry i of every site is bursted together, so the lists must have the same length on every site.
+        Returns a dict of site number to the list of read data for that site. """
+    multi_read_data = {site: [] for site in site_multi_command_read}
+    for command, site_register_data_lists in ((__Command.REG_WRITE_EXT, site_multi_command_write), (__Command.REG_READ_EXT, site_multi_command_read)):
+        site_register_data_lists = {site: list(register_data_list) for site, register_data_list in site_register_data_lists.items()}
+        lengths = set(len(register_data_list) for register_data_list in site_register_data_lists.values())
+        if len(lengths) > 1:
+            raise RffeException(5000, "Every site must have the same number of commands, found " + ", ".join(str(length) for length in sorted(lengths)) + '.')
+        for i in range(lengths.pop() if lengths else 0):
+            site_read_data = __burst_command_multi_site(session, pin_name, command, {site: register_data_list[i] for site, register_data_list in site_register_data_lists.items()})
+            for site, read_data in (site_read_data or {}).items():
+                multi_read_data[site].append(read_data)
+    return multi_read_data
+
+# Command bits that the per-command patterns hard code after SA[3:0]. RegSequence sources every bit, so they are added back.
+__SEQUENCE_COMMAND_BITS = {
+    __Command.REG_0_WRITE: [1],
+    __Command.REG_WRITE: [0, 1, 0],
+    __Command.REG_READ: [0, 1, 1],
+    __Command.REG_WRITE_EXT: [0, 0, 0, 0],
+    __Command.REG_READ_EXT: [0, 0, 1, 0],
+    __Command.REG_WRITE_EXT_LONG: [0, 0, 1, 1, 0],
+    __Command.REG_READ_EXT_LONG: [0, 0, 1, 1, 1],
+}
+
+__SEQUENCE_COMMANDS = {
+    reg0_write: __Command.REG_0_WRITE,
+    reg_write: __Command.REG_WRITE,
+    reg_read: __Command.REG_READ,
+    extended_reg_write: __Command.REG_WRITE_EXT,
+    extended_reg_read: __Command.REG_READ_EXT,
+    extended_reg_write_long: __Command.REG_WRITE_EXT_LONG,
+    extended_reg_read_long: __Command.REG_READ_EXT_LONG,
+}
+
+
+def __is_read_command(command):
+    """ Returns True for the commands that return read data. """
+    return command in (__Command.REG_READ, __Command.REG_READ_HR, __Command.REG_READ_EXT, __Command.REG_READ_EXT_HR,
+                       __Command.REG_READ_EXT_LONG, __Command.REG_READ_EXT_LONG_HR)
+
+
+def __sequence_command(command_function):
+    """ Looks up the command for a public command function used in a sequence. """
+    try:
+        return __SEQUENCE_COMMANDS[command_function]
+    except (KeyError, TypeError):
+        raise RffeException(5000, "Sequence entries must use one of the nimipi.rffe command functions, found " + repr(command_function) + '.')
+
+
+def __create_sequence_frames(sequence):
+    """ Encodes every (command, register_data) entry of a sequence as a complete frame, command bits included.
+        Returns a list of bit arrays in sequence order, without SSC or bus park. """
+    frames = [None] * len(sequence)
+    for command in set(command for command, _ in sequence):
+        indices = [i for i, (entry_command, _) in enumerate(sequence) if entry_command == command]
+        byte_counts, bits = __create_source_waveform_data_batch(command, [sequence[i][1] for i in indices])
+        command_bits = __SEQUENCE_COMMAND_BITS[command]
+        bits = numpy.insert(bits, [4] * len(command_bits), command_bits, axis=1)
+        for index, byte_count, frame in zip(indices, byte_counts, bits):
+            if command == __Command.REG_WRITE_EXT or command == __Command.REG_WRITE_EXT_LONG:
+                frame = frame[:13 + 9 * __calc_loop_count(command) + 9 * int(byte_count)] # SA, command bits, BC and parity are 13 bits, drop the pattern padding
+            frames[index] = frame
+    return frames
+
+
+def __create_sequence_waveform_data(sequence):
+    """ Creates the source waveform data for the RegSequence pattern.
+        Every frame gets its own slot of equal length. A slot is idle padding, SSC, the frame and a bus park, followed by a
+        read window the pattern clocks in capture mode. Padding goes before the SSC so reads end right before the window.
+        Returns (slot length, read window bytes, source waveform data) where each sample is RFFECLK << 1 | RFFEDATA. """
+    frames = __create_sequence_frames(sequence)
+    slot_length = max(len(frame) for frame in frames) + 3
+    read_byte_counts = [register_data.byte_count for command, register_data in sequence if __is_read_command(command)]
+    read_window_bytes = max(read_byte_counts) if read_byte_counts else 1
+    clock = numpy.zeros((len(frames), slot_length), dtype=numpy.uint32)
+    data = numpy.zeros((len(frames), slot_length), dtype=numpy.uint32)
+    for slot, frame in enumerate(frames):
+        start = slot_length - len(frame) - 3
+        data[slot, start] = 1 # SSC is a data pulse while the clock stays low
+        data[slot, start + 2:slot_length - 1] = frame
+        clock[slot, start + 2:] = 1 # the clock runs for the frame and the bus park
+    return (slot_length, read_window_bytes, ((clock << 1) | data).ravel())
+
+
+class CompiledSequence:
+    """ A sequence encoded for the RegSequence pattern: the source waveform data and the sequencer register values
+        (slot count, slot length, read window bytes), plus the slots and byte counts of the reads. """
+    def __init__(self, slot_count, slot_length, read_window_bytes, read_slots, read_byte_counts, source_waveform_data):
+        self.slot_count = slot_count
+        self.slot_length = slot_length
+        self.read_window_bytes = read_window_bytes
+        self.read_slots = read_slots
+        self.read_byte_counts = read_byte_counts
+        self.source_waveform_data = source_waveform_data
+
+
+def compile_sequence(sequence):
+    """ Validates and encodes a burst_sequence list of (command function, RegisterData) pairs without touching the
+        instrument. Burst the result with burst_compiled_sequence, as often as needed. """
+    context = (None, "", "", "REG_SEQUENCE", None) # compiling does not touch a session
+    start = time.perf_counter_ns()
+    sequence = [(__sequence_command(command_function), register_data) for command_function, register_data in sequence]
+    for command, register_data in sequence:
+        assert isinstance(register_data, RegisterData)
+        __data_check(command, register_data)
+    if not sequence:
+        return CompiledSequence(0, 0, 0, [], [], numpy.zeros(0, dtype=numpy.uint32))
+    start = __record_stage("data_check", context, start)
+    slot_length, read_window_bytes, source_waveform_data = __create_sequence_waveform_data(sequence)
+    read_slots = [slot for slot, (command, _) in enumerate(sequence) if __is_read_command(command)]
+    read_byte_counts = [sequence[slot][1].byte_count for slot in read_slots]
+    __record_stage("encode", context, start)
+    return CompiledSequence(len(sequence), slot_length, read_window_bytes, read_slots, read_byte_counts, source_waveform_data)
+
+
+# Resident copies of RegSequence used by SequenceBank. Each RFFE_RegSequenceSlot<n> pattern has its own source and capture
+# waveforms and its own three sequencer registers, so every slot keeps its sequence loaded between bursts.
+SEQUENCE_SLOT_PATTERNS = ("RegSequenceSlot0", "RegSequenceSlot1", "RegSequenceSlot2", "RegSequenceSlot3")
+
+
+def __sequence_pattern(slot):
+    """ Returns the pattern name and the (slot count, slot length, read window bytes) sequencer registers of RegSequence
+        for slot None, otherwise of the resident sequence slot with that number. """
+    if slot is None:
+        return ("RegSequence", ("reg0", "reg1", "reg2"))
+    if slot not in range(len(SEQUENCE_SLOT_PATTERNS)):
+        raise RffeException(5000, "Sequence slot out of range. Expected [0, " + str(len(SEQUENCE_SLOT_PATTERNS)) + "), found " + str(slot) + '.')
+    return (SEQUENCE_SLOT_PATTERNS[slot], ("reg" + str(3 + 3 * slot), "reg" + str(4 + 3 * slot), "reg" + str(5 + 3 * slot)))
+
+
+def __write_compiled_sequence(session, pin_name, compiled_sequence, clock_pin_name, slot):
+    """ Puts a CompiledSequence into RegSequence, or into a resident slot, and returns the pattern name. The waveforms are
+        created on first use and the source waveform data is only written if another sequence was written to the pattern
+        since. The sequencer registers of RegSequence are written every time, since reg0 is shared with the per-command
+        patterns; those of a resident slot only change along with its source waveform data. """
+    pattern_name, sequencer_registers = __sequence_pattern(slot)
+    sequence_pins = clock_pin_name + ',' + pin_name
+    context = (session, sequence_pins, "", "REG_SEQUENCE", None)
+    start = time.perf_counter_ns()
+    if not is_pattern_loaded(session, pattern_name):
+        raise RffeException(5000, "The " + pattern_name + " pattern is not loaded. Compile RFFE_" + pattern_name + ".digipatsrc to RFFE_" + pattern_name
+                                  + ".digipat with the Digital Pattern Editor, then load it with load_patterns or load_pattern.")
+    __load_pending_pattern(session, pattern_name)
+    if not __waveforms_registered(session, sequence_pins, pattern_name, __DataMapping.BROADCAST):
+        session.create_source_waveform_parallel(sequence_pins, pattern_name, __DataMapping.BROADCAST.value)
+        session.create_capture_waveform_serial(pin_name, pattern_name, 9, __BitOrder.MSB_FIRST.value) # data byte + parity
+        __register_waveforms(session, sequence_pins, pattern_name, __DataMapping.BROADCAST)
+    loaded_sequences = __waveform_registry_entry(session)["loaded_sequences"]
+    write_registers = slot is None
+    if loaded_sequences.get(pattern_name) != (sequence_pins, compiled_sequence):
+        loaded_sequences.pop(pattern_name, None) # stays cleared if the write fails
+        session.write_source_waveform_broadcast(pattern_name, compiled_sequence.source_waveform_data)
+        loaded_sequences[pattern_name] = (sequence_pins, compiled_sequence)
+        write_registers = True
+    start = __record_stage("write_source_waveform", context, start)
+    if write_registers:
+        register_values = (compiled_sequence.slot_count, compiled_sequence.slot_length, compiled_sequence.read_window_bytes)
+        for sequencer_register, value in zip(sequencer_registers, register_values):
+            session.write_sequencer_register(sequencer_register, value)
+        __record_stage("write_sequencer_register", context, start)
+    return pattern_name
+
+
+def __burst_sequence_pattern(session, sequence_pins, pattern_name, compiled_sequence, trigger_source):
+    """ Bursts a sequence pattern holding compiled_sequence and returns the capture samples as a (slot count, read window bytes)
+        array of data << 1 | parity, or None if the sequence has no reads. With trigger_source set, the burst waits for a
+        digital edge on it. """
+    context = (session, sequence_pins, "", "REG_SEQUENCE", None)
+    start = time.perf_counter_ns()
+    if trigger_source is None:
+        session.burst_pattern("", pattern_name, True, True, 10)
+    else:
+        session.start_trigger_type = __TriggerType.DIGITAL_EDGE.value
+        session.digital_edge_start_trigger_source = trigger_source
+        try:
+            session.burst_pattern("", pattern_name, True, True, 10)
+        finally:
+            session.start_trigger_type = __TriggerType.NONE.value # later bursts start right away again
+    start = __record_stage("burst_pattern", context, start)
+    if not compiled_sequence.read_slots:
+        return None
+    capture_waveform = session.fetch_capture_waveform("", pattern_name, compiled_sequence.slot_count * compiled_sequence.read_window_bytes, 10)
+    __record_stage("fetch_capture_waveform", context, start)
+    return numpy.asarray(capture_waveform[0]).reshape(compiled_sequence.slot_count, compiled_sequence.read_window_bytes)
+
+
+def __burst_compiled_sequence_samples(session, pin_name, compiled_sequence, clock_pin_name, trigger_source=None):
+    """ Bursts a CompiledSequence in the RegSequence pattern and returns the capture samples, see __burst_sequence_pattern. """
+    pattern_name = __write_compiled_sequence(session, pin_name, compiled_sequence, clock_pin_name, None)
+    return __burst_sequence_pattern(session, clock_pin_name + ',' + pin_name, pattern_name, compiled_sequence, trigger_source)
+
+
+def __read_data_from_samples(samples, compiled_sequence, validate):
+    """ Splits sequence capture samples into one list of read data per read entry, validating them first if requested. """
+    if samples is None:
+        return []
+    if validate:
+        __validate_read_samples(samples, compiled_sequence.read_slots, compiled_sequence.read_byte_counts)
+    return [(samples[slot, :byte_count] >> 1).tolist() for slot, byte_count in zip(compiled_sequence.read_slots, compiled_sequence.read_byte_counts)]
+
+
+def __validate_read_samples(samples, read_slots, read_byte_counts):
+    """ Checks RegSequence capture samples of every read: each data byte must match its parity bit, and the bus park cycle
+        after the last byte, which is the first bit of the next sample in the read window, must be low. Raises RffeException otherwise. """
+    read_byte_counts = numpy.asarray(read_byte_counts, dtype=numpy.intp)
+    read_samples = samples[numpy.asarray(read_slots, dtype=numpy.intp)]
+    in_read = numpy.arange(samples.shape[1])[None, :] < read_byte_counts[:, None]
+    parity_errors = numpy.argwhere(in_read & (__parity_lookup(read_samples >> 1) != (read_samples & 1)))
+    if len(parity_errors):
+        read, byte = parity_errors[0]
+        raise RffeException(5000, "Parity error in byte " + str(byte) + " of read " + str(read) + ", captured " + "0x{:03X}.".format(int(read_samples[read, byte])))
+    parked = read_byte_counts < samples.shape[1] # a read that fills the window has its park cycle outside the capture
+    park_samples = read_samples[parked, read_byte_counts[parked]]
+    park_errors = numpy.flatnonzero(park_samples >> 8)
+    if len(park_errors):
+        raise RffeException(5000, "Bus park missing after read " + str(int(numpy.flatnonzero(parked)[park_errors[0]])) + '.')
+
+
+def burst_compiled_sequence(session, pin_name, compiled_sequence, clock_pin_name="RFFECLK", validate=False, trigger_source=None):
+    """ Bursts a CompiledSequence in the RegSequence pattern. Returns one list of read data per read entry, in sequence order.
+        With validate set, the parity and bus park of every read are checked first and RffeException is raised on a corrupt read.
+        With trigger_source set, e.g. "PXI_Trig0", the burst starts on a digital edge there instead of right away.
+        The RegSequence pattern must have been loaded with load_patterns or load_pattern, otherwise RffeException is raised.
+        Bursting the same CompiledSequence again skips the source waveform write, so treat its data as read only. """
+    assert isinstance(session, nidigital.Session)
+    assert isinstance(compiled_sequence, CompiledSequence)
+    if compiled_sequence.slot_count == 0:
+        return []
+    samples = __burst_compiled_sequence_samples(session, pin_name, compiled_sequence, clock_pin_name, trigger_source)
+    return __read_data_from_samples(samples, compiled_sequence, validate)
+
+
+def load_sequence_slot(session, pin_name, slot, compiled_sequence, clock_pin_name="RFFECLK"):
+    """ Loads a CompiledSequence into a resident sequence slot, the RFFE_RegSequenceSlot<slot> pattern, for burst_sequence_slot.
+        The slot keeps the sequence until another one is loaded there, so loading the same CompiledSequence again writes nothing. """
+    assert isinstance(session, nidigital.Session)
+    assert isinstance(compiled_sequence, CompiledSequence)
+    if compiled_sequence.slot_count == 0:
+        return
+    __write_compiled_sequence(session, pin_name, compiled_sequence, clock_pin_name, slot)
+
+
+def burst_sequence_slot(session, slot, compiled_sequence, validate=False, trigger_source=None):
+    """ Bursts the sequence loaded into a resident slot by load_sequence_slot. Only the slot's start label is bursted, nothing
+        is written first. compiled_sequence must be the sequence loaded there; it tells how to split the read data.
+        Returns one list of read data per read entry like burst_compiled_sequence, with the same validate and trigger_source. """
+    assert isinstance(session, nidigital.Session)
+    assert isinstance(compiled_sequence, CompiledSequence)
+    if compiled_sequence.slot_count == 0:
+        return []
+    pattern_name, _ = __sequence_pattern(slot)
+    loaded_sequence = __waveform_registry_entry(session)["loaded_sequences"].get(pattern_name)
+    if loaded_sequence is None or loaded_sequence[1] is not compiled_sequence:
+        raise RffeException(5000, "The sequence is not loaded in sequence slot " + str(slot) + ", call load_sequence_slot first.")
+    samples = __burst_sequence_pattern(session, loaded_sequence[0], pattern_name, compiled_sequence, trigger_source)
+    return __read_data_from_samples(samples, compiled_sequence, validate)
+
+
+def burst_sequence(session, pin_name, sequence, clock_pin_name="RFFECLK", validate=False):
+    """ Packs an ordered list of (command function, RegisterData) pairs into one source waveform and runs it in a single
+        burst of the RegSequence pattern, e.g. [(rffe.extended_reg_write, write_data), (rffe.reg_read, read_data)].
+        All read data is fetched with one capture fetch. Returns one list of read data per read entry, in sequence order. """
+    assert isinstance(session, nidigital.Session)
+    return burst_compiled_sequence(session, pin_name, compile_sequence(sequence), clock_pin_name, validate)
+
+
+class OptimizedWrites:
+    def __init__(self, sequence, bus_cycles_before, bus_cycles_after):
+        self.sequence = sequence
+        self.bus_cycles_before = bus_cycles_before
+        self.bus_cycles_after = bus_cycles_after
+
+
+def __bus_cycle_count(command, byte_count):
+    """ Returns the bus cycles of one command, SSC and bus parks included. """
+    if command == __Command.REG_0_WRITE:
+        return 2 + 13 + 1
+    if command == __Command.REG_WRITE:
+        return 2 + 22 + 1
+    if command == __Command.REG_READ or command == __Command.REG_READ_HR:
+        return 2 + 13 + 1 + 9 + 1
+    if command == __Command.REG_WRITE_EXT:
+        return 2 + 13 + 9 + 9 * byte_count + 1
+    if command == __Command.REG_READ_EXT or command == __Command.REG_READ_EXT_HR:
+        return 2 + 13 + 9 + 1 + 9 * byte_count + 1
+    if command == __Command.REG_WRITE_EXT_LONG:
+        return 2 + 13 + 18 + 9 * byte_count + 1
+    if command == __Command.REG_READ_EXT_LONG or command == __Command.REG_READ_EXT_LONG_HR:
+        return 2 + 13 + 18 + 1 + 9 * byte_count + 1
+    raise RffeException(5000, "The specified command " + command.name + " is not supported.")
+
+
+def __select_write_command(register_address, byte_count):
+    """ Picks the cheapest write command whose __data_check limits cover the address range. """
+    last_address = register_address + byte_count - 1
+    if byte_count == 1 and last_address <= 0x1F:
+        return __Command.REG_WRITE
+    if byte_count <= 16 and last_address <= 0xFF:
+        return __Command.REG_WRITE_EXT
+    if byte_count <= 8 and last_address <= 0xFFFF:
+        return __Command.REG_WRITE_EXT_LONG
+    return None
+
+
+def optimize_writes(register_data_list, drop_duplicates=True, merge_contiguous=True):
+    """ Optimizes a list of register writes, as passed to multi_command, while keeping their order.
+        drop_duplicates removes a write that repeats the previous write exactly. Set it to False for devices where a
+        repeated write is intentional. merge_contiguous coalesces writes to consecutive addresses on the same slave into one
+        extended (up to 16 bytes) or extended long (up to 8 bytes) write.
+        Returns an OptimizedWrites whose sequence can be run with burst_sequence, or entry by entry as
+        function(session, pin_name, register_data), along with the bus cycles before and after optimizing. """
+    runs = []
+    bus_cycles_before = 0
+    for register_data in register_data_list:
+        assert isinstance(register_data, RegisterData)
+        __data_check(__Command.REG_WRITE_EXT, register_data)
+        write_data = list(register_data.write_data)
+        bus_cycles_before += __bus_cycle_count(__Command.REG_WRITE_EXT, len(write_data))
+        if drop_duplicates and runs and runs[-1][-1] == (register_data.slave_address, register_data.register_address, write_data):
+            continue
+        runs.append([(register_data.slave_address, register_data.register_address, write_data)])
+    if merge_contiguous:
+        merged_runs = []
+        for run in runs:
+            if merged_runs:
+                slave_address, register_address, _ = merged_runs[-1][0]
+                byte_count = sum(len(write_data) for _, _, write_data in merged_runs[-1])
+                next_slave_address, next_register_address, next_write_data = run[0]
+                contiguous = next_slave_address == slave_address and next_register_address == register_address + byte_count
+                if contiguous and __select_write_command(register_address, byte_count + len(next_write_data)) is not None:
+                    merged_runs[-1].extend(run)
+                    continue
+            merged_runs.append(run)
+        runs = merged_runs
+    sequence = []
+    bus_cycles_after = 0
+    for run in runs:
+        slave_address, register_address, _ = run[0]
+        write_data = [data for _, _, run_write_data in run for data in run_write_data]
+        command = __select_write_command(register_address, len(write_data))
+        if command is None: # not merged and does not fit anything cheaper, keep the original extended write
+            command = __Command.REG_WRITE_EXT
+        sequence.append((__WRITE_COMMAND_FUNCTIONS[command], RegisterData(slave_address, register_address, write_data, len(write_data))))
+        bus_cycles_after += __bus_cycle_count(command, len(write_data))
+    return OptimizedWrites(sequence, bus_cycles_before, bus_cycles_after)
+
+
+__WRITE_COMMAND_FUNCTIONS = {
+    __Command.REG_WRITE: reg_write,
+    __Command.REG_WRITE_EXT: extended_reg_write,
+    __Command.REG_WRITE_EXT_LONG: extended_reg_write_long,
+}
+
+
+def __select_read_command(register_address, byte_count):
+    """ Picks the cheapest read command covering the address range. The limits are the same as for writes. """
+    return {__Command.REG_WRITE: __Command.REG_READ,
+            __Command.REG_WRITE_EXT: __Command.REG_READ_EXT,
+            __Command.REG_WRITE_EXT_LONG: __Command.REG_READ_EXT_LONG}.get(__select_write_command(register_address, byte_count))
+
+
+__READ_COMMAND_FUNCTIONS = {
+    __Command.REG_READ: reg_read,
+    __Command.REG_READ_EXT: extended_reg_read,
+    __Command.REG_READ_EXT_LONG: extended_reg_read_long,
+}
+
+
+def __read_sequence_per_command(session, pin_name, sequence, width):
+    """ Bursts every (read command function, RegisterData) entry of sequence with its own per-command pattern, for sessions
+        without the RegSequence pattern. Returns the read data as a (len(sequence), width) array, zero past each byte count. """
+    read_data = numpy.zeros((len(sequence), width), dtype=numpy.uint32)
+    for row, (command_function, register_data) in zip(read_data, sequence):
+        entry_read_data = command_function(session, pin_name, register_data, True)
+        row[:len(entry_read_data)] = entry_read_data
+    return read_data
+
+
+def verify_registers(session, pin_name, expected_register_data, masks=None, clock_pin_name="RFFECLK"):
+    """ Reads back every entry of expected_register_data, whose write_data holds the expected values, in one RegSequence
+        burst and compares all of it at once. masks holds one mask per entry, either an int for every byte or a list with
+        one int per byte; only the set bits are compared, and None compares all bits.
+        If the RegSequence pattern is not loaded, each entry is read back with its own per-command burst instead.
+        Returns one (slave address, register address, expected, actual) tuple per mismatching byte, so an empty list means a pass. """
+    assert isinstance(session, nidigital.Session)
+    expected_register_data = list(expected_register_data)
+    if not expected_register_data:
+        return []
+    sequence = []
+    for register_data in expected_register_data:
+        assert isinstance(register_data, RegisterData)
+        command = __select_read_command(register_data.register_address, len(register_data.write_data))
+        if command is None:
+            raise RffeException(5000, "Cannot read back " + str(len(register_data.write_data)) + " bytes from register address " + "0x{:04X}".format(register_data.register_address) + " with one command.")
+        sequence.append((__READ_COMMAND_FUNCTIONS[command], RegisterData(register_data.slave_address, register_data.register_address, [], len(register_data.write_data))))
+    width = max(len(register_data.write_data) for register_data in expected_register_data)
+    if is_pattern_loaded(session, "RegSequence"):
+        compiled_sequence = compile_sequence(sequence)
+        actual = __burst_compiled_sequence_samples(session, pin_name, compiled_sequence, clock_pin_name) >> 1
+    else:
+        actual = __read_sequence_per_command(session, pin_name, sequence, width)
+    expected = numpy.zeros((len(sequence), width), dtype=numpy.uint32)
+    mask = numpy.zeros((len(sequence), width), dtype=numpy.uint32)
+    for i, register_data in enumerate(expected_register_data):
+        byte_count = len(register_data.write_data)
+        expected[i, :byte_count] = register_data.write_data
+        mask[i, :byte_count] = 0xFF if masks is None or masks[i] is None else masks[i]
+    mismatches = numpy.nonzero((actual ^ expected) & mask)
+    return [(expected_register_data[slot].slave_address, expected_register_data[slot].register_address + int(index), int(expected[slot, index]), int(actual[slot, index]))
+            for slot, index in zip(*mismatches)]
+
+
+def read_registers_array(session, pin_name, register_data_list, validate=True, clock_pin_name="RFFECLK"):
+    """ Reads every entry of register_data_list, each with the cheapest read command for its address and byte count,
+        in one RegSequence burst with one capture fetch. Returns the read data as a numpy array with one row per entry
+        and one column per byte of the largest read; bytes past an entry's byte count are zero.
+        With validate set the parity and bus park of every read are checked and RffeException is raised on a corrupt read.
+        If the RegSequence pattern is not loaded, each entry is read with its own per-command burst instead. The per-command
+        patterns capture the data bytes only, so validate has no effect then. """
+    assert isinstance(session, nidigital.Session)
+    sequence = []
+    for register_data in register_data_list:
+        assert isinstance(register_data, RegisterData)
+        command = __select_read_command(register_data.register_address, register_data.byte_count)
+        if command is None:
+            raise RffeException(5000, "Cannot read " + str(register_data.byte_count) + " bytes from register address " + "0x{:04X}".format(register_data.register_address) + " with one command.")
+        sequence.append((__READ_COMMAND_FUNCTIONS[command], register_data))
+    if not sequence:
+        return numpy.zeros((0, 0), dtype=numpy.uint32)
+    if not is_pattern_loaded(session, "RegSequence"):
+        return __read_sequence_per_command(session, pin_name, sequence, max(register_data.byte_count for _, register_data in sequence))
+    compiled_sequence = compile_sequence(sequence)
+    samples = __burst_compiled_sequence_samples(session, pin_name, compiled_sequence, clock_pin_name)
+    if validate:
+        __validate_read_samples(samples, compiled_sequence.read_slots, compiled_sequence.read_byte_counts)
+    read_data = samples >> 1
+    read_data[numpy.arange(read_data.shape[1])[None, :] >= numpy.asarray(compiled_sequence.read_byte_counts)[:, None]] = 0
+    return read_data
+
+
+def __bus_check_passes(session, pin_name, register_data_list, clock_pin_name):
+    """ Writes register_data_list and its complement, reading each back, with parity and bus park validation when the
+        RegSequence pattern is loaded. Without it every write and read is a per-command burst.
+        Finishes with the original values written. Returns True if every read matched. """
+    complement = [RegisterData(register_data.slave_address, register_data.register_address, [~data & 0xFF for data in register_data.write_data],
+                               len(register_data.write_data)) for register_data in register_data_list]
+    single_burst = is_pattern_loaded(session, "RegSequence")
+    try:
+        for write_data_list in (complement, register_data_list):
+            sequence = [(__WRITE_COMMAND_FUNCTIONS[__select_write_command(register_data.register_address, len(register_data.write_data))], register_data)
+                        for register_data in write_data_list]
+            if single_burst:
+                burst_sequence(session, pin_name, sequence, clock_pin_name)
+            else:
+                for command_function, register_data in sequence:
+                    command_function(session, pin_name, register_data)
+            read_data = read_registers_array(session, pin_name, write_data_list, True, clock_pin_name)
+            for register_data, row in zip(write_data_list, read_data):
+                if row[:len(register_data.write_data)].tolist() != list(register_data.write_data):
+                    return False
+    except RffeException:
+        return False
+    return True
+
+
+def find_max_bus_frequency(session, pin_name, specifications_file_path, levels_file_path, timing_file_path, register_data_list,
+                           minimum_frequency=1e6, maximum_frequency=52e6, resolution=0.5e6, clock_pin_name="RFFECLK"):
+    """ Binary searches the highest RFFE clock between minimum_frequency and maximum_frequency, to within resolution, at which
+        writing register_data_list and its complement reads back correctly. The check runs in RegSequence bursts when that
+        pattern is loaded, otherwise with per-command bursts. register_data_list should hold writable registers
+        with no side effects; they are left holding their write_data. The bus is left at the frequency found, which is returned,
+        or at minimum_frequency with None returned if even that fails. """
+    assert isinstance(session, nidigital.Session)
+    register_data_list = list(register_data_list)
+    for register_data in register_data_list:
+        assert isinstance(register_data, RegisterData)
+        if __select_write_command(register_data.register_address, len(register_data.write_data)) is None:
+            raise RffeException(5000, "Cannot write " + str(len(register_data.write_data)) + " bytes to register address " + "0x{:04X}".format(register_data.register_address) + " with one command.")
+
+    def passes(frequency):
+        set_bus_frequency(session, frequency, specifications_file_path, levels_file_path, timing_file_path)
+        return __bus_check_passes(session, pin_name, register_data_list, clock_pin_name)
 
-def multi_command(session, pin_name, multi_command_write, multi_command_read):
-    """ Uses looping to execute multiple register writes and register reads. """
-    for write_command in multi_command_write:
-        extended_reg_write(session, pin_name, write_command)
-    return [extended_reg_read(session, pin_name, read_command) for read_command in multi_command_read]
+    if not passes(minimum_frequency):
+        return None
+    if passes(maximum_frequency):
+        return maximum_frequency
+    passing, failing = minimum_frequency, maximum_frequency
+    while failing - passing > resolution:
+        frequency = (passing + failing) / 2
+        if passes(frequency):
+            passing = frequency
+        else:
+            failing = frequency
+    set_bus_frequency(session, passing, specifications_file_path, levels_file_path, timing_file_path)
+    return passing
@@ -0,0 +1,297 @@
+import argparse, os, socket, socketserver, stat, struct, threading
+from os import path
+import nidigital
+from nimipi import rffe
+
+# Command codes of the binary protocol, in the order of the nimipi.rffe command functions
+COMMAND_FUNCTIONS = (rffe.reg0_write, rffe.reg_write, rffe.reg_read, rffe.extended_reg_write, rffe.extended_reg_read,
+                     rffe.extended_reg_write_long, rffe.extended_reg_read_long)
+RUN = 0 # run every command in order with the command functions, one result per command, None for writes
+SEQUENCE = 1 # run all commands in one burst_sequence, one result per read
+DEFAULT_ADDRESS = ("127.0.0.1", 50657)
+
+# Every message is a uint32 length followed by the body, all little endian.
+# Request body: opcode u8, pin name length u8, pin name, entry count u16, then per entry command code u8, slave address u8,
+# register address u16, byte count u8 and, for writes, byte count bytes of write data.
+# Response body: status u8. On success a result count u16, then per result a length u8 (0xFF for None) and the read data.
+# On failure the RffeException code i32, message length u16 and the UTF-8 message.
+_LENGTH = struct.Struct("<I")
+_REQUEST_HEADER = struct.Struct("<BB")
+_COUNT = struct.Struct("<H")
+_ENTRY = struct.Struct("<BBHB")
+_ERROR = struct.Struct("<iH")
+_NO_RESULT = 0xFF
+
+
+def _receive_exactly(connection, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed by the other side.")
+        data += chunk
+    return bytes(data)
+
+
+def _receive_message(connection):
+    length, = _LENGTH.unpack(_receive_exactly(connection, _LENGTH.size))
+    return _receive_exactly(connection, length)
+
+
+def _send_message(connection, body):
+    connection.sendall(_LENGTH.pack(len(body)) + body)
+
+
+def encode_request(opcode, pin_name, commands):
+    """ Encodes a list of (command function, RegisterData) pairs as a request body. """
+    pin_name_bytes = pin_name.encode()
+    parts = [_REQUEST_HEADER.pack(opcode, len(pin_name_bytes)), pin_name_bytes, _COUNT.pack(len(commands))]
+    for command_function, register_data in commands:
+        command_code = COMMAND_FUNCTIONS.index(command_function)
+        is_write = command_function in (rffe.reg0_write, rffe.reg_write, rffe.extended_reg_write, rffe.extended_reg_write_long)
+        byte_count = len(register_data.write_data) if is_write else register_data.byte_count
+        parts.append(_ENTRY.pack(command_code, register_data.slave_address, register_data.register_address, byte_count))
+        if is_write:
+            parts.append(bytes(register_data.write_data))
+    return b"".join(parts)
+
+
+def decode_request(body):
+    """ Decodes a request body into (opcode, pin name, list of (command function, RegisterData) pairs). """
+    opcode, pin_name_length = _REQUEST_HEADER.unpack_from(body, 0)
+    offset = _REQUEST_HEADER.size
+    pin_name = body[offset:offset + pin_name_length].decode()
+    offset += pin_name_length
+    count, = _COUNT.unpack_from(body, offset)
+    offset += _COUNT.size
+    commands = []
+    for _ in range(count):
+        command_code, slave_address, register_address, byte_count = _ENTRY.unpack_from(body, offset)
+        offset += _ENTRY.size
+        command_function = COMMAND_FUNCTIONS[command_code]
+        write_data = []
+        if command_function in (rffe.reg0_write, rffe.reg_write, rffe.extended_reg_write, rffe.extended_reg_write_long):
+            write_data = list(body[offset:offset + byte_count])
+            offset += byte_count
+        commands.append((command_function, rffe.RegisterData(slave_address, register_address, write_data, byte_count)))
+    return (opcode, pin_name, commands)
+
+
+def encode_response(results):
+    parts = [b"\x00", _COUNT.pack(len(results))]
+    for read_data in results:
+        if read_data is None:
+            parts.append(bytes([_NO_RESULT]))
+        else:
+            parts.append(bytes([len(read_data)]) + bytes(int(data) for data in read_data))
+    return b"".join(parts)
+
+
+def encode_error(code, message):
+    message_bytes = message.encode()[:0xFFFF]
+    return b"\x01" + _ERROR.pack(code, len(message_bytes)) + message_bytes
+
+
+def decode_response(body):
+    """ Decodes a response body into its list of results, raising RffeException for an error response. """
+    if body[0] != 0:
+        code, message_length = _ERROR.unpack_from(body, 1)
+        raise rffe.RffeException(code, body[1 + _ERROR.size:1 + _ERROR.size + message_length].decode())
+    count, = _COUNT.unpack_from(body, 1)
+    offset = 1 + _COUNT.size
+    results = []
+    for _ in range(count):
+        length = body[offset]
+        offset += 1
+        if length == _NO_RESULT:
+            results.append(None)
+            continue
+        results.append(list(body[offset:offset + length]))
+        offset += length
+    return results
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                body = _receive_message(self.request)
+            except ConnectionError:
+                return
+            _send_message(self.request, self.server.rffe_server.execute(body))
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+    class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+def _remove_stale_socket(address):
+    """ Removes a Unix socket left behind by a server that did not close. Anything else at the path is left alone. """
+    try:
+        mode = os.lstat(address).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise rffe.RffeException(5000, address + " exists and is not a socket, choose another address.")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(address)
+    except ConnectionRefusedError:
+        os.remove(address)
+    else:
+        raise rffe.RffeException(5000, "Another server is listening on " + address + '.')
+    finally:
+        probe.close()
+
+
+class RffeServer:
+    """ Serves RFFE command batches on a configured session to local clients, so short scripts skip session setup.
+        address is a (host, port) tuple for TCP or a path for a Unix socket where the platform has them. With port 0 the
+        system picks a free port, and address holds the bound one. Every client gets its own thread and one lock
+        serializes their batches on the session, so a batch always runs as a whole. """
+    def __init__(self, session, address=DEFAULT_ADDRESS):
+        assert isinstance(session, nidigital.Session)
+        self.session = session
+        self.lock = threading.Lock()
+        self.serving = False
+        if isinstance(address, str):
+            if not hasattr(socketserver, "UnixStreamServer"):
+                raise rffe.RffeException(5000, "Unix sockets are not available on this platform, use a (host, port) address instead of " + address + '.')
+            _remove_stale_socket(address)
+            self.server = _ThreadingUnixServer(address, _RequestHandler)
+            self.address = address
+        else:
+            self.server = _ThreadingTCPServer(address, _RequestHandler)
+            self.address = self.server.server_address
+        self.server.rffe_server = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def execute(self, body):
+        """ Runs one request body and returns the response body. """
+        try:
+            opcode, pin_name, commands = decode_request(body)
+            with self.lock:
+                if opcode == SEQUENCE:
+                    return encode_response(rffe.burst_sequence(self.session, pin_name, commands))
+                if opcode == RUN:
+                    return encode_response([command_function(self.session, pin_name, register_data) for command_function, register_data in commands])
+            return encode_error(5000, "Unknown request opcode " + str(opcode) + '.')
+        except rffe.RffeException as exception:
+            return encode_error(exception.code, exception.message)
+        except Exception as exception: # keep serving other clients, the error goes back to the caller
+            return encode_error(5000, type(exception).__name__ + ": " + str(exception))
+
+    def serve_forever(self):
+        self.serving = True
+        self.server.serve_forever()
+
+    def start(self):
+        """ Serves from a background thread and returns it. """
+        self.serving = True
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        """ Stops serving and closes the socket. The session stays open. """
+        if self.serving: # shutdown waits for serve_forever to return, which never happens if it was not called
+            self.server.shutdown()
+            self.serving = False
+        self.server.server_close()
+        if isinstance(self.address, str) and path.exists(self.address):
+            os.remove(self.address)
+
+
+class RffeClient:
+    """ Thin client for RffeServer. Mirrors the nimipi.rffe command functions without the session argument. """
+    def __init__(self, address=DEFAULT_ADDRESS):
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.connection = socket.socket(family, socket.SOCK_STREAM)
+        self.connection.connect(address)
+        if family == socket.AF_INET:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1) # requests are small and latency bound
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def run(self, pin_name, commands, single_burst=False):
+        """ Sends a list of (command function, RegisterData) pairs as one batch. Returns one result per command, or with
+            single_burst set the burst_sequence read data. """
+        _send_message(self.connection, encode_request(SEQUENCE if single_burst else RUN, pin_name, list(commands)))
+        return decode_response(_receive_message(self.connection))
+
+    def reg0_write(self, pin_name, register_data):
+        self.run(pin_name, [(rffe.reg0_write, register_data)])
+
+    def reg_write(self, pin_name, register_data):
+        self.run(pin_name, [(rffe.reg_write, register_data)])
+
+    def reg_read(self, pin_name, register_data):
+        return self.run(pin_name, [(rffe.reg_read, register_data)])[0]
+
+    def extended_reg_write(self, pin_name, register_data):
+        self.run(pin_name, [(rffe.extended_reg_write, register_data)])
+
+    def extended_reg_read(self, pin_name, register_data):
+        return self.run(pin_name, [(rffe.extended_reg_read, register_data)])[0]
+
+    def extended_reg_write_long(self, pin_name, register_data):
+        self.run(pin_name, [(rffe.extended_reg_write_long, register_data)])
+
+    def extended_reg_read_long(self, pin_name, register_data):
+        return self.run(pin_name, [(rffe.extended_reg_read_long, register_data)])[0]
+
+    def multi_command(self, pin_name, multi_command_write, multi_command_read, single_burst=False):
+        """ Same as rffe.multi_command, sent as one batch. """
+        commands = [(rffe.extended_reg_write, register_data) for register_data in multi_command_write]
+        commands += [(rffe.extended_reg_read, register_data) for register_data in multi_command_read]
+        results = self.run(pin_name, commands, single_burst)
+        return results if single_burst else results[len(commands) - len(multi_command_read):]
+
+    def burst_sequence(self, pin_name, sequence):
+        return self.run(pin_name, sequence, True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keeps a configured nidigital session open and serves RFFE commands to local clients.")
+    parser.add_argument("--resource-name", default="PXIe-6570")
+    parser.add_argument("--project", default=path.join(path.dirname(path.abspath(__file__)), "digiproj"), help="digital project directory")
+    parser.add_argument("--address", help="Unix socket path, localhost TCP port {:d} by default".format(DEFAULT_ADDRESS[1]))
+    parser.add_argument("--vio", type=float, help="PPMU voltage to source on RFFEVIO, as in rffe_example.py")
+    args = parser.parse_args()
+    session = nidigital.Session(args.resource_name, True, False)
+    try:
+        rffe.load_pin_map(session, path.join(args.project, "PinMap.pinmap"))
+        rffe.load_sheets(session, path.join(args.project, "Specifications.specs"), path.join(args.project, "PinLevels.digilevels"),
+                         path.join(args.project, "Timing.digitiming"))
+        rffe.load_patterns(session, path.join(args.project, "RFFE Command Patterns"))
+        if args.vio is not None:
+            session.channels["RFFEVIO"].ppmu_configure_output_function(nidigital.PPMUOutputFunction.VOLTAGE.value)
+            session.channels["RFFEVIO"].ppmu_configure_voltage_level(args.vio)
+            session.channels["RFFEVIO"].ppmu_configure_current_limit_range(0.032)
+            session.channels["RFFEVIO"].ppmu_source()
+        with RffeServer(session, args.address or DEFAULT_ADDRESS) as server:
+            server.serve_forever()
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import enum
+from nimipi import rffe
+
+
+class ShadowMode(enum.Enum):
+    WRITE_THROUGH = 0 # skip writes whose value is unchanged, reads always hit the bus
+    READ_FROM_CACHE = 1 # as WRITE_THROUGH, and reads of cached non-volatile registers come from the cache
+    VERIFY = 2 # every write and read hits the bus, the cache is only kept up to date
+
+
+class ShadowRegisters:
+    """ Shadow copy of the registers written and read through it, keyed by (pin, slave address, register address).
+        Mirrors the nimipi.rffe command functions for one session and skips bus traffic according to the mode. """
+    def __init__(self, session, mode=ShadowMode.WRITE_THROUGH):
+        self.session = session
+        self.mode = mode
+        self.registers = {}
+        self.volatile_registers = set()
+        self.skipped_writes = 0
+        self.cached_reads = 0
+
+    def invalidate(self, pin_name=None, slave_address=None):
+        """ Forgets cached values for one slave on a pin, every slave on a pin, or everything when called without arguments. """
+        self.registers = {key: value for key, value in self.registers.items()
+                          if not (pin_name in (None, key[0]) and slave_address in (None, key[1]))}
+
+    def mark_volatile(self, pin_name, slave_address, register_addresses):
+        """ Marks registers the device can change on its own. They are never skipped on write or served from the cache. """
+        for register_address in register_addresses:
+            key = (pin_name, slave_address, register_address)
+            self.volatile_registers.add(key)
+            self.registers.pop(key, None)
+
+    def _keys(self, pin_name, register_data, byte_count):
+        return [(pin_name, register_data.slave_address, register_data.register_address + i) for i in range(byte_count)]
+
+    def _is_unchanged(self, pin_name, register_data):
+        """ Returns True if every byte of the write is cached with the same value and none of the registers is volatile.
+            A write without data is never unchanged, so rffe gets to reject it. """
+        if self.mode == ShadowMode.VERIFY or len(register_data.write_data) == 0:
+            return False
+        keys = self._keys(pin_name, register_data, len(register_data.write_data))
+        return all(key not in self.volatile_registers and self.registers.get(key) == data
+                   for key, data in zip(keys, register_data.write_data))
+
+    def _cached_read(self, pin_name, register_data):
+        """ Returns the cached read data, or None if the read has to go to the bus. """
+        if self.mode != ShadowMode.READ_FROM_CACHE:
+            return None
+        keys = self._keys(pin_name, register_data, register_data.byte_count)
+        if any(key in self.volatile_registers or key not in self.registers for key in keys):
+            return None
+        return [self.registers[key] for key in keys]
+
+    def _update(self, pin_name, register_data, data):
+        for key, value in zip(self._keys(pin_name, register_data, len(data)), data):
+            if key not in self.volatile_registers:
+                self.registers[key] = value
+
+    def _write(self, command_function, pin_name, register_data):
+        if self._is_unchanged(pin_name, register_data):
+            self.skipped_writes += 1
+            return
+        command_function(self.session, pin_name, register_data)
+        self._update(pin_name, register_data, register_data.write_data)
+
+    def _read(self, command_function, pin_name, register_data):
+        read_data = self._cached_read(pin_name, register_data)
+        if read_data is not None:
+            self.cached_reads += 1
+            return read_data
+        read_data = command_function(self.session, pin_name, register_data)
+        self._update(pin_name, register_data, read_data)
+        return read_data
+
+    def reg0_write(self, pin_name, register_data):
+        """ Bursts a Reg0Write command. Register 0 is always written and then dropped from the cache,
+            since the command only sets its lower 7 bits. """
+        rffe.reg0_write(self.session, pin_name, register_data)
+        self.registers.pop((pin_name, register_data.slave_address, 0), None)
+
+    def reg_write(self, pin_name, register_data):
+        """ Bursts a standard register write command unless the register already holds the value. """
+        return self._write(rffe.reg_write, pin_name, register_data)
+
+    def reg_read(self, pin_name, register_data):
+        """ Bursts a standard register read command, or returns the cached value in READ_FROM_CACHE mode. """
+        return self._read(rffe.reg_read, pin_name, register_data)
+
+    def extended_reg_write(self, pin_name, register_data):
+        """ Bursts an extended register write command unless the registers already hold the values. """
+        return self._write(rffe.extended_reg_write, pin_name, register_data)
+
+    def extended_reg_read(self, pin_name, register_data):
+        """ Bursts an extended register read command, or returns the cached values in READ_FROM_CACHE mode. """
+        return self._read(rffe.extended_reg_read, pin_name, register_data)
+
+    def extended_reg_write_long(self, pin_name, register_data):
+        """ Bursts an extended register write long command unless the registers already hold the values. """
+        return self._write(rffe.extended_reg_write_long, pin_name, register_data)
+
+    def extended_reg_read_long(self, pin_name, register_data):
+        """ Bursts an extended register read long command, or returns the cached values in READ_FROM_CACHE mode. """
+        return self._read(rffe.extended_reg_read_long, pin_name, register_data)
+
+    def multi_command(self, pin_name, multi_command_write, multi_command_read, single_burst=False):
+        """ Same as rffe.multi_command, but only the writes and reads the cache cannot cover go to the bus.
+            Those are still issued with one rffe.multi_command call. """
+        bus_writes = []
+        for register_data in multi_command_write:
+            if self._is_unchanged(pin_name, register_data):
+                self.skipped_writes += 1
+                continue
+            bus_writes.append(register_data)
+            self._update(pin_name, register_data, register_data.write_data) # later writes in the list compare against this one
+        multi_read_data = [self._cached_read(pin_name, register_data) for register_data in multi_command_read]
+        bus_reads = [register_data for register_data, read_data in zip(multi_command_read, multi_read_data) if read_data is None]
+        self.cached_reads += len(multi_read_data) - len(bus_reads)
+        try:
+            bus_read_data = iter(rffe.multi_command(self.session, pin_name, bus_writes, bus_reads, single_burst))
+        except Exception:
+            self.invalidate(pin_name) # the writes above may not have reached the device
+            raise
+        for i, register_data in enumerate(multi_command_read):
+            if multi_read_data[i] is None:
+                multi_read_data[i] = next(bus_read_data)
+                self._update(pin_name, register_data, multi_read_data[i])
+        return multi_read_data
@@ -0,0 +1,336 @@
+import re
+from os import path
+import xml.etree.ElementTree as ElementTree
+import nidigital
+from nimipi.rffe import RffeException
+
+
+class SimulatedSession(nidigital.Session):
+    """ In-process stand-in for nidigital.Session that implements the calls nimipi.rffe makes, so the library can run
+        without hardware. Source data is decoded per pattern label the same way the RFFE command patterns frame it,
+        parity is checked, and every site keeps a register file per slave address so reads return what was written.
+        When modeled timing is on, each burst adds its bus time at AC.Frequency from the loaded specifications.
+        Frames with bad parity or framing are ignored like a real slave would, and recorded in bus_errors.
+        With strict set, they raise RffeException instead.
+        With max_frequency set, bursts at a higher AC.Frequency are missed by the slaves and every captured bit reads high.
+        Like the instrument, a burst needs a loaded pattern that provides its start label. The label of a pattern file is
+        taken from its RFFE_<label>.digipat name; the uncompiled .digipatsrc is accepted too, since the simulator models
+        the pattern source rather than running the compiled pattern. """
+    # Command bits the per-command patterns drive themselves, before the first source sample is used
+    _PATTERN_COMMAND_BITS = {
+        "Reg0Write": "1",
+        "RegWrite": "010",
+        "RegRead": "011",
+        "RegWriteExt": "0000",
+        "RegReadExt": "0010",
+        "RegWriteExtLong": "00110",
+        "RegReadExtLong": "00111",
+    }
+    _WAIT_TIME = 3e-6 # Wait3us time set at the start of every command pattern
+    # Plain attributes in place of the driver properties, so the start trigger can be configured without a driver session
+    start_trigger_type = None
+    digital_edge_start_trigger_source = ""
+
+    def __init__(self, resource_name="PXIe-6570", id_query=True, reset_device=False, strict=False, modeled_timing=True, max_frequency=None):
+        # nidigital.Session.__init__ is not called, it would open a driver session
+        self.resource_name = resource_name
+        self.strict = strict
+        self.modeled_timing = modeled_timing
+        self.max_frequency = max_frequency
+        self.sites = [0]
+        self.frequency = 1e6
+        self.patterns = []
+        self.pattern_labels = {}
+        self.source_waveforms = {}
+        self.capture_waveforms = {}
+        self.sequencer_registers = {}
+        self.registers = {}
+        self.bus_errors = []
+        self.burst_count = 0
+        self.modeled_time = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        pass
+
+    def load_pin_map(self, file_path):
+        """ Reads the site numbers from the pin map. Like the instrument, loading a pin map unloads the patterns. """
+        self.patterns = []
+        self.pattern_labels = {}
+        root = ElementTree.parse(file_path).getroot()
+        sites = sorted(int(element.get("siteNumber")) for element in root.iter() if element.tag.endswith("Site"))
+        self.sites = sites or [0]
+
+    def load_specifications(self, file_path):
+        """ Reads AC.Frequency for the modeled bus timing. """
+        root = ElementTree.parse(file_path).getroot()
+        for section in root:
+            if section.get("name") != "AC":
+                continue
+            for formula in section:
+                if formula.get("symbol") == "Frequency":
+                    self.frequency = self._parse_spec_value(formula[0].text)
+
+    def _parse_spec_value(self, text):
+        match = re.fullmatch(r"\s*([-+0-9.eE]+)\s*([kMG]?)\s*(Hz)?\s*", text)
+        if match is None:
+            raise RffeException(5000, "Cannot evaluate specification value " + repr(text) + " in the simulator.")
+        return float(match.group(1)) * {"": 1, "k": 1e3, "M": 1e6, "G": 1e9}[match.group(2)]
+
+    def unload_specifications(self, file_path):
+        pass
+
+    def load_levels(self, file_path):
+        pass
+
+    def load_timing(self, file_path):
+        pass
+
+    def apply_levels_and_timing(self, site_list, levels_sheet, timing_sheet, initial_state_high_pins, initial_state_low_pins, initial_state_tristate_pins):
+        pass
+
+    def load_pattern(self, file_path):
+        """ Records the start label the pattern file provides, see the class docstring. """
+        file_name, extension = path.splitext(path.basename(file_path))
+        if extension not in (".digipat", ".digipatsrc") or not file_name.startswith("RFFE_"):
+            raise RffeException(5000, "The simulator cannot tell the start label of pattern file " + file_path + '.')
+        self.patterns.append(file_path)
+        self.pattern_labels[file_name[len("RFFE_"):]] = file_path
+
+    def create_source_waveform_serial(self, pin_list, waveform_name, data_mapping, sample_width, bit_order):
+        self.source_waveforms[waveform_name] = {"data_mapping": data_mapping, "sample_width": sample_width, "data": {}}
+
+    def create_source_waveform_parallel(self, pin_list, waveform_name, data_mapping):
+        self.source_waveforms[waveform_name] = {"data_mapping": data_mapping, "sample_width": len(pin_list.split(',')), "data": {}}
+
+    def create_capture_waveform_serial(self, pin_list, waveform_name, sample_width, bit_order):
+        self.capture_waveforms[waveform_name] = {"sample_width": sample_width, "samples": {}}
+
+    def _source_waveform(self, waveform_name):
+        if waveform_name not in self.source_waveforms:
+            raise RffeException(5000, "Source waveform " + waveform_name + " has not been created.")
+        return self.source_waveforms[waveform_name]
+
+    def write_source_waveform_broadcast(self, waveform_name, waveform_data):
+        self._source_waveform(waveform_name)["data"] = {site: [int(sample) for sample in waveform_data] for site in self.sites}
+
+    def write_source_waveform_site_unique(self, waveform_name, waveform_data):
+        self._source_waveform(waveform_name)["data"] = {site: [int(sample) for sample in site_data] for site, site_data in waveform_data.items()}
+
+    def write_sequencer_register(self, sequencer_register, value):
+        self.sequencer_registers[sequencer_register] = int(value)
+
+    def _parse_site_list(self, site_list):
+        if not site_list:
+            return list(self.sites)
+        return [int(site.strip()[len("site"):]) for site in site_list.split(',')]
+
+    def burst_pattern(self, site_list, start_label, select_digital_function=True, wait_until_done=True, timeout=10):
+        """ Runs the command pattern for start_label on every site in site_list against the simulated slaves. """
+        if start_label not in self.pattern_labels:
+            raise RffeException(5000, "No loaded pattern provides start label " + start_label + '.')
+        sequence_registers = self._sequence_registers(start_label)
+        if start_label not in self._PATTERN_COMMAND_BITS and sequence_registers is None:
+            raise RffeException(5000, "The simulator has no model for start label " + start_label + '.')
+        source_waveform = self._source_waveform(start_label)
+        capture_waveform = self.capture_waveforms.get(start_label)
+        bus_cycles = 0
+        for site in self._parse_site_list(site_list):
+            source_data = source_waveform["data"].get(site, [])
+            if self.max_frequency is not None and self.frequency > self.max_frequency:
+                samples, bus_cycles = self._run_too_fast(start_label, capture_waveform)
+            elif sequence_registers is not None:
+                samples, bus_cycles = self._run_sequence(site, source_data, sequence_registers)
+            else:
+                samples, bus_cycles = self._run_command(site, start_label, source_data)
+            if capture_waveform is not None:
+                capture_waveform["samples"][site] = samples
+        self.burst_count += 1
+        if self.modeled_timing:
+            self.modeled_time += self._WAIT_TIME + bus_cycles / self.frequency
+
+    def wait_until_done(self, timeout=10):
+        pass
+
+    def fetch_capture_waveform(self, site_list, waveform_name, samples_to_read, timeout=10):
+        """ Returns the captured samples of every site in site_list, in site list order. """
+        if waveform_name not in self.capture_waveforms:
+            raise RffeException(5000, "Capture waveform " + waveform_name + " has not been created.")
+        captured = self.capture_waveforms[waveform_name]["samples"]
+        site_samples = []
+        for site in self._parse_site_list(site_list):
+            samples = captured.get(site, [])
+            if len(samples) < samples_to_read:
+                raise RffeException(5000, "Fetch of " + str(samples_to_read) + " samples timed out, " + str(len(samples)) + " were captured.")
+            site_samples.append(samples[:samples_to_read])
+        return site_samples
+
+    def _bus_error(self, site, message):
+        if self.strict:
+            raise RffeException(5000, "Simulated bus error on site " + str(site) + ": " + message)
+        self.bus_errors.append((site, message))
+
+    def _parity(self, bits):
+        return str(1 - bits.count('1') % 2)
+
+    def _register_file(self, site, slave_address):
+        return self.registers.setdefault(site, {}).setdefault(slave_address, {})
+
+    def _run_command(self, site, label, source_data):
+        """ Decodes one command from the per-command source data, where each sample is one bit after the hard coded command bits.
+            Returns the capture samples, one 8 bit sample per read byte, and the bus cycles used. """
+        source_bits = "".join(str(sample & 1) for sample in source_data)
+        bits = source_bits[:4] + self._PATTERN_COMMAND_BITS[label] + source_bits[4:] # the command bits follow SA[3:0] on the bus
+        byte_count = self.sequencer_registers.get("reg0", 1)
+        frame_length = self._frame_length(bits, byte_count)
+        response = self._execute(site, bits[:frame_length])
+        if not label.startswith("RegRead"):
+            return ([], 2 + frame_length + 1)
+        read_byte_count = 1 if label == "RegRead" else byte_count # the extended read patterns capture reg0 bytes
+        samples = ([data for data, _ in response] + [0] * read_byte_count)[:read_byte_count]
+        return (samples, 2 + frame_length + 1 + 9 * read_byte_count + 1)
+
+    def _run_too_fast(self, label, capture_waveform):
+        """ Models a burst above max_frequency: nothing reaches the slaves and every captured bit reads high. """
+        if capture_waveform is None or label in ("Reg0Write", "RegWrite", "RegWriteExt", "RegWriteExtLong"):
+            return ([], 0)
+        sequence_registers = self._sequence_registers(label)
+        if sequence_registers is not None:
+            sample_count = self.sequencer_registers.get(sequence_registers[0], 0) * self.sequencer_registers.get(sequence_registers[2], 1)
+        else:
+            sample_count = 1 if label == "RegRead" else self.sequencer_registers.get("reg0", 1)
+        return ([(1 << capture_waveform["sample_width"]) - 1] * sample_count, 0)
+
+    def _frame_length(self, bits, byte_count):
+        """ Length in bits of the master part of the frame starting at bits, with byte_count data bytes for writes. """
+        command_bits = bits[4:12]
+        if command_bits.startswith("1"):
+            return 13
+        if command_bits.startswith("010"):
+            return 22
+        if command_bits.startswith("011"):
+            return 13
+        if command_bits.startswith("0000"):
+            return 13 + 9 + 9 * byte_count
+        if command_bits.startswith("0010"):
+            return 13 + 9
+        if command_bits.startswith("00110"):
+            return 13 + 18 + 9 * byte_count
+        if command_bits.startswith("00111"):
+            return 13 + 18
+        return len(bits)
+
+    def _sequence_registers(self, label):
+        """ Returns the (slot count, slot length, read window bytes) sequencer registers of RegSequence or one of its resident
+            RegSequenceSlot<n> copies, or None for any other label. """
+        if label == "RegSequence":
+            return ("reg0", "reg1", "reg2")
+        match = re.fullmatch(r"RegSequenceSlot(\d+)", label)
+        if match is None:
+            return None
+        slot = int(match.group(1))
+        return ("reg" + str(3 + 3 * slot), "reg" + str(4 + 3 * slot), "reg" + str(5 + 3 * slot))
+
+    def _run_sequence(self, site, source_data, sequence_registers):
+        """ Decodes the RegSequence slots. Each sample is RFFECLK << 1 | RFFEDATA, and every slot is followed by a
+            read window captured as 9 bit samples (data byte << 1 | parity). """
+        slot_count = self.sequencer_registers.get(sequence_registers[0], 0)
+        slot_length = self.sequencer_registers.get(sequence_registers[1], 0)
+        window_bytes = self.sequencer_registers.get(sequence_registers[2], 1)
+        samples = []
+        for slot in range(slot_count):
+            slot_data = source_data[slot * slot_length:(slot + 1) * slot_length]
+            window = [0] * window_bytes
+            ssc = next((i for i in range(len(slot_data) - 1) if slot_data[i] == 0b01 and slot_data[i + 1] == 0b00), None)
+            if ssc is None:
+                self._bus_error(site, "slot " + str(slot) + " has no sequence start condition.")
+            else:
+                clocked = [sample & 1 for sample in slot_data[ssc + 2:] if sample & 0b10]
+                bits = "".join(str(bit) for bit in clocked[:-1]) # the last clocked bit is the bus park
+                for i, (data, parity) in enumerate(self._execute(site, bits)[:window_bytes]):
+                    window[i] = (data << 1) | parity
+            samples.extend(window)
+        return (samples, 3 + slot_count * (slot_length + 9 * window_bytes + 1))
+
+    def _execute(self, site, bits):
+        """ Executes one complete frame (SA, command bits, fields and parity, without SSC or bus park) on the simulated slave.
+            Returns a list of (data, parity) read responses, empty for writes and rejected frames. """
+        slave_address = int(bits[:4], 2) if len(bits) >= 4 else 0
+        command_bits = bits[4:12]
+        if command_bits.startswith("1"):
+            return self._execute_reg0_write(site, slave_address, bits)
+        if command_bits.startswith("010") or command_bits.startswith("011"):
+            return self._execute_standard(site, slave_address, bits, command_bits.startswith("011"))
+        if command_bits.startswith("0000") or command_bits.startswith("0010"):
+            return self._execute_extended(site, slave_address, bits, 4, 1, command_bits.startswith("0010"))
+        if command_bits.startswith("00110") or command_bits.startswith("00111"):
+            return self._execute_extended(site, slave_address, bits, 5, 2, command_bits.startswith("00111"))
+        self._bus_error(site, "unsupported command bits " + command_bits + '.')
+        return []
+
+    def _check_parity(self, site, bits, parity_bit, field):
+        if parity_bit != self._parity(bits):
+            self._bus_error(site, "parity error in " + field + '.')
+            return False
+        return True
+
+    def _execute_reg0_write(self, site, slave_address, bits):
+        if len(bits) != 13:
+            self._bus_error(site, "Reg0Write frame has " + str(len(bits)) + " bits.")
+            return []
+        if self._check_parity(site, bits[:12], bits[12], "Reg0Write command frame"):
+            register_file = self._register_file(site, slave_address)
+            register_file[0] = (register_file.get(0, 0) & 0x80) | int(bits[5:12], 2)
+        return []
+
+    def _execute_standard(self, site, slave_address, bits, read):
+        expected_length = 13 if read else 22
+        if len(bits) != expected_length:
+            self._bus_error(site, "register " + ("read" if read else "write") + " frame has " + str(len(bits)) + " bits.")
+            return []
+        if not self._check_parity(site, bits[:12], bits[12], "command frame"):
+            return []
+        register_address = int(bits[7:12], 2)
+        register_file = self._register_file(site, slave_address)
+        if read:
+            data = "{:08b}".format(register_file.get(register_address, 0))
+            return [(int(data, 2), int(self._parity(data)))]
+        if self._check_parity(site, bits[13:21], bits[21], "data frame"):
+            register_file[register_address] = int(bits[13:21], 2)
+        return []
+
+    def _execute_extended(self, site, slave_address, bits, command_width, address_bytes, read):
+        byte_count_width = 8 - command_width
+        if len(bits) < 13 + 9 * address_bytes:
+            self._bus_error(site, "extended frame has " + str(len(bits)) + " bits.")
+            return []
+        if not self._check_parity(site, bits[:12], bits[12], "command frame"):
+            return []
+        byte_count = int(bits[4 + command_width:12], 2) + 1
+        register_address = 0
+        for i in range(address_bytes):
+            address_byte = bits[13 + 9 * i:21 + 9 * i]
+            if not self._check_parity(site, address_byte, bits[21 + 9 * i], "address frame"):
+                return []
+            register_address = (register_address << 8) | int(address_byte, 2)
+        address_mask = (1 << (8 * address_bytes)) - 1
+        register_file = self._register_file(site, slave_address)
+        if read:
+            response = []
+            for i in range(byte_count):
+                data = "{:08b}".format(register_file.get((register_address + i) & address_mask, 0))
+                response.append((int(data, 2), int(self._parity(data))))
+            return response
+        data_frame = bits[13 + 9 * address_bytes:]
+        if len(data_frame) != 9 * byte_count:
+            self._bus_error(site, "extended write has " + str(len(data_frame)) + " data bits for a byte count of " + str(byte_count) + " (BC field is " + str(byte_count_width) + " bits).")
+            return []
+        for i in range(byte_count):
+            if self._check_parity(site, data_frame[9 * i:9 * i + 8], data_frame[9 * i + 8], "data frame"):
+                register_file[(register_address + i) & address_mask] = int(data_frame[9 * i:9 * i + 8], 2)
+        return []
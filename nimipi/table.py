@@ -0,0 +1,165 @@
+import csv, struct
+import numpy
+from nimipi.rffe import RegisterData, RffeException
+
+# One fixed size record per entry. Write data lives in a separate buffer shared by every entry of the table.
+REGISTER_TABLE_DTYPE = numpy.dtype([("slave_address", "<u1"), ("register_address", "<u2"), ("byte_count", "<u1"),
+                                    ("data_offset", "<u4"), ("data_length", "<u1")])
+
+# Largest value each record field holds
+_FIELD_LIMITS = {name: int(numpy.iinfo(REGISTER_TABLE_DTYPE[name]).max) for name in REGISTER_TABLE_DTYPE.names}
+
+# Binary file layout: magic, entry count and data length as little endian uint64, the entries, then the data bytes.
+_BINARY_MAGIC = b"RFFETBL1"
+_BINARY_HEADER = struct.Struct("<8sQQ")
+
+
+class RegisterTableRow(RegisterData):
+    """ RegisterData view of one entry of a RegisterTable. Reads go to the table arrays, so creating a row copies nothing. """
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    @property
+    def slave_address(self):
+        return int(self.table.entries["slave_address"][self.index])
+
+    @property
+    def register_address(self):
+        return int(self.table.entries["register_address"][self.index])
+
+    @property
+    def byte_count(self):
+        return int(self.table.entries["byte_count"][self.index])
+
+    @property
+    def write_data(self):
+        entry = self.table.entries[self.index]
+        return self.table.data[entry["data_offset"]:entry["data_offset"] + entry["data_length"]].tolist()
+
+
+class RegisterTable:
+    """ Array backed list of register data. Each entry is a REGISTER_TABLE_DTYPE record and all write data is kept
+        in one uint8 buffer, so a table takes a few bytes per entry instead of a Python object and list per entry.
+        Iterating yields RegisterTableRow views, which every nimipi.rffe function accepts in place of RegisterData.
+        multi_command encodes a table straight from its arrays. """
+    def __init__(self, entries, data):
+        self.entries = entries
+        self.data = data
+
+    @classmethod
+    def from_register_data(cls, register_data_list):
+        """ Builds a table from RegisterData objects, e.g. the lists in rfmd8090.py. """
+        rows = [(register_data.slave_address, register_data.register_address, register_data.byte_count, register_data.write_data)
+                for register_data in register_data_list]
+        return cls._from_rows(rows)
+
+    @classmethod
+    def from_csv(cls, file_path):
+        """ Loads a table from a CSV file with slave_address, register_address, byte_count and write_data columns.
+            Numbers may be decimal or 0x prefixed hex, write_data holds space separated bytes and may be empty for reads.
+            Blank lines, lines starting with # and a header row are skipped. """
+        rows = []
+        with open(file_path, newline='') as csv_file:
+            for fields in csv.reader(csv_file):
+                if not fields or not fields[0].strip() or fields[0].strip().startswith('#') or fields[0].strip() == "slave_address":
+                    continue
+                write_data = [int(value, 0) for value in fields[3].split()] if len(fields) > 3 else []
+                rows.append((int(fields[0], 0), int(fields[1], 0), int(fields[2], 0), write_data))
+        return cls._from_rows(rows)
+
+    @classmethod
+    def from_binary(cls, file_path, memory_map=True):
+        """ Loads a table written by save. With memory_map set the entries and data are mapped read only instead of
+            read into memory, so only the pages that are used get loaded. """
+        with open(file_path, 'rb') as binary_file:
+            magic, entry_count, data_length = _BINARY_HEADER.unpack(binary_file.read(_BINARY_HEADER.size))
+            if magic != _BINARY_MAGIC:
+                raise RffeException(5000, file_path + " is not a register table file.")
+            if not memory_map:
+                entries = numpy.fromfile(binary_file, REGISTER_TABLE_DTYPE, entry_count)
+                data = numpy.fromfile(binary_file, numpy.uint8, data_length)
+                return cls(entries, data)
+        data_offset = _BINARY_HEADER.size + entry_count * REGISTER_TABLE_DTYPE.itemsize
+        entries = numpy.memmap(file_path, REGISTER_TABLE_DTYPE, 'r', _BINARY_HEADER.size, (entry_count,)) if entry_count else numpy.zeros(0, REGISTER_TABLE_DTYPE)
+        data = numpy.memmap(file_path, numpy.uint8, 'r', data_offset, (data_length,)) if data_length else numpy.zeros(0, numpy.uint8)
+        return cls(entries, data)
+
+    @classmethod
+    def _check_row(cls, index, slave_address, register_address, byte_count, write_data):
+        """ Raises RffeException if a field of a row does not fit its record field, instead of letting numpy wrap or overflow it. """
+        for name, value in (("slave_address", slave_address), ("register_address", register_address), ("byte_count", byte_count),
+                            ("data_length", len(write_data))):
+            if not 0 <= value <= _FIELD_LIMITS[name]:
+                raise RffeException(5000, "Row " + str(index) + ' ' + name + " out of range. Expected [0, " + str(_FIELD_LIMITS[name]) + "], found " + str(value) + '.')
+        for data in write_data:
+            if not 0 <= data <= 0xFF:
+                raise RffeException(5000, "Row " + str(index) + " write data out of range. Expected [0x00, 0xFF], found " + repr(data) + '.')
+
+    @classmethod
+    def _from_rows(cls, rows):
+        for index, row in enumerate(rows):
+            cls._check_row(index, *row)
+        entries = numpy.zeros(len(rows), REGISTER_TABLE_DTYPE)
+        data_offset = 0
+        for entry, (slave_address, register_address, byte_count, write_data) in zip(entries, rows):
+            entry["slave_address"] = slave_address
+            entry["register_address"] = register_address
+            entry["byte_count"] = byte_count
+            entry["data_offset"] = data_offset
+            entry["data_length"] = len(write_data)
+            data_offset += len(write_data)
+        data = numpy.fromiter((value for row in rows for value in row[3]), numpy.uint8, data_offset)
+        return cls(entries, data)
+
+    def save(self, file_path):
+        """ Writes the table in the binary format read by from_binary. The data buffer is compacted on the way out. """
+        entries = numpy.array(self.entries, dtype=REGISTER_TABLE_DTYPE)
+        lengths = entries["data_length"].astype(numpy.int64)
+        offsets = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1])).astype(numpy.int64)
+        indices = numpy.repeat(self.entries["data_offset"].astype(numpy.int64) - offsets, lengths) + numpy.arange(lengths.sum())
+        data = numpy.asarray(self.data, dtype=numpy.uint8)[indices]
+        entries["data_offset"] = offsets
+        with open(file_path, 'wb') as binary_file:
+            binary_file.write(_BINARY_HEADER.pack(_BINARY_MAGIC, len(entries), len(data)))
+            binary_file.write(entries.tobytes())
+            binary_file.write(data.tobytes())
+
+    def to_csv(self, file_path):
+        """ Writes the table in the format read by from_csv. """
+        with open(file_path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["slave_address", "register_address", "byte_count", "write_data"])
+            for row in self:
+                writer.writerow(["0x{:X}".format(row.slave_address), "0x{:02X}".format(row.register_address), row.byte_count,
+                                 " ".join("0x{:02X}".format(value) for value in row.write_data)])
+
+    def columns(self, max_byte_count):
+        """ Returns the slave addresses, register addresses, byte counts, write data lengths and write data, zero padded
+            to max_byte_count columns, as uint32 arrays. Used by the nimipi.rffe batch encoder. """
+        entries = self.entries
+        write_data_lengths = entries["data_length"].astype(numpy.uint32)
+        write_data = numpy.zeros((len(entries), max_byte_count), dtype=numpy.uint32)
+        if max_byte_count and len(entries):
+            byte_indices = numpy.arange(max_byte_count, dtype=numpy.int64)
+            in_range = byte_indices[None, :] < write_data_lengths[:, None]
+            data_indices = entries["data_offset"].astype(numpy.int64)[:, None] + byte_indices[None, :]
+            write_data[in_range] = self.data[data_indices[in_range]]
+        return (entries["slave_address"].astype(numpy.uint32), entries["register_address"].astype(numpy.uint32),
+                entries["byte_count"].astype(numpy.uint32), write_data_lengths, write_data)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return (RegisterTableRow(self, index) for index in range(len(self.entries)))
+
+    def __getitem__(self, key):
+        """ An index returns a RegisterTableRow, a slice returns a RegisterTable sharing the same data buffer. """
+        if isinstance(key, slice):
+            return RegisterTable(self.entries[key], self.data)
+        if key < 0:
+            key += len(self.entries)
+        if key not in range(len(self.entries)):
+            raise IndexError("register table index out of range")
+        return RegisterTableRow(self, key)
@@ -0,0 +1,197 @@
+import argparse, itertools, json, time
+from glob import glob
+from os import path
+import nidigital
+from nimipi import rffe
+from nimipi.bands import SequenceBank
+from nimipi.simulator import SimulatedSession
+from rfmd8090 import Rfmd8090
+
+benchmark_directory_path = path.dirname(path.abspath(__file__))
+
+
+class NullSession(nidigital.Session):
+    """ Session whose driver calls do nothing, so only host side overhead is measured. Every driver method used by
+        nimipi is overridden, since the nidigital.Session ones go through a driver session this one never opens. """
+    resource_name = "NullSession"
+    # plain attributes in place of the nidigital properties, which would call the driver
+    start_trigger_type = None
+    digital_edge_start_trigger_source = ""
+
+    def __init__(self):
+        pass # nidigital.Session.__init__ would open a driver session
+
+    def close(self):
+        pass
+
+    def load_pin_map(self, file_path):
+        pass
+
+    def load_specifications(self, file_path):
+        pass
+
+    def unload_specifications(self, file_path):
+        pass
+
+    def load_levels(self, file_path):
+        pass
+
+    def load_timing(self, file_path):
+        pass
+
+    def apply_levels_and_timing(self, site_list, levels_sheet, timing_sheet, initial_state_high_pins, initial_state_low_pins, initial_state_tristate_pins):
+        pass
+
+    def load_pattern(self, file_path):
+        pass
+
+    def create_source_waveform_serial(self, pin_list, waveform_name, data_mapping, sample_width, bit_order):
+        pass
+
+    def create_source_waveform_parallel(self, pin_list, waveform_name, data_mapping):
+        pass
+
+    def create_capture_waveform_serial(self, pin_list, waveform_name, sample_width, bit_order):
+        pass
+
+    def write_source_waveform_broadcast(self, waveform_name, waveform_data):
+        pass
+
+    def write_source_waveform_site_unique(self, waveform_name, waveform_data):
+        pass
+
+    def write_sequencer_register(self, sequencer_register, value):
+        pass
+
+    def burst_pattern(self, site_list, start_label, select_digital_function=True, wait_until_done=True, timeout=10):
+        pass
+
+    def wait_until_done(self, timeout=10):
+        pass
+
+    def fetch_capture_waveform(self, site_list, waveform_name, samples_to_read, timeout=10):
+        return [[0] * samples_to_read]
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def measure(function, commands_per_call, iterations):
+    """ Calls function repeatedly and returns commands/second and per-call latency percentiles in microseconds. """
+    function() # warm up, e.g. the waveform registry
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        function()
+        durations.append(time.perf_counter_ns() - start)
+    durations.sort()
+    return {"commands_per_second": commands_per_call * iterations * 1e9 / sum(durations),
+            "p50_us": percentile(durations, 0.50) / 1e3,
+            "p90_us": percentile(durations, 0.90) / 1e3,
+            "p99_us": percentile(durations, 0.99) / 1e3}
+
+
+def encode_benchmarks(iterations):
+    """ __create_source_waveform_data for every command type at the smallest and largest byte count. """
+    results = {}
+    max_byte_counts = {"REG_WRITE_EXT": 16, "REG_READ_EXT": 16, "REG_READ_EXT_HR": 16,
+                       "REG_WRITE_EXT_LONG": 8, "REG_READ_EXT_LONG": 8, "REG_READ_EXT_LONG_HR": 8}
+    for command in rffe.__Command:
+        for byte_count in sorted(set([1, max_byte_counts.get(command.name, 1)])):
+            register_address = 0x1234 if "LONG" in command.name else 0x0A
+            register_data = rffe.RegisterData(0xC, register_address, [0x5A] * byte_count, byte_count)
+            results["encode " + command.name + " x" + str(byte_count)] = measure(
+                lambda: rffe.__create_source_waveform_data(command, register_data), 1, iterations)
+    return results
+
+
+def burst_benchmarks(session, iterations):
+    """ The full __burst_command path through the public command functions. """
+    results = {}
+    for command_function, register_data in ((rffe.reg0_write, rffe.RegisterData(0xC, 0x00, [0x14], 1)),
+                                            (rffe.reg_write, rffe.RegisterData(0xC, 0x0A, [0x14], 1)),
+                                            (rffe.reg_read, rffe.RegisterData(0xC, 0x0A, [], 1)),
+                                            (rffe.extended_reg_write, rffe.RegisterData(0xC, 0x0A, [0x14] * 16, 16)),
+                                            (rffe.extended_reg_read, rffe.RegisterData(0xC, 0x0A, [], 16)),
+                                            (rffe.extended_reg_write_long, rffe.RegisterData(0xC, 0x1234, [0x14] * 8, 8)),
+                                            (rffe.extended_reg_read_long, rffe.RegisterData(0xC, 0x1234, [], 8))):
+        results["burst " + command_function.__name__] = measure(lambda: command_function(session, "RFFEDATA", register_data), 1, iterations)
+    return results
+
+
+def band_benchmarks(session, iterations):
+    """ End-to-end multi_command on the Rfmd8090 band configurations, writing and reading back every register,
+        and switching between the two bands preloaded in a SequenceBank. """
+    results = {}
+    for band_name in ("Band1Apt", "Band1Et"):
+        band = getattr(Rfmd8090, band_name)
+        for single_burst in (False, True):
+            name = "multi_command " + band_name + (" single_burst" if single_burst else "")
+            results[name] = measure(lambda: rffe.multi_command(session, "RFFEDATA", band, band, single_burst), 2 * len(band), iterations)
+    bank = SequenceBank(session, "RFFEDATA", {"Band1Apt": Rfmd8090.Band1Apt, "Band1Et": Rfmd8090.Band1Et})
+    band_names = itertools.cycle(bank.names) # alternate, so every select is a real switch
+    results["SequenceBank switch Band1Apt/Band1Et"] = measure(lambda: bank.select(next(band_names)),
+                                                              (len(Rfmd8090.Band1Apt) + len(Rfmd8090.Band1Et)) / 2, iterations)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ Prints each result next to the baseline and returns the names that got slower by more than threshold. """
+    regressions = []
+    print("{:50s} {:>12s} {:>10s} {:>10s} {:>10s} {:>9s}".format("benchmark", "commands/s", "p50 us", "p90 us", "p99 us", "change"))
+    for name, result in results.items():
+        change = ""
+        if name in baseline:
+            ratio = result["commands_per_second"] / baseline[name]["commands_per_second"] - 1
+            change = "{:+.1%}".format(ratio)
+            if ratio < -threshold:
+                regressions.append(name)
+                change += " !"
+        print("{:50s} {:12.0f} {:10.1f} {:10.1f} {:10.1f} {:>9s}".format(name, result["commands_per_second"], result["p50_us"], result["p90_us"], result["p99_us"], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks nimipi.rffe host overhead without hardware.")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--band-iterations", type=int, help="iterations of the band benchmarks, --iterations by default")
+    parser.add_argument("--simulated", action="store_true", help="burst against SimulatedSession and report modeled bus time, instead of a session that does nothing")
+    parser.add_argument("--baseline", help="baseline results to compare against, rffe_benchmark_baseline[_simulated].json by default")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown that counts as a regression, 0.10 is 10%%")
+    args = parser.parse_args()
+    if args.baseline is None: # null and simulated runs are not comparable, keep separate baselines
+        args.baseline = path.join(benchmark_directory_path, "rffe_benchmark_baseline" + ("_simulated" if args.simulated else "") + ".json")
+
+    session = SimulatedSession() if args.simulated else NullSession()
+    project_path = path.join(benchmark_directory_path, "nimipi", "digiproj")
+    rffe.load_pin_map(session, path.join(project_path, "PinMap.pinmap"))
+    rffe.load_sheets(session, path.join(project_path, "Specifications.specs"), path.join(project_path, "PinLevels.digilevels"),
+                     path.join(project_path, "Timing.digitiming"))
+    rffe.load_patterns(session, path.join(project_path, "RFFE Command Patterns"))
+    for pattern_file_path in glob(path.join(project_path, "RFFE Command Patterns", "RFFE_RegSequence*.digipatsrc")):
+        rffe.load_pattern(session, pattern_file_path) # RegSequence and its resident slots, modeled from their source when simulated
+    results = encode_benchmarks(args.iterations)
+    results.update(burst_benchmarks(session, args.iterations))
+    results.update(band_benchmarks(session, args.band_iterations or args.iterations))
+
+    baseline = {}
+    if path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    regressions = compare(results, baseline, args.threshold)
+    if args.simulated:
+        print("Modeled bus time: {:.3f} s over {:d} bursts".format(session.modeled_time, session.burst_count))
+    if args.save_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print("Saved baseline to " + args.baseline)
+    if regressions:
+        print("Regressions: " + ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
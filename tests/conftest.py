@@ -0,0 +1,36 @@
+from glob import glob
+from os import path
+import pytest
+from nimipi import rffe
+from nimipi.simulator import SimulatedSession
+
+PROJECT_PATH = path.join(path.dirname(path.dirname(path.abspath(__file__))), "nimipi", "digiproj")
+PIN_MAP_PATH = path.join(PROJECT_PATH, "PinMap.pinmap")
+PATTERN_DIRECTORY_PATH = path.join(PROJECT_PATH, "RFFE Command Patterns")
+SHEET_FILE_PATHS = (path.join(PROJECT_PATH, "Specifications.specs"), path.join(PROJECT_PATH, "PinLevels.digilevels"),
+                    path.join(PROJECT_PATH, "Timing.digitiming"))
+SEQUENCE_PATTERNS = "RFFE_RegSequence.digipatsrc"
+SEQUENCE_SLOT_PATTERNS = "RFFE_RegSequenceSlot*.digipatsrc"
+
+
+def configure(session, lazy=False, sequence_patterns=None, pin_map_path=PIN_MAP_PATH):
+    """ Loads the pin map, sheets and command patterns of the digital project onto a session. sequence_patterns is a file
+        name pattern of RegSequence sources to load as well, e.g. SEQUENCE_PATTERNS; the simulator models them from source. """
+    rffe.load_pin_map(session, pin_map_path)
+    rffe.load_sheets(session, *SHEET_FILE_PATHS)
+    rffe.load_patterns(session, PATTERN_DIRECTORY_PATH, lazy)
+    if sequence_patterns is not None:
+        for pattern_file_path in sorted(glob(path.join(PATTERN_DIRECTORY_PATH, sequence_patterns))):
+            rffe.load_pattern(session, pattern_file_path)
+
+
+def create_session(sequence_patterns=None, session_class=SimulatedSession, pin_map_path=PIN_MAP_PATH, **session_arguments):
+    """ Returns a strict session_class session configured by configure. """
+    session = session_class(strict=True, **session_arguments)
+    configure(session, sequence_patterns=sequence_patterns, pin_map_path=pin_map_path)
+    return session
+
+
+@pytest.fixture
+def session():
+    return create_session()
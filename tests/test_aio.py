@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+from conftest import create_session
+from nimipi import aio, rffe
+from nimipi.simulator import SimulatedSession
+
+
+class RecordingSession(SimulatedSession):
+    """ SimulatedSession that records burst starts and waits, in order. """
+    def __init__(self, **session_arguments):
+        super().__init__(**session_arguments)
+        self.calls = []
+
+    def burst_pattern(self, site_list, start_label, select_digital_function=True, wait_until_done=True, timeout=10):
+        self.calls.append(("burst_pattern", start_label))
+        super().burst_pattern(site_list, start_label, select_digital_function, wait_until_done, timeout)
+
+    def wait_until_done(self, timeout=10):
+        self.calls.append(("wait_until_done",))
+
+
+@pytest.fixture
+def session():
+    return create_session(session_class=RecordingSession)
+
+
+def test_multi_command(session):
+    write_list = [rffe.RegisterData(0xC, address, [address, 0xFF - address], 2) for address in range(0x10, 0x20, 2)]
+    read_list = [rffe.RegisterData(0xC, address, [], 2) for address in range(0x10, 0x20, 2)]
+    assert asyncio.run(aio.multi_command(session, "RFFEDATA", write_list, read_list)) == [register_data.write_data for register_data in write_list]
+
+
+def test_session_used_from_several_event_loops(session):
+    async def main(value):
+        # concurrent coroutines make the session lock wait, which binds it to the running loop
+        await asyncio.gather(aio.reg_write(session, "RFFEDATA", rffe.RegisterData(0xC, 0x03, [value], 1)),
+                             aio.reg_write(session, "RFFEDATA", rffe.RegisterData(0xC, 0x04, [value], 1)))
+        return await aio.reg_read(session, "RFFEDATA", rffe.RegisterData(0xC, 0x04, [], 1))
+    for value in (0x11, 0x22):
+        assert asyncio.run(main(value)) == [value]
+
+
+def test_failed_check_waits_for_started_burst(session):
+    write_list = [rffe.RegisterData(0xC, 0x10, [0x01], 1), rffe.RegisterData(0x10, 0x10, [0x02], 1)] # the second slave address is out of range
+    with pytest.raises(rffe.RffeException):
+        asyncio.run(aio.multi_command(session, "RFFEDATA", write_list, []))
+    assert session.calls == [("burst_pattern", "RegWriteExt"), ("wait_until_done",)]
+
+
+def test_concurrent_coroutines_take_turns(session):
+    async def main():
+        writes = [aio.extended_reg_write(session, "RFFEDATA", rffe.RegisterData(0xC, 0x20 + i, [i], 1)) for i in range(8)]
+        await asyncio.gather(*writes)
+        return await aio.extended_reg_read(session, "RFFEDATA", rffe.RegisterData(0xC, 0x20, [], 8))
+    assert asyncio.run(main()) == list(range(8))
+    assert all(first[0] == "burst_pattern" and second == ("wait_until_done",) for first, second in zip(session.calls[::2], session.calls[1::2]))
@@ -0,0 +1,74 @@
+import pytest
+from conftest import SEQUENCE_SLOT_PATTERNS, create_session
+from nimipi import rffe
+from nimipi.bands import SequenceBank
+
+
+def band(value):
+    return [(rffe.extended_reg_write, rffe.RegisterData(0xC, 0x10, [value, value + 1], 2)),
+            (rffe.reg_write, rffe.RegisterData(0xC, 0x02, [value], 1)),
+            (rffe.extended_reg_read, rffe.RegisterData(0xC, 0x10, [], 2))]
+
+
+def count_source_writes(session):
+    writes = []
+    write_source_waveform_broadcast = session.write_source_waveform_broadcast
+    def counting_write(waveform_name, waveform_data):
+        writes.append(waveform_name)
+        write_source_waveform_broadcast(waveform_name, waveform_data)
+    session.write_source_waveform_broadcast = counting_write
+    return writes
+
+
+def test_resident_bands_switch_without_writes():
+    session = create_session(SEQUENCE_SLOT_PATTERNS)
+    writes = count_source_writes(session)
+    bank = SequenceBank(session, "RFFEDATA", {"a": band(0x10), "b": band(0x20)})
+    assert sorted(writes) == ["RegSequenceSlot0", "RegSequenceSlot1"] # preloaded by add
+    for _ in range(3):
+        assert bank.select("a", validate=True) == [[0x10, 0x11]]
+        assert bank.select("b", validate=True) == [[0x20, 0x21]]
+    assert len(writes) == 2
+    assert rffe.reg_read(session, "RFFEDATA", rffe.RegisterData(0xC, 0x02, [], 1)) == [0x20]
+
+
+def test_more_bands_than_slots():
+    session = create_session(SEQUENCE_SLOT_PATTERNS)
+    writes = count_source_writes(session)
+    bank = SequenceBank(session, "RFFEDATA", {name: band(0x10 * i) for i, name in enumerate("abcdef")})
+    assert len(writes) == len(rffe.SEQUENCE_SLOT_PATTERNS)
+    assert bank.select("e") == [[0x40, 0x41]] # evicts a, the least recently used
+    assert bank.select("b") == [[0x10, 0x11]]
+    assert len(writes) == len(rffe.SEQUENCE_SLOT_PATTERNS) + 1
+    assert bank.select("a") == [[0x00, 0x01]] # evicts c
+    assert len(writes) == len(rffe.SEQUENCE_SLOT_PATTERNS) + 2
+    assert sorted(bank.resident_slots.values()) == list(range(len(rffe.SEQUENCE_SLOT_PATTERNS)))
+
+
+def test_per_command_fallback():
+    session = create_session()
+    bank = SequenceBank(session, "RFFEDATA", {"a": band(0x10), "b": [rffe.RegisterData(0xC, 0x10, [0x55], 1)]})
+    assert bank.select("a") == [[0x10, 0x11]]
+    assert bank.select("b") == []
+    assert rffe.extended_reg_read(session, "RFFEDATA", rffe.RegisterData(0xC, 0x10, [], 2)) == [0x55, 0x11]
+    with pytest.raises(rffe.RffeException):
+        bank.select("a", trigger_source="PXI_Trig0")
+    assert bank.latency_summary()["count"] == 2
+
+
+def test_triggered_select():
+    session = create_session(SEQUENCE_SLOT_PATTERNS)
+    bank = SequenceBank(session, "RFFEDATA", {"a": band(0x10)})
+    assert bank.select("a", trigger_source="PXI_Trig0") == [[0x10, 0x11]]
+    assert session.digital_edge_start_trigger_source == "PXI_Trig0"
+
+
+def test_burst_sequence_slot_checks_loaded_sequence():
+    session = create_session(SEQUENCE_SLOT_PATTERNS)
+    compiled_sequence = rffe.compile_sequence(band(0x10))
+    with pytest.raises(rffe.RffeException, match="load_sequence_slot"):
+        rffe.burst_sequence_slot(session, 0, compiled_sequence)
+    rffe.load_sequence_slot(session, "RFFEDATA", 0, compiled_sequence)
+    assert rffe.burst_sequence_slot(session, 0, compiled_sequence) == [[0x10, 0x11]]
+    with pytest.raises(rffe.RffeException, match="out of range"):
+        rffe.load_sequence_slot(session, "RFFEDATA", len(rffe.SEQUENCE_SLOT_PATTERNS), compiled_sequence)
@@ -0,0 +1,88 @@
+import os
+import numpy
+import pytest
+from nimipi import rffe
+from nimipi.cache import SequenceCache
+
+SEQUENCE = [(rffe.extended_reg_write, rffe.RegisterData(0xC, 0x10, [1, 2, 3], 3)),
+            (rffe.reg_write, rffe.RegisterData(0xC, 0x02, [0x42], 1)),
+            (rffe.extended_reg_read_long, rffe.RegisterData(0xC, 0x0123, [], 4))]
+
+
+def assert_compiled_equal(compiled_sequence, expected):
+    assert (compiled_sequence.slot_count, compiled_sequence.slot_length, compiled_sequence.read_window_bytes) == \
+        (expected.slot_count, expected.slot_length, expected.read_window_bytes)
+    assert (compiled_sequence.read_slots, compiled_sequence.read_byte_counts) == (expected.read_slots, expected.read_byte_counts)
+    assert compiled_sequence.source_waveform_data.dtype == numpy.uint32
+    assert numpy.array_equal(compiled_sequence.source_waveform_data, expected.source_waveform_data)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SequenceCache(str(tmp_path))
+
+
+def entry_path(cache):
+    return os.path.join(cache.directory_path, cache.key(SEQUENCE) + ".npz")
+
+
+def test_miss_then_hit(cache):
+    expected = rffe.compile_sequence(SEQUENCE)
+    assert_compiled_equal(cache.compile(SEQUENCE), expected)
+    assert (cache.hits, cache.misses, cache.rebuilds) == (0, 1, 0)
+    restarted_cache = SequenceCache(cache.directory_path) # entries survive a restart
+    assert_compiled_equal(restarted_cache.compile(SEQUENCE), expected)
+    assert (restarted_cache.hits, restarted_cache.misses) == (1, 0)
+    other_sequence = SEQUENCE[:1] + [(rffe.reg_write, rffe.RegisterData(0xC, 0x02, [0x43], 1))]
+    assert cache.key(other_sequence) != cache.key(SEQUENCE)
+    restarted_cache.compile(other_sequence)
+    assert restarted_cache.misses == 1
+
+
+def test_checksum_mismatch_rebuilds(cache):
+    cache.compile(SEQUENCE)
+    with numpy.load(entry_path(cache)) as entry:
+        arrays = dict(entry)
+    arrays["source_waveform_data"] = arrays["source_waveform_data"] ^ 1 # the stored checksum no longer matches
+    with open(entry_path(cache), 'wb') as entry_file:
+        numpy.savez(entry_file, **arrays)
+    assert_compiled_equal(cache.compile(SEQUENCE), rffe.compile_sequence(SEQUENCE))
+    assert cache.rebuilds == 1
+    cache.compile(SEQUENCE)
+    assert cache.hits == 1 # the rebuild replaced the bad entry
+
+
+@pytest.mark.parametrize("contents", [b"", b"not a zip file", None], ids=["empty", "garbage", "truncated"])
+def test_corrupted_entry_rebuilds(cache, contents):
+    cache.compile(SEQUENCE)
+    if contents is None:
+        with open(entry_path(cache), 'rb') as entry_file:
+            contents = entry_file.read()[:-100]
+    with open(entry_path(cache), 'wb') as entry_file:
+        entry_file.write(contents)
+    assert_compiled_equal(cache.compile(SEQUENCE), rffe.compile_sequence(SEQUENCE))
+    assert (cache.hits, cache.rebuilds) == (0, 1)
+
+
+def test_entry_of_another_key_rebuilds(cache):
+    other_sequence = SEQUENCE[:2]
+    cache.compile(other_sequence)
+    os.replace(os.path.join(cache.directory_path, cache.key(other_sequence) + ".npz"), entry_path(cache))
+    assert_compiled_equal(cache.compile(SEQUENCE), rffe.compile_sequence(SEQUENCE))
+    assert cache.rebuilds == 1
+
+
+def test_clear_keeps_entries_being_written(cache, monkeypatch):
+    cache.compile(SEQUENCE[:1])
+    other_file_path = os.path.join(cache.directory_path, "measurements.npz")
+    numpy.savez(other_file_path, data=numpy.zeros(1))
+    replace = os.replace
+    def replace_after_clear(source, destination):
+        cache.clear() # another process clears while this entry is being written
+        replace(source, destination)
+    monkeypatch.setattr(os, "replace", replace_after_clear)
+    assert_compiled_equal(cache.compile(SEQUENCE), rffe.compile_sequence(SEQUENCE))
+    monkeypatch.undo()
+    assert sorted(os.listdir(cache.directory_path)) == sorted([cache.key(SEQUENCE) + ".npz", "measurements.npz"])
+    cache.clear()
+    assert os.listdir(cache.directory_path) == ["measurements.npz"]
@@ -0,0 +1,57 @@
+import numpy
+import pytest
+from nimipi import dump
+from nimipi.table import RegisterTable
+
+# Inclusive skip ranges: one crossing the chunk boundary at 0x08, one crossing 0x10, and two overlapping ones
+SKIP_RANGES = [(0x05, 0x0A), (0x0F, 0x10), (0x24, 0x27), (0x22, 0x25)]
+CHUNKS = [(0x00, 5), (0x0B, 4), (0x11, 8), (0x19, 8), (0x21, 1), (0x28, 8)]
+
+
+@pytest.fixture
+def session(session):
+    session.registers[0] = {0x3: {register_address: register_address ^ 0x5A for register_address in range(0x40)}}
+    return session
+
+
+def expected_read_data(register_address, byte_count):
+    return [(register_address + i) ^ 0x5A for i in range(byte_count)]
+
+
+def test_iter_register_map_skips_across_chunk_boundaries(session):
+    chunks = list(dump.iter_register_map(session, "RFFEDATA", 0x3, 0x00, 0x2F, SKIP_RANGES))
+    assert [(register_address, len(read_data)) for register_address, read_data in chunks] == CHUNKS
+    assert [list(read_data) for _, read_data in chunks] == [expected_read_data(*chunk) for chunk in CHUNKS]
+    assert session.burst_count == len(CHUNKS)
+
+
+def test_skip_ranges_outside_and_around_the_dump(session):
+    chunks = list(dump.iter_register_map(session, "RFFEDATA", 0x3, 0x06, 0x12, [(0x00, 0x07), (0x10, 0x20), (0x30, 0x40)]))
+    assert [(register_address, len(read_data)) for register_address, read_data in chunks] == [(0x08, 8)]
+    assert list(dump.iter_register_map(session, "RFFEDATA", 0x3, 0x06, 0x12, [(0x00, 0x20)])) == []
+
+
+def test_dump_to_array(session):
+    output = numpy.full(0x30, -1, numpy.int16)
+    assert dump.dump_register_map(session, "RFFEDATA", 0x3, output, 0x00, 0x2F, SKIP_RANGES) == sum(byte_count for _, byte_count in CHUNKS)
+    skipped = set(register_address for first, last in SKIP_RANGES for register_address in range(first, last + 1))
+    assert output.tolist() == [-1 if register_address in skipped else register_address ^ 0x5A for register_address in range(0x30)]
+
+
+def test_dump_to_csv(session, tmp_path):
+    file_path = str(tmp_path / "dump.csv")
+    assert dump.dump_register_map(session, "RFFEDATA", 0x3, file_path, 0x00, 0x2F, SKIP_RANGES) == sum(byte_count for _, byte_count in CHUNKS)
+    rows = [(register_data.slave_address, register_data.register_address, register_data.byte_count, list(register_data.write_data))
+            for register_data in RegisterTable.from_csv(file_path)]
+    assert rows == [(0x3, register_address, byte_count, expected_read_data(register_address, byte_count)) for register_address, byte_count in CHUNKS]
+
+
+def test_stopping_early_waits_for_the_burst(session):
+    waits = []
+    wait_until_done = session.wait_until_done
+    session.wait_until_done = lambda timeout: waits.append(timeout) or wait_until_done(timeout)
+    chunks = dump.iter_register_map(session, "RFFEDATA", 0x3, 0x00, 0x2F, SKIP_RANGES)
+    assert next(chunks)[0] == 0x00
+    waits.clear()
+    chunks.close()
+    assert waits == [10] and session.burst_count == 2 # the second chunk was on the bus when the caller stopped
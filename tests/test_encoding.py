@@ -0,0 +1,91 @@
+import random
+import numpy
+import pytest
+from nimipi import rffe
+
+Command = rffe.__Command
+create_source_waveform_data = rffe.__create_source_waveform_data
+create_source_waveform_data_batch = rffe.__create_source_waveform_data_batch
+
+
+def random_register_data(command, count, seed):
+    """ Returns count RegisterData entries in range for command, covering the address and byte count limits. """
+    generator = random.Random(seed)
+    if command == Command.REG_0_WRITE:
+        return [rffe.RegisterData(generator.randrange(0x10), 0, [generator.randrange(0x80)], 1) for _ in range(count)]
+    if command == Command.REG_WRITE:
+        return [rffe.RegisterData(generator.randrange(0x10), generator.randrange(0x20), [generator.randrange(0x100)], 1) for _ in range(count)]
+    if command in (Command.REG_READ, Command.REG_READ_HR):
+        return [rffe.RegisterData(generator.randrange(0x10), generator.randrange(0x20), [], 1) for _ in range(count)]
+    max_byte_count = 16 if command in (Command.REG_WRITE_EXT, Command.REG_READ_EXT, Command.REG_READ_EXT_HR) else 8
+    max_address = 0xFF if max_byte_count == 16 else 0xFFFF
+    register_data_list = []
+    for i in range(count):
+        register_address = generator.randrange(max_address + 1)
+        if i % 4 == 0:
+            register_address = generator.randrange(0x100) # extended long addresses below 0x100 keep a zero upper address byte
+        byte_count = generator.randint(1, max_byte_count)
+        if command in (Command.REG_WRITE_EXT, Command.REG_WRITE_EXT_LONG):
+            write_data = [generator.randrange(0x100) for _ in range(byte_count)]
+        else:
+            write_data = []
+        register_data_list.append(rffe.RegisterData(generator.randrange(0x10), register_address, write_data, byte_count))
+    return register_data_list
+
+
+@pytest.mark.parametrize("command", list(Command), ids=lambda command: command.name)
+def test_batch_matches_single_frame_encoder(command):
+    register_data_list = random_register_data(command, 200, command.value)
+    byte_counts, bits = create_source_waveform_data_batch(command, register_data_list)
+    assert len(byte_counts) == len(register_data_list)
+    for register_data, byte_count, row in zip(register_data_list, byte_counts, bits):
+        expected_byte_count, expected_bits = create_source_waveform_data(command, register_data)
+        assert int(byte_count) == expected_byte_count
+        assert row.tolist() == expected_bits
+
+
+@pytest.mark.parametrize("register_address", [0x0000, 0x0001, 0x00FF, 0x0100, 0xFFFF])
+@pytest.mark.parametrize("command", [Command.REG_WRITE_EXT_LONG, Command.REG_READ_EXT_LONG, Command.REG_READ_EXT_LONG_HR], ids=lambda command: command.name)
+def test_extended_long_address_bytes(command, register_address):
+    write_data = [0xA5] if command == Command.REG_WRITE_EXT_LONG else []
+    register_data = rffe.RegisterData(0x5, register_address, write_data, 1)
+    _, bits = create_source_waveform_data_batch(command, [register_data])
+    _, expected_bits = create_source_waveform_data(command, register_data)
+    assert bits[0].tolist() == expected_bits
+    address_bits = bits[0][8:26] # A[15:8] P A[7:0] P after SA, BC and parity
+    assert int("".join(str(bit) for bit in address_bits[:8]), 2) == register_address >> 8
+    assert int("".join(str(bit) for bit in address_bits[9:17]), 2) == register_address & 0xFF
+
+
+def test_register_table_matches_register_data():
+    from nimipi.table import RegisterTable
+    register_data_list = random_register_data(Command.REG_WRITE_EXT, 50, 1)
+    table = RegisterTable.from_register_data(register_data_list)
+    byte_counts, bits = create_source_waveform_data_batch(Command.REG_WRITE_EXT, table)
+    expected_byte_counts, expected_bits = create_source_waveform_data_batch(Command.REG_WRITE_EXT, register_data_list)
+    assert numpy.array_equal(byte_counts, expected_byte_counts)
+    assert numpy.array_equal(bits, expected_bits)
+
+
+WRITE_BYTE_COUNT_LIMITS = [(Command.REG_0_WRITE, 1), (Command.REG_WRITE, 1), (Command.REG_WRITE_EXT, 16), (Command.REG_WRITE_EXT_LONG, 8)]
+
+
+@pytest.mark.parametrize("command, max_byte_count", WRITE_BYTE_COUNT_LIMITS, ids=lambda value: getattr(value, "name", str(value)))
+def test_write_data_length_limits(command, max_byte_count):
+    for length in (1, max_byte_count):
+        register_data = rffe.RegisterData(0x5, 0x0A, [0x5A] * length, length)
+        byte_counts, bits = create_source_waveform_data_batch(command, [register_data])
+        assert (int(byte_counts[0]), bits[0].tolist()) == create_source_waveform_data(command, register_data)
+    for length in (0, max_byte_count + 1):
+        register_data = rffe.RegisterData(0x5, 0x0A, [0x5A] * length, max(length, 1))
+        with pytest.raises(rffe.RffeException) as single_error:
+            create_source_waveform_data(command, register_data)
+        with pytest.raises(rffe.RffeException) as batch_error:
+            create_source_waveform_data_batch(command, [rffe.RegisterData(0x5, 0x0A, [0x5A], 1), register_data])
+        assert single_error.value.message == batch_error.value.message == \
+            "Write data length out of range. Expected [1, " + str(max_byte_count) + "], found " + str(length) + '.'
+
+
+def test_multi_command_rejects_write_data_length(session):
+    with pytest.raises(rffe.RffeException, match="Write data length out of range"):
+        rffe.multi_command(session, "RFFEDATA", [rffe.RegisterData(0xC, 0x10, [1] * 17, 16)], [])
@@ -0,0 +1,108 @@
+import asyncio, csv, json
+import pytest
+from conftest import create_session
+from nimipi import aio, dump, prepared, rffe
+from nimipi.instrumentation import StageRecorder
+
+
+@pytest.fixture
+def session():
+    return create_session(resource_name="PXI1Slot2")
+
+
+@pytest.fixture
+def recorder():
+    recorder = rffe.enable_instrumentation()
+    yield recorder
+    rffe.disable_instrumentation()
+
+
+def stages(recorder, command_name):
+    return [record[7] for record in recorder.window if record[4] == command_name]
+
+
+def test_command_stages_are_tagged(session, recorder):
+    rffe.reg_write(session, "RFFEDATA", rffe.RegisterData(0x3, 0x0A, [0x5A], 1))
+    assert rffe.reg_read(session, "RFFEDATA", rffe.RegisterData(0x3, 0x0A, [], 1)) == [0x5A]
+    assert stages(recorder, "REG_WRITE") == ["data_check", "encode", "write_source_waveform", "write_sequencer_register", "burst_pattern"]
+    assert stages(recorder, "REG_READ") == ["data_check", "encode", "write_source_waveform", "write_sequencer_register", "burst_pattern",
+                                            "fetch_capture_waveform"]
+    for _, session_name, pin_name, site_list, _, slave_address, register_address, _, duration_ns in recorder.window:
+        assert (session_name, pin_name, site_list, slave_address, register_address) == ("PXI1Slot2", "RFFEDATA", "", 0x3, 0x0A)
+        assert duration_ns >= 0
+
+
+def test_disabled_records_nothing(session):
+    recorder = rffe.enable_instrumentation()
+    rffe.disable_instrumentation()
+    rffe.reg_write(session, "RFFEDATA", rffe.RegisterData(0x3, 0x0A, [0x5A], 1))
+    assert len(recorder.window) == 0
+    assert rffe.instrumentation_summary() == []
+
+
+def test_multi_site_stages_carry_the_site_list(session, recorder):
+    rffe.extended_reg_write_multi_site(session, "RFFEDATA", {0: rffe.RegisterData(0x3, 0x40, [1], 1), 1: rffe.RegisterData(0x3, 0x40, [2], 1)})
+    rffe.extended_reg_read_multi_site(session, "RFFEDATA", {0: rffe.RegisterData(0x3, 0x40, [], 1), 1: rffe.RegisterData(0x4, 0x41, [], 1)})
+    write_records = [record for record in recorder.window if record[4] == "REG_WRITE_EXT"]
+    read_records = [record for record in recorder.window if record[4] == "REG_READ_EXT"]
+    assert [record[7] for record in read_records][-1] == "fetch_capture_waveform"
+    assert set(record[3] for record in recorder.window) == {"site0,site1"}
+    assert set(record[5:7] for record in write_records) == {(0x3, 0x40)}
+    assert set(record[5:7] for record in read_records) == {(None, None)} # the sites read different registers
+
+
+def test_aio_and_dump_record_the_wait(session, recorder):
+    asyncio.run(aio.extended_reg_write(session, "RFFEDATA", rffe.RegisterData(0x3, 0x40, [1, 2], 2)))
+    assert stages(recorder, "REG_WRITE_EXT") == ["data_check", "encode", "write_source_waveform", "write_sequencer_register", "burst_pattern",
+                                                 "wait_until_done"]
+    recorder.reset()
+    assert len(list(dump.iter_register_map(session, "RFFEDATA", 0x3, 0x0000, 0x000F))) == 2
+    assert stages(recorder, "REG_READ_EXT_LONG").count("wait_until_done") == 2
+    assert stages(recorder, "REG_READ_EXT_LONG").count("fetch_capture_waveform") == 2
+
+
+def test_prepared_command_records_the_patch(session, recorder):
+    prepared_command = prepared.prepare_command(session, "RFFEDATA", rffe.reg_write, 0x3, 0x0A)
+    recorder.reset()
+    prepared_command.write(0x12)
+    assert stages(recorder, "REG_WRITE") == ["encode", "write_source_waveform", "write_sequencer_register", "burst_pattern"]
+
+
+def test_summary_group_by():
+    recorder = StageRecorder()
+    for session_name, duration_ns in (("PXI1Slot2", 1000), ("PXI1Slot2", 3000), ("PXI1Slot3", 5000)):
+        recorder.record("burst_pattern", "REG_WRITE", 0x3, 0x0A, duration_ns, session_name, "RFFEDATA", "")
+    recorder.record("encode", "REG_WRITE", 0x3, 0x0A, 2000, "PXI1Slot2", "RFFEDATA", "")
+    summary = recorder.summary()
+    assert [(group["command"], group["stage"], group["count"]) for group in summary] == [("REG_WRITE", "encode", 1), ("REG_WRITE", "burst_pattern", 3)]
+    assert summary[1]["mean_us"] == pytest.approx(3.0)
+    by_session = recorder.summary(("session", "stage"))
+    assert [(group["session"], group["stage"], group["count"]) for group in by_session] == [("PXI1Slot2", "encode", 1), ("PXI1Slot2", "burst_pattern", 2),
+                                                                                             ("PXI1Slot3", "burst_pattern", 1)]
+    assert by_session[2]["max_us"] == pytest.approx(5.0)
+    with pytest.raises(ValueError):
+        recorder.summary(("slave_address",))
+
+
+def test_window_evicts_from_the_histograms():
+    recorder = StageRecorder(window_size=2)
+    recorder.record("encode", "REG_WRITE", 0x3, 0x0A, 1000, "PXI1Slot2", "RFFEDATA", "site0")
+    recorder.record("encode", "REG_WRITE", 0x3, 0x0A, 1000, "PXI1Slot3", "RFFEDATA", "site0")
+    recorder.record("encode", "REG_WRITE", 0x3, 0x0A, 1000, "PXI1Slot3", "RFFEDATA", "site0")
+    assert sum(recorder.histograms[("PXI1Slot2", "RFFEDATA", "site0", "REG_WRITE", "encode")]) == 0
+    assert [(group["session"], group["count"]) for group in recorder.summary(("session",))] == [("PXI1Slot3", 2)]
+
+
+def test_exports(tmp_path):
+    recorder = StageRecorder()
+    recorder.record("encode", "REG_WRITE", 0x3, 0x0A, 1000, "PXI1Slot2", "RFFEDATA", "site0")
+    recorder.export_csv(str(tmp_path / "stages.csv"))
+    with open(str(tmp_path / "stages.csv"), newline='') as csv_file:
+        rows = list(csv.reader(csv_file))
+    assert rows[0] == list(StageRecorder.FIELDS)
+    assert rows[1][1:] == ["PXI1Slot2", "RFFEDATA", "site0", "REG_WRITE", "3", "10", "encode", "1000"]
+    recorder.export_json(str(tmp_path / "stages.json"), ("session", "sites"))
+    with open(str(tmp_path / "stages.json")) as json_file:
+        exported = json.load(json_file)
+    assert exported["summary"][0]["session"] == "PXI1Slot2" and exported["summary"][0]["sites"] == "site0"
+    assert exported["records"][0]["pin"] == "RFFEDATA"
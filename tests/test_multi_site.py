@@ -0,0 +1,80 @@
+import pytest
+from conftest import PIN_MAP_PATH, create_session
+from nimipi import rffe
+
+SITES = (0, 1)
+
+
+@pytest.fixture
+def session(tmp_path):
+    """ A session on a copy of the project pin map with RFFECLK, RFFEDATA and RFFEVIO connected on two sites. """
+    with open(PIN_MAP_PATH, encoding="utf-8-sig") as pin_map_file:
+        pin_map = pin_map_file.read()
+    connections = pin_map[pin_map.index("\t\t<Connection "):pin_map.index("\t</Connections>")]
+    pin_map = pin_map.replace('\t\t<Site siteNumber="0" />\n', '\t\t<Site siteNumber="0" />\n\t\t<Site siteNumber="1" />\n')
+    pin_map = pin_map.replace("\t</Connections>", connections.replace('siteNumber="0"', 'siteNumber="1"').replace('channel="', 'channel="1') + "\t</Connections>")
+    pin_map_path = str(tmp_path / "PinMap.pinmap")
+    with open(pin_map_path, 'w', encoding="utf-8") as pin_map_file:
+        pin_map_file.write(pin_map)
+    session = create_session(pin_map_path=pin_map_path)
+    assert session.sites == list(SITES)
+    return session
+
+
+def register(session, site, slave_address, register_address):
+    return session.registers.get(site, {}).get(slave_address, {}).get(register_address)
+
+
+@pytest.mark.parametrize("write_function, read_function, register_address, byte_count",
+                         [(rffe.reg_write_multi_site, rffe.reg_read_multi_site, 0x1C, 1),
+                          (rffe.extended_reg_write_multi_site, rffe.extended_reg_read_multi_site, 0x40, 16),
+                          (rffe.extended_reg_write_long_multi_site, rffe.extended_reg_read_long_multi_site, 0x1234, 8)],
+                         ids=["reg", "extended", "extended_long"])
+def test_write_read_per_site(session, write_function, read_function, register_address, byte_count):
+    site_write_data = {site: [(site * 0x40 + i) & 0xFF for i in range(byte_count)] for site in SITES}
+    assert write_function(session, "RFFEDATA", {site: rffe.RegisterData(0xC, register_address, site_write_data[site], byte_count) for site in SITES}) is None
+    for site in SITES:
+        assert [register(session, site, 0xC, register_address + i) for i in range(byte_count)] == site_write_data[site]
+    assert read_function(session, "RFFEDATA", {site: rffe.RegisterData(0xC, register_address, [], byte_count) for site in SITES}) == site_write_data
+
+
+def test_reg0_write_per_site(session):
+    rffe.reg0_write_multi_site(session, "RFFEDATA", {0: rffe.RegisterData(0x3, 0x00, [0x11], 1), 1: rffe.RegisterData(0x3, 0x00, [0x22], 1)})
+    assert rffe.reg_read_multi_site(session, "RFFEDATA", {site: rffe.RegisterData(0x3, 0x00, [], 1) for site in SITES}) == {0: [0x11], 1: [0x22]}
+
+
+def test_sites_address_different_registers(session):
+    rffe.extended_reg_write_multi_site(session, "RFFEDATA", {0: rffe.RegisterData(0x3, 0x10, [0xA0, 0xA1], 2), 1: rffe.RegisterData(0xC, 0x80, [0xB0, 0xB1], 2)})
+    assert (register(session, 0, 0x3, 0x10), register(session, 1, 0xC, 0x80)) == (0xA0, 0xB0)
+    assert (register(session, 1, 0x3, 0x10), register(session, 0, 0xC, 0x80)) == (None, None)
+    assert rffe.extended_reg_read_multi_site(session, "RFFEDATA", {0: rffe.RegisterData(0x3, 0x11, [], 1), 1: rffe.RegisterData(0xC, 0x81, [], 1)}) == {0: [0xA1], 1: [0xB1]}
+
+
+def test_sites_left_out_are_not_bursted(session):
+    rffe.extended_reg_write_multi_site(session, "RFFEDATA", {1: rffe.RegisterData(0xC, 0x40, [0x5A], 1)})
+    assert (register(session, 0, 0xC, 0x40), register(session, 1, 0xC, 0x40)) == (None, 0x5A)
+    assert rffe.extended_reg_read_multi_site(session, "RFFEDATA", {1: rffe.RegisterData(0xC, 0x40, [], 1)}) == {1: [0x5A]}
+
+
+def test_byte_count_must_match(session):
+    with pytest.raises(rffe.RffeException, match="Byte count must be the same on every site, found 1, 2."):
+        rffe.extended_reg_write_multi_site(session, "RFFEDATA", {0: rffe.RegisterData(0xC, 0x40, [1], 1), 1: rffe.RegisterData(0xC, 0x40, [1, 2], 2)})
+    with pytest.raises(rffe.RffeException, match="Byte count must be the same on every site, found 1, 3."):
+        rffe.extended_reg_read_multi_site(session, "RFFEDATA", {0: rffe.RegisterData(0xC, 0x40, [], 1), 1: rffe.RegisterData(0xC, 0x40, [], 3)})
+    assert session.burst_count == 0
+
+
+def test_multi_command_multi_site(session):
+    site_multi_command_write = {0: [rffe.RegisterData(0xC, 0x40, [1, 2], 2), rffe.RegisterData(0xC, 0x50, [3], 1)],
+                                1: [rffe.RegisterData(0xC, 0x40, [4, 5], 2), rffe.RegisterData(0x3, 0x60, [6], 1)]}
+    site_multi_command_read = {0: [rffe.RegisterData(0xC, 0x41, [], 1), rffe.RegisterData(0xC, 0x50, [], 1)],
+                               1: [rffe.RegisterData(0xC, 0x41, [], 1), rffe.RegisterData(0x3, 0x60, [], 1)]}
+    assert rffe.multi_command_multi_site(session, "RFFEDATA", site_multi_command_write, site_multi_command_read) == {0: [[2], [3]], 1: [[5], [6]]}
+    assert session.burst_count == 4 # entry i of both sites shares a burst
+
+
+def test_multi_command_multi_site_lengths_must_match(session):
+    with pytest.raises(rffe.RffeException, match="Every site must have the same number of commands, found 1, 2."):
+        rffe.multi_command_multi_site(session, "RFFEDATA", {0: [rffe.RegisterData(0xC, 0x40, [1], 1)],
+                                                            1: [rffe.RegisterData(0xC, 0x40, [1], 1), rffe.RegisterData(0xC, 0x41, [2], 1)]}, {})
+    assert session.burst_count == 0
@@ -0,0 +1,83 @@
+import random
+import pytest
+from conftest import SEQUENCE_PATTERNS, create_session
+from nimipi import rffe
+from nimipi.simulator import SimulatedSession
+from rfmd8090 import Rfmd8090
+
+
+class CycleCountingSession(SimulatedSession):
+    """ SimulatedSession that adds up the bus cycles the simulator models, without the fixed wait per burst. """
+    _WAIT_TIME = 0.0
+
+
+def replay(sequence, sequence_patterns=None):
+    """ Runs (command function, RegisterData) pairs one by one, or in one burst_sequence with sequence_patterns set, on a
+        fresh session. Returns the register files and the modeled bus cycles. """
+    session = create_session(sequence_patterns, CycleCountingSession)
+    if sequence_patterns is None:
+        for command_function, register_data in sequence:
+            command_function(session, "RFFEDATA", register_data)
+    else:
+        rffe.burst_sequence(session, "RFFEDATA", sequence)
+    return (session.registers, round(session.modeled_time * session.frequency))
+
+
+def original(register_data_list):
+    return [(rffe.extended_reg_write, register_data) for register_data in register_data_list] # as multi_command writes them
+
+
+def random_writes(seed):
+    """ Writes on two slaves with repeats and runs of consecutive addresses, some long enough to need splitting. """
+    generator = random.Random(seed)
+    register_data_list = []
+    register_address = generator.randrange(0x100)
+    for _ in range(60):
+        choice = generator.random()
+        if choice < 0.2 and register_data_list:
+            previous = register_data_list[-1]
+            register_data_list.append(rffe.RegisterData(previous.slave_address, previous.register_address, list(previous.write_data), previous.byte_count))
+            continue
+        if choice < 0.7:
+            register_address = (register_address + len(register_data_list[-1].write_data) if register_data_list else 0) % 0xF8
+        else:
+            register_address = generator.randrange(0xF8)
+        byte_count = generator.randint(1, 4)
+        slave_address = 0xC if generator.random() < 0.8 else 0x3
+        register_data_list.append(rffe.RegisterData(slave_address, register_address, [generator.randrange(0x100) for _ in range(byte_count)], byte_count))
+    return register_data_list
+
+
+@pytest.mark.parametrize("drop_duplicates, merge_contiguous", [(True, True), (True, False), (False, True)])
+@pytest.mark.parametrize("name", ["Band1Apt", "Band1Et", "random0", "random1", "random2"])
+def test_optimized_writes_leave_the_same_registers(name, drop_duplicates, merge_contiguous):
+    register_data_list = random_writes(int(name[-1])) if name.startswith("random") else getattr(Rfmd8090, name)
+    optimized = rffe.optimize_writes(register_data_list, drop_duplicates, merge_contiguous)
+    registers, bus_cycles_before = replay(original(register_data_list))
+    optimized_registers, bus_cycles_after = replay(optimized.sequence)
+    assert optimized_registers == registers
+    assert replay(optimized.sequence, SEQUENCE_PATTERNS)[0] == registers
+    assert (optimized.bus_cycles_before, optimized.bus_cycles_after) == (bus_cycles_before, bus_cycles_after)
+    assert len(optimized.sequence) <= len(register_data_list) and optimized.bus_cycles_after <= optimized.bus_cycles_before
+
+
+def test_band1apt_reduction():
+    optimized = rffe.optimize_writes(Rfmd8090.Band1Apt)
+    assert (len(Rfmd8090.Band1Apt), len(optimized.sequence)) == (84, 13)
+    assert (optimized.bus_cycles_before, optimized.bus_cycles_after) == (2856, 469)
+
+
+def test_drop_duplicates_only_drops_exact_repeats():
+    writes = [rffe.RegisterData(0xC, 0x10, [1], 1), rffe.RegisterData(0xC, 0x10, [1], 1), rffe.RegisterData(0xC, 0x10, [2], 1),
+              rffe.RegisterData(0xC, 0x10, [1], 1), rffe.RegisterData(0x3, 0x10, [1], 1)]
+    assert [(function, register_data.slave_address, register_data.write_data) for function, register_data in rffe.optimize_writes(writes, True, False).sequence] == \
+        [(rffe.reg_write, 0xC, [1]), (rffe.reg_write, 0xC, [2]), (rffe.reg_write, 0xC, [1]), (rffe.reg_write, 0x3, [1])]
+    assert len(rffe.optimize_writes(writes, False, False).sequence) == 5
+
+
+def test_merge_splits_at_the_command_limits():
+    writes = [rffe.RegisterData(0xC, 0x20 + i, [i], 1) for i in range(20)]
+    sequence = rffe.optimize_writes(writes).sequence
+    assert [(function, register_data.register_address, register_data.byte_count) for function, register_data in sequence] == \
+        [(rffe.extended_reg_write, 0x20, 16), (rffe.extended_reg_write, 0x30, 4)]
+    assert [data for _, register_data in sequence for data in register_data.write_data] == list(range(20))
@@ -0,0 +1,45 @@
+import threading
+import nidigital
+import pytest
+from conftest import PATTERN_DIRECTORY_PATH, PIN_MAP_PATH, SHEET_FILE_PATHS
+from nimipi import rffe
+from nimipi.pool import SessionPool
+from nimipi.simulator import SimulatedSession
+
+
+class BlockingSession(SimulatedSession):
+    """ SimulatedSession whose bursts on the "blocked" resource wait for release to be set. """
+    release = threading.Event()
+
+    def burst_pattern(self, site_list, start_label, select_digital_function=True, wait_until_done=True, timeout=10):
+        if self.resource_name == "blocked":
+            assert self.release.wait(10)
+        super().burst_pattern(site_list, start_label, select_digital_function, wait_until_done, timeout)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(nidigital, "Session", BlockingSession)
+    BlockingSession.release.clear()
+    pool = SessionPool(["blocked", "free"], PIN_MAP_PATH, *SHEET_FILE_PATHS, PATTERN_DIRECTORY_PATH)
+    yield pool
+    BlockingSession.release.set()
+    pool.close()
+
+
+def test_busy_instrument_does_not_block_others(pool):
+    write = [(rffe.reg_write, rffe.RegisterData(0xC, 0x01, [0x42], 1))]
+    read = [(rffe.reg_read, rffe.RegisterData(0xC, 0x01, [], 1))]
+    blocked = [pool.submit(0, write), pool.submit(0, read)]
+    assert pool.submit(1, write).result(5) == [None]
+    assert pool.submit(1, read).result(5) == [[0x42]]
+    assert not any(future.done() for future in blocked)
+    BlockingSession.release.set()
+    assert [future.result(5) for future in blocked] == [[None], [[0x42]]]
+
+
+def test_run_returns_results_in_submission_order(pool):
+    BlockingSession.release.set()
+    jobs = [(index, [(rffe.reg_write, rffe.RegisterData(0xC, 0x02, [value], 1)), (rffe.reg_read, rffe.RegisterData(0xC, 0x02, [], 1))])
+            for index, value in ((0, 0x10), (1, 0x20), (0, 0x30), (1, 0x40))]
+    assert pool.run(jobs) == [[None, [0x10]], [None, [0x20]], [None, [0x30]], [None, [0x40]]]
@@ -0,0 +1,51 @@
+import random
+import pytest
+from nimipi import prepared, rffe
+
+
+@pytest.mark.parametrize("command_function, register_address, byte_count", [(rffe.reg0_write, 0x00, 1), (rffe.reg_write, 0x0A, 1),
+                                                                           (rffe.extended_reg_write, 0x40, 5), (rffe.extended_reg_write, 0xF0, 16),
+                                                                           (rffe.extended_reg_write_long, 0x1234, 8)],
+                         ids=lambda value: getattr(value, "__name__", None))
+def test_patched_frame_matches_encoder(session, command_function, register_address, byte_count):
+    generator = random.Random(byte_count)
+    max_data = 0x7F if command_function == rffe.reg0_write else 0xFF
+    read_command_function = rffe.extended_reg_read_long if command_function == rffe.extended_reg_write_long else rffe.extended_reg_read
+    for slave_address in (0x3, 0x7, 0xC):
+        prepared_command = prepared.prepare_command(session, "RFFEDATA", command_function, slave_address, register_address, byte_count)
+        for _ in range(10):
+            write_data = [generator.randint(0, max_data) for _ in range(byte_count)]
+            prepared_command.write(write_data)
+            command = rffe.__sequence_command(command_function)
+            _, expected = rffe.__create_source_waveform_data(command, rffe.RegisterData(slave_address, register_address, write_data, byte_count))
+            assert prepared_command.source_waveform_data.tolist() == expected
+            assert read_command_function(session, "RFFEDATA", rffe.RegisterData(slave_address, register_address, [], byte_count)) == write_data
+
+
+def test_read(session):
+    rffe.extended_reg_write_long(session, "RFFEDATA", rffe.RegisterData(0x3, 0x1234, [1, 2, 3, 4], 4))
+    prepared_command = prepared.prepare_command(session, "RFFEDATA", rffe.extended_reg_read_long, 0x3, 0x1234, 4)
+    assert prepared_command.read() == [1, 2, 3, 4]
+    assert prepared_command.read(True).tolist() == [1, 2, 3, 4]
+    with pytest.raises(rffe.RffeException, match="use read"):
+        prepared_command.write(1)
+
+
+@pytest.mark.parametrize("command_function, write_data", [(rffe.reg0_write, 0x80), (rffe.reg_write, 0x100), (rffe.reg_write, -1),
+                                                          (rffe.extended_reg_write, [0x00, 0x100])],
+                         ids=lambda value: getattr(value, "__name__", repr(value)))
+def test_write_data_out_of_range(session, command_function, write_data):
+    byte_count = len(write_data) if isinstance(write_data, list) else 1
+    prepared_command = prepared.prepare_command(session, "RFFEDATA", command_function, 0xC, 0x00, byte_count)
+    bursts = session.burst_count
+    with pytest.raises(rffe.RffeException, match="out of range"):
+        prepared_command.write(write_data)
+    assert session.burst_count == bursts
+
+
+def test_wrong_byte_count(session):
+    prepared_command = prepared.prepare_command(session, "RFFEDATA", rffe.extended_reg_write, 0xC, 0x00, 2)
+    with pytest.raises(rffe.RffeException, match="writes 2 bytes"):
+        prepared_command.write([1])
+    with pytest.raises(rffe.RffeException, match="use write"):
+        prepared_command.read()
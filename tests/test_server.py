@@ -0,0 +1,80 @@
+import socket, socketserver, threading
+from os import path
+import pytest
+from nimipi import rffe, server
+
+unix_sockets = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+
+
+def test_tcp_round_trip(session):
+    with server.RffeServer(session, ("127.0.0.1", 0)) as rffe_server:
+        rffe_server.start()
+        assert rffe_server.address[1] != 0
+        with server.RffeClient(rffe_server.address) as client:
+            client.extended_reg_write("RFFEDATA", rffe.RegisterData(0x3, 0x40, [1, 2], 2))
+            assert client.extended_reg_read("RFFEDATA", rffe.RegisterData(0x3, 0x40, [], 2)) == [1, 2]
+            assert client.run("RFFEDATA", [(rffe.reg_write, rffe.RegisterData(0x3, 0x0A, [0x5A], 1)),
+                                           (rffe.reg_read, rffe.RegisterData(0x3, 0x0A, [], 1))]) == [None, [0x5A]]
+            with pytest.raises(rffe.RffeException, match="Slave address out of range"): # raised on the server, sent back
+                client.reg_write("RFFEDATA", rffe.RegisterData(0x10, 0x0A, [0x5A], 1))
+        with server.RffeClient(rffe_server.address) as client: # the server keeps serving after a client leaves
+            assert client.reg_read("RFFEDATA", rffe.RegisterData(0x3, 0x0A, [], 1)) == [0x5A]
+
+
+def test_close_without_serving(session):
+    rffe_server = server.RffeServer(session, ("127.0.0.1", 0))
+    closer = threading.Thread(target=rffe_server.close, daemon=True)
+    closer.start()
+    closer.join(5)
+    assert not closer.is_alive()
+
+
+def test_unix_address_without_unix_sockets(session, tmp_path, monkeypatch):
+    monkeypatch.delattr(socketserver, "UnixStreamServer", raising=False)
+    with pytest.raises(rffe.RffeException, match="Unix sockets are not available"):
+        server.RffeServer(session, str(tmp_path / "rffe.sock"))
+
+
+@unix_sockets
+def test_unix_socket_round_trip(session, tmp_path):
+    address = str(tmp_path / "rffe.sock")
+    with server.RffeServer(session, address) as rffe_server:
+        rffe_server.start()
+        with server.RffeClient(address) as client:
+            client.extended_reg_write("RFFEDATA", rffe.RegisterData(0x3, 0x40, [1, 2], 2))
+            assert client.extended_reg_read("RFFEDATA", rffe.RegisterData(0x3, 0x40, [], 2)) == [1, 2]
+    assert not path.exists(address)
+
+
+@unix_sockets
+def test_stale_socket_is_replaced(session, tmp_path):
+    address = str(tmp_path / "rffe.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(address) # bound but never listening, like a socket left by a server that crashed
+    stale.close()
+    with server.RffeServer(session, address) as rffe_server:
+        rffe_server.start()
+        with server.RffeClient(address) as client:
+            assert client.reg_read("RFFEDATA", rffe.RegisterData(0x3, 0x0A, [], 1)) == [0]
+
+
+@unix_sockets
+def test_other_files_are_left_alone(session, tmp_path):
+    address = str(tmp_path / "results.csv")
+    with open(address, 'w') as results_file:
+        results_file.write("keep me\n")
+    with pytest.raises(rffe.RffeException, match="not a socket"):
+        server.RffeServer(session, address)
+    with open(address) as results_file:
+        assert results_file.read() == "keep me\n"
+
+
+@unix_sockets
+def test_live_server_is_left_alone(session, tmp_path):
+    address = str(tmp_path / "rffe.sock")
+    with server.RffeServer(session, address) as rffe_server:
+        rffe_server.start()
+        with pytest.raises(rffe.RffeException, match="Another server"):
+            server.RffeServer(session, address)
+        with server.RffeClient(address) as client:
+            assert client.reg_read("RFFEDATA", rffe.RegisterData(0x3, 0x0A, [], 1)) == [0]
@@ -0,0 +1,101 @@
+import pytest
+from conftest import SEQUENCE_PATTERNS, create_session
+from nimipi import rffe
+from nimipi.shadow import ShadowMode, ShadowRegisters
+
+
+def register(register_address, write_data=(), byte_count=None):
+    return rffe.RegisterData(0xC, register_address, list(write_data), byte_count or max(len(write_data), 1))
+
+
+def test_write_through(session):
+    shadow = ShadowRegisters(session)
+    shadow.extended_reg_write("RFFEDATA", register(0x10, [1, 2]))
+    shadow.extended_reg_write("RFFEDATA", register(0x10, [1, 2]))
+    shadow.reg_write("RFFEDATA", register(0x11, [2])) # covered by the extended write
+    assert (session.burst_count, shadow.skipped_writes) == (1, 2)
+    shadow.extended_reg_write("RFFEDATA", register(0x10, [1, 3]))
+    assert shadow.extended_reg_read("RFFEDATA", register(0x10, byte_count=2)) == [1, 3]
+    assert (session.burst_count, shadow.cached_reads) == (3, 0)
+
+
+def test_read_from_cache(session):
+    shadow = ShadowRegisters(session, ShadowMode.READ_FROM_CACHE)
+    shadow.extended_reg_write_long("RFFEDATA", register(0x0120, [4, 5, 6]))
+    assert shadow.extended_reg_read_long("RFFEDATA", register(0x0121, byte_count=2)) == [5, 6]
+    assert (session.burst_count, shadow.cached_reads) == (1, 1)
+    assert shadow.extended_reg_read_long("RFFEDATA", register(0x0122, byte_count=2)) == [6, 0] # 0x0123 is not cached
+    assert shadow.reg_read("RFFEDATA", register(0x03)) == [0]
+    assert shadow.reg_read("RFFEDATA", register(0x03)) == [0]
+    assert (session.burst_count, shadow.cached_reads) == (3, 2)
+
+
+def test_verify(session):
+    shadow = ShadowRegisters(session, ShadowMode.VERIFY)
+    for _ in range(2):
+        shadow.reg_write("RFFEDATA", register(0x02, [0x42]))
+        assert shadow.reg_read("RFFEDATA", register(0x02)) == [0x42]
+    assert (session.burst_count, shadow.skipped_writes, shadow.cached_reads) == (4, 0, 0)
+    assert shadow.registers[("RFFEDATA", 0xC, 0x02)] == 0x42
+
+
+def test_mark_volatile(session):
+    shadow = ShadowRegisters(session, ShadowMode.READ_FROM_CACHE)
+    shadow.reg_write("RFFEDATA", register(0x1A, [0x01]))
+    shadow.mark_volatile("RFFEDATA", 0xC, [0x1A])
+    shadow.reg_write("RFFEDATA", register(0x1A, [0x01]))
+    assert shadow.reg_read("RFFEDATA", register(0x1A)) == [0x01]
+    assert shadow.reg_read("RFFEDATA", register(0x1A)) == [0x01]
+    assert (session.burst_count, shadow.skipped_writes, shadow.cached_reads) == (4, 0, 0)
+    assert ("RFFEDATA", 0xC, 0x1A) not in shadow.registers
+
+
+def test_invalidate(session):
+    shadow = ShadowRegisters(session)
+    shadow.reg_write("RFFEDATA", register(0x02, [0x42]))
+    shadow.reg_write("RFFEDATA", rffe.RegisterData(0x3, 0x02, [0x42], 1))
+    shadow.invalidate("RFFEDATA", 0x3)
+    shadow.reg_write("RFFEDATA", register(0x02, [0x42])) # slave 0xC is still cached
+    shadow.reg_write("RFFEDATA", rffe.RegisterData(0x3, 0x02, [0x42], 1))
+    assert session.burst_count == 3
+    shadow.invalidate()
+    shadow.reg_write("RFFEDATA", register(0x02, [0x42]))
+    assert (session.burst_count, shadow.registers) == (4, {("RFFEDATA", 0xC, 0x02): 0x42})
+
+
+def test_reg0_write_drops_register_0(session):
+    shadow = ShadowRegisters(session)
+    shadow.reg_write("RFFEDATA", register(0x00, [0x80]))
+    shadow.reg0_write("RFFEDATA", register(0x00, [0x01]))
+    shadow.reg_write("RFFEDATA", register(0x00, [0x80]))
+    assert session.burst_count == 3
+
+
+@pytest.mark.parametrize("single_burst", [False, True], ids=["per_command", "single_burst"])
+def test_multi_command_sends_only_what_the_cache_cannot_cover(single_burst):
+    session = create_session(SEQUENCE_PATTERNS)
+    shadow = ShadowRegisters(session, ShadowMode.READ_FROM_CACHE)
+    shadow.extended_reg_write("RFFEDATA", register(0x10, [1, 2]))
+    bursts = session.burst_count
+    writes = [register(0x10, [1, 2]), register(0x12, [3]), register(0x12, [3])]
+    reads = [register(0x10, byte_count=2), register(0x20), register(0x12)]
+    assert shadow.multi_command("RFFEDATA", writes, reads, single_burst) == [[1, 2], [0], [3]]
+    assert session.burst_count - bursts == (1 if single_burst else 2) # one write and one read reach the bus
+    assert (shadow.skipped_writes, shadow.cached_reads) == (2, 2)
+    assert shadow.registers[("RFFEDATA", 0xC, 0x20)] == 0
+
+
+def test_failed_multi_command_invalidates_the_pin(session):
+    shadow = ShadowRegisters(session)
+    shadow.reg_write("RFFEDATA", register(0x02, [0x42]))
+    with pytest.raises(rffe.RffeException):
+        shadow.multi_command("RFFEDATA", [register(0x10, [1]), rffe.RegisterData(0x10, 0x10, [1], 1)], [])
+    assert shadow.registers == {}
+
+
+def test_empty_write_goes_to_rffe(session):
+    shadow = ShadowRegisters(session)
+    with pytest.raises(rffe.RffeException, match="Write data length out of range"):
+        shadow.extended_reg_write("RFFEDATA", rffe.RegisterData(0xC, 0x10, [], 1))
+    with pytest.raises(rffe.RffeException, match="Write data length out of range"):
+        shadow.multi_command("RFFEDATA", [rffe.RegisterData(0xC, 0x10, [], 1)], [])
@@ -0,0 +1,163 @@
+import gc, os
+from os import path
+import pytest
+from conftest import PATTERN_DIRECTORY_PATH, PIN_MAP_PATH, SEQUENCE_PATTERNS, SHEET_FILE_PATHS, configure, create_session
+from nimipi import rffe
+from nimipi.simulator import SimulatedSession
+from nimipi.table import RegisterTable
+
+
+@pytest.fixture(params=[None, SEQUENCE_PATTERNS], ids=["per_command", "reg_sequence"])
+def read_back_session(request):
+    """ A session with and without the RegSequence pattern, for the functions that fall back to per-command reads. """
+    return create_session(request.param)
+
+
+def test_reg0_write(session):
+    rffe.reg0_write(session, "RFFEDATA", rffe.RegisterData(0xC, 0x00, [0x55], 1))
+    assert rffe.reg_read(session, "RFFEDATA", rffe.RegisterData(0xC, 0x00, [], 1)) == [0x55]
+
+
+def test_reg_write_read(session):
+    rffe.reg_write(session, "RFFEDATA", rffe.RegisterData(0xC, 0x1F, [0xA5], 1))
+    assert rffe.reg_read(session, "RFFEDATA", rffe.RegisterData(0xC, 0x1F, [], 1)) == [0xA5]
+    assert rffe.reg_read(session, "RFFEDATA", rffe.RegisterData(0xB, 0x1F, [], 1)) == [0x00] # other slave
+
+
+def test_extended_reg_write_read(session):
+    write_data = list(range(0xF0, 0x100))
+    rffe.extended_reg_write(session, "RFFEDATA", rffe.RegisterData(0xC, 0xE0, write_data, 16))
+    assert rffe.extended_reg_read(session, "RFFEDATA", rffe.RegisterData(0xC, 0xE0, [], 16)) == write_data
+    assert rffe.extended_reg_read(session, "RFFEDATA", rffe.RegisterData(0xC, 0xE8, [], 2), True).tolist() == write_data[8:10]
+
+
+@pytest.mark.parametrize("register_address", [0x0042, 0x1234, 0xFFF8])
+def test_extended_reg_write_read_long(session, register_address):
+    write_data = [0x11, 0x22, 0x33, 0x44, 0x55, 0x66, 0x77, 0x88]
+    rffe.extended_reg_write_long(session, "RFFEDATA", rffe.RegisterData(0x3, register_address, write_data, 8))
+    assert rffe.extended_reg_read_long(session, "RFFEDATA", rffe.RegisterData(0x3, register_address, [], 8)) == write_data
+
+
+def test_multi_command(session):
+    write_list = [rffe.RegisterData(0xC, address, [address ^ 0x5A, address], 2) for address in range(0x00, 0x40, 2)]
+    read_list = [rffe.RegisterData(0xC, address, [], 2) for address in range(0x00, 0x40, 2)]
+    assert rffe.multi_command(session, "RFFEDATA", write_list, read_list) == [register_data.write_data for register_data in write_list]
+    assert rffe.multi_command(session, "RFFEDATA", [], RegisterTable.from_register_data(read_list)) == [register_data.write_data for register_data in write_list]
+
+
+def test_data_check(session):
+    with pytest.raises(rffe.RffeException):
+        rffe.reg_write(session, "RFFEDATA", rffe.RegisterData(0x10, 0x00, [0x00], 1))
+    with pytest.raises(rffe.RffeException):
+        rffe.extended_reg_read(session, "RFFEDATA", rffe.RegisterData(0xC, 0x100, [], 1))
+
+
+def test_burst_needs_loaded_pattern():
+    session = SimulatedSession(strict=True)
+    with pytest.raises(rffe.RffeException, match="start label RegWrite"):
+        rffe.reg_write(session, "RFFEDATA", rffe.RegisterData(0xC, 0x00, [0x00], 1))
+
+
+def test_pin_map_unloads_patterns(session):
+    session.load_pin_map(PIN_MAP_PATH)
+    with pytest.raises(rffe.RffeException):
+        rffe.reg_read(session, "RFFEDATA", rffe.RegisterData(0xC, 0x00, [], 1))
+
+
+def test_lazy_patterns():
+    session = SimulatedSession(strict=True)
+    configure(session, lazy=True)
+    assert session.patterns == []
+    rffe.reg_write(session, "RFFEDATA", rffe.RegisterData(0xC, 0x01, [0x7E], 1))
+    assert list(session.pattern_labels) == ["RegWrite"]
+    assert rffe.reg_read(session, "RFFEDATA", rffe.RegisterData(0xC, 0x01, [], 1)) == [0x7E]
+    assert "RegWrite" not in rffe.load_report(session)["pending_patterns"]
+
+
+def test_sequence_needs_reg_sequence_pattern(session):
+    sequence = [(rffe.extended_reg_write, rffe.RegisterData(0xC, 0x10, [0x12], 1))]
+    with pytest.raises(rffe.RffeException, match="RegSequence pattern is not loaded"):
+        rffe.burst_sequence(session, "RFFEDATA", sequence)
+
+
+def test_burst_sequence(session):
+    rffe.load_pattern(session, path.join(PATTERN_DIRECTORY_PATH, SEQUENCE_PATTERNS)) # the simulator models the source
+    sequence = [(rffe.reg_write, rffe.RegisterData(0xC, 0x02, [0x3C], 1)),
+                (rffe.extended_reg_write_long, rffe.RegisterData(0xC, 0x0123, [1, 2, 3], 3)),
+                (rffe.reg_read, rffe.RegisterData(0xC, 0x02, [], 1)),
+                (rffe.extended_reg_read_long, rffe.RegisterData(0xC, 0x0123, [], 3))]
+    assert rffe.burst_sequence(session, "RFFEDATA", sequence, validate=True) == [[0x3C], [1, 2, 3]]
+
+
+def test_verify_registers(read_back_session):
+    session = read_back_session
+    rffe.reg_write(session, "RFFEDATA", rffe.RegisterData(0xC, 0x0A, [0x14], 1))
+    rffe.extended_reg_write(session, "RFFEDATA", rffe.RegisterData(0xC, 0x0B, [0x30, 0x12], 2))
+    rffe.extended_reg_write_long(session, "RFFEDATA", rffe.RegisterData(0x3, 0x1234, [1, 2, 3, 4, 5, 6, 7, 8], 8))
+    expected = [rffe.RegisterData(0xC, 0x0A, [0x14], 1), rffe.RegisterData(0xC, 0x0B, [0x30, 0x13], 2),
+                rffe.RegisterData(0x3, 0x1234, [1, 2, 3, 4, 5, 6, 7, 9], 8)]
+    assert rffe.verify_registers(session, "RFFEDATA", expected) == [(0xC, 0x0C, 0x13, 0x12), (0x3, 0x123B, 9, 8)]
+    assert rffe.verify_registers(session, "RFFEDATA", expected, [None, [0xFF, 0xFE], 0xF0]) == []
+    bursts = session.burst_count
+    rffe.verify_registers(session, "RFFEDATA", expected)
+    assert session.burst_count - bursts == (1 if "RegSequence" in session.pattern_labels else len(expected))
+
+
+def test_read_registers_array(read_back_session):
+    session = read_back_session
+    rffe.extended_reg_write(session, "RFFEDATA", rffe.RegisterData(0xC, 0x40, [1, 2, 3], 3))
+    read_data = rffe.read_registers_array(session, "RFFEDATA", [rffe.RegisterData(0xC, 0x40, [], 3), rffe.RegisterData(0xC, 0x41, [], 1)])
+    assert read_data.tolist() == [[1, 2, 3], [2, 0, 0]]
+
+
+def test_set_bus_frequency_replaces_only_its_sheet(session, tmp_path):
+    specifications_file_path, levels_file_path, timing_file_path = SHEET_FILE_PATHS
+    other_file_path = str(tmp_path / "Specifications.specs")
+    with open(specifications_file_path, 'rb') as source_file, open(other_file_path, 'wb') as other_file:
+        other_file.write(source_file.read())
+    rffe.load_sheets(session, other_file_path, levels_file_path, timing_file_path)
+    unloaded = []
+    session.unload_specifications = unloaded.append
+    first_file_path = rffe.set_bus_frequency(session, 10e6, *SHEET_FILE_PATHS)
+    assert unloaded == [specifications_file_path] and session.frequency == 10e6
+    second_file_path = rffe.set_bus_frequency(session, 20e6, *SHEET_FILE_PATHS)
+    assert unloaded == [specifications_file_path, first_file_path] and session.frequency == 20e6
+    assert rffe.set_bus_frequency(session, 20e6, *SHEET_FILE_PATHS) == second_file_path and len(unloaded) == 2
+    other_frequency_file_path = rffe.set_bus_frequency(session, 20e6, other_file_path, levels_file_path, timing_file_path)
+    assert other_frequency_file_path != second_file_path # same frequency and file name, different source sheet
+    assert unloaded[2:] == [other_file_path]
+
+
+def test_set_bus_frequency_matches_any_path_spelling(session, monkeypatch):
+    specifications_file_path, levels_file_path, timing_file_path = SHEET_FILE_PATHS
+    monkeypatch.chdir(path.dirname(specifications_file_path))
+    unloaded = []
+    session.unload_specifications = unloaded.append
+    rffe.load_sheets(session, path.basename(specifications_file_path), levels_file_path, timing_file_path) # already loaded, skipped
+    frequency_file_path = rffe.set_bus_frequency(session, 10e6, path.join("..", "digiproj", path.basename(specifications_file_path)),
+                                                 levels_file_path, timing_file_path)
+    assert unloaded == [specifications_file_path] # unloaded under the path the fixture loaded it with
+    rffe.set_bus_frequency(session, 20e6, *SHEET_FILE_PATHS)
+    assert unloaded[1:] == [frequency_file_path]
+
+
+def test_set_bus_frequency_removes_replaced_sheets():
+    session = create_session() # not the fixture, which pytest keeps alive until teardown
+    frequency_file_paths = [rffe.set_bus_frequency(session, frequency, *SHEET_FILE_PATHS) for frequency in (10e6, 20e6, 20e6, 30e6)]
+    sheet_directory_path = path.dirname(frequency_file_paths[0])
+    assert os.listdir(sheet_directory_path) == [path.basename(frequency_file_paths[-1])]
+    assert rffe.find_max_bus_frequency(session, "RFFEDATA", *SHEET_FILE_PATHS, [rffe.RegisterData(0xC, 0x0A, [0x14], 1)]) == 52e6
+    assert len(os.listdir(sheet_directory_path)) == 1
+    del session
+    gc.collect()
+    assert not path.exists(sheet_directory_path)
+
+
+@pytest.mark.parametrize("sequence_patterns", [None, SEQUENCE_PATTERNS], ids=["per_command", "reg_sequence"])
+def test_find_max_bus_frequency(sequence_patterns):
+    session = create_session(sequence_patterns, max_frequency=20e6)
+    register_data_list = [rffe.RegisterData(0xC, 0x0A, [0x14], 1), rffe.RegisterData(0xC, 0x40, [1, 2, 3], 3)]
+    frequency = rffe.find_max_bus_frequency(session, "RFFEDATA", *SHEET_FILE_PATHS, register_data_list)
+    assert 19.5e6 <= frequency <= 20e6 and session.frequency == frequency
+    assert rffe.read_registers_array(session, "RFFEDATA", register_data_list).tolist() == [[0x14, 0, 0], [1, 2, 3]]
+    assert rffe.find_max_bus_frequency(create_session(sequence_patterns, max_frequency=0.5e6), "RFFEDATA", *SHEET_FILE_PATHS, register_data_list) is None
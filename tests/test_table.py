@@ -0,0 +1,72 @@
+import pytest
+from nimipi import rffe
+from nimipi.table import RegisterTable
+
+REGISTER_DATA_LIST = [rffe.RegisterData(0xC, 0x1C, [0x38], 1), rffe.RegisterData(0xC, 0x10, [1, 2, 3], 3),
+                      rffe.RegisterData(0x3, 0x0123, [], 4), rffe.RegisterData(0xF, 0xFFFF, [0xFF] * 16, 16)]
+
+
+def rows(register_data_list):
+    return [(register_data.slave_address, register_data.register_address, register_data.byte_count, list(register_data.write_data))
+            for register_data in register_data_list]
+
+
+@pytest.mark.parametrize("memory_map", [True, False], ids=["memory_map", "read"])
+@pytest.mark.parametrize("register_data_list", [REGISTER_DATA_LIST, []], ids=["entries", "empty"])
+def test_binary_round_trip(tmp_path, register_data_list, memory_map):
+    file_path = str(tmp_path / "table.rffetbl")
+    RegisterTable.from_register_data(register_data_list).save(file_path)
+    table = RegisterTable.from_binary(file_path, memory_map)
+    assert len(table) == len(register_data_list)
+    assert rows(table) == rows(register_data_list)
+    assert [column.tolist() for column in table.columns(16)[:4]] == [column.tolist() for column in RegisterTable.from_register_data(register_data_list).columns(16)[:4]]
+    del table # release the memory map before tmp_path goes away
+
+
+def test_save_compacts_a_slice(tmp_path):
+    file_path = str(tmp_path / "table.rffetbl")
+    table = RegisterTable.from_register_data(REGISTER_DATA_LIST)
+    table[1:4:2].save(file_path) # shares the data buffer of the whole table
+    loaded = RegisterTable.from_binary(file_path, False)
+    assert rows(loaded) == rows(REGISTER_DATA_LIST[1:4:2])
+    assert loaded.data.tolist() == [1, 2, 3] + [0xFF] * 16
+
+
+@pytest.mark.parametrize("register_data_list", [REGISTER_DATA_LIST, []], ids=["entries", "empty"])
+def test_csv_round_trip(tmp_path, register_data_list):
+    file_path = str(tmp_path / "table.csv")
+    RegisterTable.from_register_data(register_data_list).to_csv(file_path)
+    assert rows(RegisterTable.from_csv(file_path)) == rows(register_data_list)
+
+
+def test_from_csv_skips_comments_and_reads_decimal(tmp_path):
+    file_path = str(tmp_path / "table.csv")
+    with open(file_path, 'w') as csv_file:
+        csv_file.write("# band 1\n\nslave_address,register_address,byte_count,write_data\n12,0x1C,1,0x38\n0xC,16,2,1 0x02\n0x3,0x20,1\n")
+    assert rows(RegisterTable.from_csv(file_path)) == [(12, 0x1C, 1, [0x38]), (0xC, 16, 2, [1, 2]), (0x3, 0x20, 1, [])]
+
+
+def test_from_binary_rejects_other_files(tmp_path):
+    file_path = str(tmp_path / "table.csv")
+    RegisterTable.from_register_data(REGISTER_DATA_LIST).to_csv(file_path)
+    with pytest.raises(rffe.RffeException, match="not a register table file"):
+        RegisterTable.from_binary(file_path)
+
+
+@pytest.mark.parametrize("register_data, message", [(rffe.RegisterData(0xC, 0x10, [0] * 256, 1), "data_length out of range"),
+                                                    (rffe.RegisterData(0xC, 0x10000, [], 1), "register_address out of range"),
+                                                    (rffe.RegisterData(0xC, 0x10, [], 256), "byte_count out of range"),
+                                                    (rffe.RegisterData(0x100, 0x10, [], 1), "slave_address out of range"),
+                                                    (rffe.RegisterData(0xC, 0x10, [0x100], 1), "write data out of range")],
+                         ids=["data_length", "register_address", "byte_count", "slave_address", "write_data"])
+def test_fields_out_of_range(register_data, message):
+    with pytest.raises(rffe.RffeException, match="Row 1 " + message):
+        RegisterTable.from_register_data([REGISTER_DATA_LIST[0], register_data])
+
+
+def test_indexing():
+    table = RegisterTable.from_register_data(REGISTER_DATA_LIST)
+    assert rows([table[-1]]) == rows(REGISTER_DATA_LIST[-1:])
+    assert rows(table[1:3]) == rows(REGISTER_DATA_LIST[1:3])
+    with pytest.raises(IndexError):
+        table[len(REGISTER_DATA_LIST)]